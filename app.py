@@ -1,135 +1,285 @@
 import dropbox
 import streamlit as st
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import pandas as pd
-from fpdf import FPDF
-import io
-
-# Load token from secrets.toml
-DROPBOX_ACCESS_TOKEN = st.secrets["DROPBOX_ACCESS_TOKEN"]
+import hashlib
+import roster
+import roster_cache
+import storage
+from settings import get_setting
+import member_search
+import member_paths
+import snapshot
+import ledger
+import diagnostics
+import member_ids
+import member_store
+import payments
+import write_queue
+import dues_summary
+import exports
+import enrollment
+import history
+import json
+from writes import is_conflict
+from members import (format_month, format_ordinal, month_ordinal, ordinal_month, new_member, member_number,
+                     apply_payment)
+
+# pandas (via dues) and fpdf (via reports) are imported where a table or PDF
+# is produced rather than up here: a new server process then paints the first
+# page without loading them, and pages that show no table never do.
+
+# Load settings from secrets.toml (or environment variables)
+DROPBOX_ACCESS_TOKEN = get_setting("DROPBOX_ACCESS_TOKEN")
+STORAGE_BACKEND = get_setting("STORAGE_BACKEND", "dropbox")  # "dropbox", "local" or "memory"
+LOCAL_STORAGE_ROOT = get_setting("LOCAL_STORAGE_ROOT", storage.DEFAULT_LOCAL_ROOT)  # local disk
+STORAGE_LATENCY = float(get_setting("STORAGE_LATENCY", 0))  # seconds added to each local/memory call
 MEMBER_DIR = "/members"  # Dropbox path
-
-# Dropbox instance
-dbx = dropbox.Dropbox(DROPBOX_ACCESS_TOKEN)
-
-def get_current_month():
-    return datetime.now().strftime("%b%y").upper()
-
-def format_month(date_obj):
-    return date_obj.strftime("%b%y").upper()
-
-def parse_month(month_str):
-    return datetime.strptime(month_str, "%b%y")
-
-def generate_next_member_id():
+# Members per shard folder (RKSC00xx/ ...) for new files; 0 keeps them all in MEMBER_DIR
+MEMBER_SHARD_SIZE = member_paths.check_shard_size(int(get_setting("MEMBER_SHARD_SIZE", member_paths.DEFAULT_SHARD_SIZE)))
+MEMBER_LOAD_WORKERS = int(get_setting("MEMBER_LOAD_WORKERS", roster.DEFAULT_MAX_WORKERS))
+MEMBER_CACHE_PATH = get_setting("MEMBER_CACHE_PATH", ".member_cache.json")  # local disk
+MEMBER_STORAGE = get_setting("MEMBER_STORAGE", "files")  # "files" (one file per member), "snapshot" or "ledger"
+SNAPSHOT_PATH = get_setting("SNAPSHOT_PATH", snapshot.DEFAULT_PATH)  # Dropbox path
+LEDGER_ROOT = get_setting("LEDGER_ROOT", ledger.DEFAULT_ROOT)  # Dropbox folder
+MEMBER_COUNTER_PATH = get_setting("MEMBER_COUNTER_PATH", member_ids.DEFAULT_COUNTER_PATH)  # Dropbox path
+SLOW_CALL_SECONDS = float(get_setting("SLOW_CALL_SECONDS", diagnostics.DEFAULT_SLOW_CALL_SECONDS))
+LOG_LEVEL = get_setting("LOG_LEVEL", "INFO")
+# Journal payments and new members locally and sync them in the background
+WRITE_BEHIND = str(get_setting("WRITE_BEHIND", "false")).lower() in ("1", "true", "yes")
+WRITE_QUEUE_PATH = get_setting("WRITE_QUEUE_PATH", write_queue.DEFAULT_PATH)  # local disk
+ROSTER_MAX_AGE = float(get_setting("ROSTER_MAX_AGE", roster_cache.DEFAULT_MAX_AGE))  # seconds
+DUES_SUMMARY_PATH = get_setting("DUES_SUMMARY_PATH", dues_summary.DEFAULT_PATH)  # Dropbox path
+HISTORY_ROOT = get_setting("HISTORY_ROOT", history.DEFAULT_ROOT)  # Dropbox folder of month-end checkpoints
+HISTORY_KEEP_MONTHS = int(get_setting("HISTORY_KEEP_MONTHS", history.DEFAULT_KEEP_MONTHS))
+
+# Every storage call and page phase in this rerun is timed; the totals are
+# logged at the end of the script and shown in the sidebar diagnostics panel
+diagnostics.configure_logging(LOG_LEVEL)
+recorder = diagnostics.start(SLOW_CALL_SECONDS)
+
+# Storage backend: Dropbox, or a local / in-memory stand-in for offline runs.
+# Created once per process so the in-memory store survives reruns.
+@st.cache_resource
+def get_storage():
+    client = None
+    if STORAGE_BACKEND == "dropbox":
+        # Connection pool sized for the parallel member loader
+        client = dropbox.Dropbox(DROPBOX_ACCESS_TOKEN,
+                                 session=dropbox.create_session(max_connections=MEMBER_LOAD_WORKERS))
+    return diagnostics.InstrumentedBackend(
+        storage.make_backend(STORAGE_BACKEND, client, LOCAL_STORAGE_ROOT, STORAGE_LATENCY))
+
+if STORAGE_BACKEND == "dropbox" and not DROPBOX_ACCESS_TOKEN:
+    st.error("DROPBOX_ACCESS_TOKEN is not set in secrets.toml.")
+    st.stop()
+
+dbx = get_storage()
+
+@st.cache_resource
+def get_store():
+    return member_store.make_store(MEMBER_STORAGE, dbx, MEMBER_DIR, MEMBER_CACHE_PATH, MEMBER_SHARD_SIZE,
+                                   SNAPSHOT_PATH, LEDGER_ROOT, MEMBER_COUNTER_PATH, MEMBER_LOAD_WORKERS)
+
+# Search index behind the member pickers, shared by all sessions
+@st.cache_resource
+def get_member_index():
+    return member_search.MemberIndex()
+
+# Roster shared by all sessions: one load serves every session for
+# ROSTER_MAX_AGE seconds, and concurrent loads are coalesced into one
+@st.cache_resource
+def get_shared_roster():
+    return roster_cache.SharedRoster(load_members, ROSTER_MAX_AGE)
+
+def member_written(member):
+    # After a write: update the search index and make every session reload
+    get_member_index().update(member)
+    get_shared_roster().invalidate()
+
+def dues_changed(changes):
+    # Keep the dues summary in step with a write: changes are (before, after)
+    # Valid Upto keys, see dues_summary.apply_changes. The write itself has
+    # already succeeded, so a failure here is only logged; check-dues-summary
+    # finds and repairs the drift.
+    if not changes:
+        return
     try:
-        res = dbx.files_list_folder(MEMBER_DIR)
-        existing_ids = []
-
-        for entry in res.entries:
-            if isinstance(entry, dropbox.files.FileMetadata):
-                filename = entry.name
-                if filename.endswith(".txt") and filename.startswith("RKSC"):
-                    try:
-                        num = int(filename.replace("RKSC", "").replace(".txt", ""))
-                        existing_ids.append(num)
-                    except:
-                        continue
-
-        next_num = max(existing_ids) + 1 if existing_ids else 1
-        return f"RKSC{next_num:04d}"
+        dues_summary.update_summary(dbx, DUES_SUMMARY_PATH, changes, datetime.now())
+    except Exception as e:
+        diagnostics.logger.warning(json.dumps({"event": "dues_summary_failed", "error": f"{type(e).__name__}: {e}"}))
 
-    except dropbox.exceptions.ApiError as e:
-        # If folder doesn't exist, create it and start with ID 0001
-        if isinstance(e.error, dropbox.files.ListFolderError) and e.error.is_path():
-            dbx.files_create_folder_v2(MEMBER_DIR)
-            return "RKSC0001"
-        else:
-            raise
+def rebuild_dues_summary(load):
+    try:
+        dues_summary.rebuild_summary(dbx, DUES_SUMMARY_PATH, load(), datetime.now())
+    except Exception as e:
+        diagnostics.logger.warning(json.dumps({"event": "dues_summary_failed", "error": f"{type(e).__name__}: {e}"}))
+
+# Background writer behind WRITE_BEHIND, one per process. It has its own
+# Dropbox client (sharing the HTTP session) that does not sleep through rate
+# limits, so the queue backs off on Retry-After itself and shows it.
+@st.cache_resource
+def get_write_queue():
+    worker_dbx = dbx
+    if STORAGE_BACKEND == "dropbox":
+        client = dbx.backend.client.clone(max_retries_on_rate_limit=0)
+        worker_dbx = diagnostics.InstrumentedBackend(storage.make_backend("dropbox", client))
+
+    store = get_store().using(worker_dbx)
+    shared_roster = get_shared_roster()
+
+    def flush_and_invalidate(entries, intents):
+        try:
+            results = store.flush(entries, intents)
+        finally:
+            shared_roster.invalidate()
+        # Queued payments carry the Valid Upto keys this station saw, which
+        # another station may have changed since, so the dues summary is
+        # rebuilt from the roster as now stored
+        if None in results.values():
+            rebuild_dues_summary(shared_roster.get)
+        return results
+    return write_queue.WriteQueue(WRITE_QUEUE_PATH, flush_and_invalidate, store.reserve).start()
+
+# Month-end checkpoints, taken from the roster as the pages show it
+@st.cache_resource
+def get_month_end():
+    load = lambda: get_write_queue().read(get_shared_roster().get) if WRITE_BEHIND else get_shared_roster().get()
+    return history.MonthEnd(dbx, HISTORY_ROOT, load, HISTORY_KEEP_MONTHS)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def checkpoint_months():
+    return list(history.list_checkpoints(dbx, HISTORY_ROOT))
+
+@st.cache_data(max_entries=6, show_spinner=False)
+def load_checkpoint(ordinal):
+    return history.read_checkpoint(dbx, HISTORY_ROOT, ordinal)
 
 def create_member(name):
-    member_id = generate_next_member_id()
-    content = (
-        f"Name: {name}\n"
-        f"Member ID: {member_id}\n"
-        f"Total Paid: 0\n"
-        f"Last Payment Month: None\n"
-        f"Valid Upto: None\n"
-    )
-    file_path = f"{MEMBER_DIR}/{member_id}.txt"
-    dbx.files_upload(content.encode(), file_path, mode=dropbox.files.WriteMode.overwrite)
-    return member_id
-
-
-def update_payment(member_id, amount):
-    file_path = f"{MEMBER_DIR}/{member_id}.txt"
+    # -> the new member's ID, or None when the member could not be added
+    if WRITE_BEHIND:
+        member_id = get_write_queue().enqueue_member(name, datetime.now())
+        if member_id is None:
+            st.error("No member IDs are in reserve right now (they are fetched from storage in the background); "
+                     "the member was not added. Please try again in a moment.")
+            return None
+        get_member_index().update(new_member(name, member_id))
+        return member_id
 
     try:
-        metadata, res = dbx.files_download(file_path)
-        content = res.content.decode("utf-8")
-    except dropbox.exceptions.ApiError:
-        st.error("Member not found.")
-        return
-
-    lines = content.strip().split("\n")
-    data = {line.split(":")[0]: line.split(":")[1].strip() for line in lines if ":" in line}
-    months_paid = amount // 20
-    now = datetime.now()
+        member = get_store().create(name)
+    except storage.STORAGE_ERRORS:
+        st.error("Storage cannot be reached right now; the member was not added. Please try again.")
+        return None
+    member_written(member)
+    dues_changed([(None, dues_summary.NEVER_PAID)])
+    return member.member_id
 
-    valid_upto_str = data.get("Valid Upto", "None")
-    if valid_upto_str == "None":
-        new_valid_upto = now + relativedelta(months=months_paid - 1)
-    else:
-        try:
-            last_valid_date = parse_month(valid_upto_str)
-            new_valid_upto = last_valid_date + relativedelta(months=months_paid)
-        except:
-            new_valid_upto = now + relativedelta(months=months_paid - 1)
 
-    data["Total Paid"] = str(int(data.get("Total Paid", 0)) + amount)
-    data["Last Payment Month"] = format_month(now)
-    data["Valid Upto"] = format_month(new_valid_upto)
+def update_payment(member_id, amount):
+    now = datetime.now()
 
-    updated_content = "\n".join([f"{key}: {data.get(key, 'None')}" for key in 
-                                 ["Name", "Member ID", "Total Paid", "Last Payment Month", "Valid Upto"]])
+    if WRITE_BEHIND:
+        # Journaled and acknowledged with no storage call, so a slow or
+        # unreachable Dropbox never holds up the counter. The new Valid Upto
+        # is worked out from the member as the picker's index shows it: the
+        # roster as last loaded, queued writes included.
+        member = get_member_index().get(member_id)
+        if member is None:
+            st.error("Member not found.")
+            return
+        member = member.copy()
+        before = dues_summary.valid_upto_key(member)
+        new_valid_upto = apply_payment(member, amount, now)
+        get_write_queue().enqueue_payment(member_id, amount, now, (before, dues_summary.valid_upto_key(member)))
+        get_member_index().update(member)
+        st.success(f"₹{amount} added. Valid upto: {format_month(new_valid_upto)}")
+        return
 
-    dbx.files_upload(updated_content.encode(), file_path, mode=dropbox.files.WriteMode.overwrite)
+    try:
+        paid = get_store().pay(member_id, amount, now)
+        if paid is None:
+            st.error("Member not found.")
+            return
+        member, new_valid_upto, retries, before = paid
+        member_written(member)
+        dues_changed([(before, dues_summary.valid_upto_key(member))])
+    except dropbox.exceptions.ApiError as e:
+        if is_conflict(e):
+            st.error("Member is being updated by another station. Please submit again.")
+        else:
+            st.error("Member not found.")
+        return
+    except storage.STORAGE_ERRORS:
+        st.error("Storage cannot be reached right now; the payment was not saved. Please submit again.")
+        return
 
     st.success(f"₹{amount} added. Valid upto: {format_month(new_valid_upto)}")
+    if retries:
+        st.info(f"ℹ️ Another station updated this member at the same time; "
+                f"the payment was re-applied after {retries} retr{'y' if retries == 1 else 'ies'}.")
 
 
 def read_member(member_id):
-    file_path = f"{MEMBER_DIR}/{member_id}.txt"
+    if WRITE_BEHIND:
+        stored = lambda: [m for m in [read_stored_member(member_id)] if m]
+        return snapshot.find_member(get_write_queue().read(stored), member_id)
+    return read_stored_member(member_id)
+
+def read_stored_member(member_id):
+    # While storage cannot be reached, the member as last loaded
     try:
-        metadata, res = dbx.files_download(file_path)
-        content = res.content.decode("utf-8")
-    except dropbox.exceptions.ApiError:
-        return None
+        return get_store().read(member_id)
+    except storage.STORAGE_ERRORS:
+        member = snapshot.find_member(get_shared_roster().last_good() or [], member_id)
+        return member.copy() if member else None
 
-    member = {}
-    for line in content.strip().split("\n"):
-        if ":" in line:
-            key, value = line.strip().split(":", 1)
-            member[key.strip()] = value.strip()
-    return member
 
+def import_payments(rows, dry_run=True):
+    now = datetime.now()
+    rows, saved = get_store().import_payments(rows, now, dry_run=dry_run)
+    for member in saved:
+        member_written(member)
+    if saved:
+        dues_changed(dues_summary.row_changes(rows))
+    return rows
+
+
+def enroll_members(rows, dry_run=True):
+    # The "Ready" rows of an enrollment sheet (enrollment.read_name_rows) as
+    # new members with consecutive IDs. Like imported payment sheets, this is
+    # written directly even with WRITE_BEHIND.
+    if dry_run or not enrollment.ready_rows(rows):
+        return rows
+
+    rows, saved = get_store().enroll(rows)
+    for member in saved:
+        get_member_index().update(member)
+    get_shared_roster().invalidate()
+    dues_changed([(None, dues_summary.NEVER_PAID)] * len(saved))
+    return rows
+
+
+def load_members():
+    return get_store().load()
+
+def read_roster():
+    with diagnostics.phase("load roster"):
+        # With WRITE_BEHIND, writes still in the queue are shown as made
+        shared = get_shared_roster()
+        return get_write_queue().read(shared.get) if WRITE_BEHIND else shared.get()
 
 def list_members():
-    members = []
+    # While storage cannot be reached, the roster as last loaded; None when
+    # there is none
     try:
-        res = dbx.files_list_folder(MEMBER_DIR)
-
-        for entry in res.entries:
-            if isinstance(entry, dropbox.files.FileMetadata) and entry.name.endswith(".txt"):
-                _, res_file = dbx.files_download(entry.path_display)
-                content = res_file.content.decode("utf-8")
-                data = {line.split(":")[0]: line.split(":")[1].strip() for line in content.split("\n") if ":" in line}
-                members.append(data)
-
-    except dropbox.exceptions.ApiError as e:
-        st.error("Failed to list members.")
-    return members
+        return read_roster()
+    except storage.STORAGE_ERRORS:
+        members = get_shared_roster().last_good()
+        if members is None:
+            st.error("Failed to list members.")
+            return None
+        st.warning("⚠️ Storage cannot be reached right now; showing the members as last loaded.")
+        return write_queue.overlay(members, get_write_queue().pending()) if WRITE_BEHIND else members
 
 
 # def show_due_list():
@@ -236,115 +386,138 @@ def list_members():
 
 
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def due_list_pdf(fingerprint, _dues, now):
+    # Keyed by the fingerprint of the dues table and the report date; the
+    # table itself (underscore argument) is not hashed
+    import reports
+    with diagnostics.phase("render PDF"):
+        return reports.render_due_list_pdf(reports.iter_rows(_dues), now)
+
+def show_dues_header():
+    # Club-wide totals from the dues summary: one small download, even when
+    # the roster itself is not loaded. With WRITE_BEHIND the writes still in
+    # the journal are added on top, as the rest of the page shows them.
+    now = datetime.now()
+    load = lambda: dues_summary.current_summary(dbx, DUES_SUMMARY_PATH, now, get_shared_roster().get)
+    pending = lambda summary, entries: dues_summary.apply_changes(summary, write_queue.dues_changes(entries), now)
+    try:
+        with diagnostics.phase("dues summary"):
+            summary = get_write_queue().read(load, pending) if WRITE_BEHIND else load()
+    except storage.STORAGE_ERRORS:
+        st.warning("Club-wide dues are not available right now.")
+        return
+    cols = st.columns(4)
+    cols[0].metric("Outstanding", f"₹{summary['due_amount']}")
+    cols[1].metric("Due months", summary["due_months"])
+    cols[2].metric("Members with dues", f"{summary['due_members']} of {summary['members']}")
+    cols[3].metric("Never paid", summary["never_paid"])
+    st.caption("Members by months overdue: " +
+               ", ".join(f"{label}: {count}" for label, count in summary["overdue"].items()))
+
+def pick_as_of():
+    # None for today, or the ordinal of a past month with a checkpoint at or
+    # before it
+    try:
+        months = checkpoint_months()
+    except storage.STORAGE_ERRORS:
+        return None
+    if not months:
+        return None
+    last_month = month_ordinal(datetime.now()) - 1
+    options = [None] + list(range(last_month, min(months) - 1, -1))
+    return st.selectbox("Dues as of", options, format_func=lambda o: "Today" if o is None else format_ordinal(o))
+
+def as_of_members(month):
+    # The roster at the end of `month`, from the nearest checkpoint at or
+    # before it: one small download instead of the member files
+    checkpoint = history.nearest(checkpoint_months(), month)
+    with diagnostics.phase("load checkpoint"):
+        loaded = load_checkpoint(checkpoint)
+    if loaded is None:
+        checkpoint_months.clear()
+        st.error("That checkpoint is no longer available. Please choose the month again.")
+        return None
+    header, members = loaded
+    note = f"From the {header['month']} month-end checkpoint, taken {header['taken'][:10]}."
+    if checkpoint != month:
+        note += f" Payments made after {header['month']} are not counted."
+    if header.get("paid_after"):
+        note += (f" {header['paid_after']} member{'s' if header['paid_after'] != 1 else ''} had already paid "
+                 f"again when it was taken; their figures include that payment.")
+    total_paid = sum(m["Total Paid"] for m in members if isinstance(m["Total Paid"], int))
+    st.caption(f"{note} Total paid by all members by then: ₹{total_paid}.")
+    return members
+
 def show_due_list():
-    members = list_members()  # Already uses Dropbox
+    from dues import compute_dues, with_total, dues_fingerprint
     now = datetime.now().replace(day=1)
+    as_of = pick_as_of()
+    if as_of is None:
+        members = list_members()  # Already uses Dropbox
+        if members is None:
+            return
+    else:
+        now = ordinal_month(as_of)
+        members = as_of_members(as_of)
+        if members is None:
+            return
 
-    dues = []
-
-    for member in members:
-        valid_upto_str = member.get("Valid Upto", "None")
+    with diagnostics.phase("compute dues"):
+        due_table = compute_dues(members, now)
 
-        if valid_upto_str == "None":
-            start_month = now
-        else:
-            try:
-                last_paid_date = parse_month(valid_upto_str)
-                if last_paid_date >= now:
-                    continue
-                start_month = last_paid_date + relativedelta(months=1)
-            except:
-                start_month = now
-
-        if start_month > now:
-            continue
-
-        months_due = (now.year - start_month.year) * 12 + (now.month - start_month.month) + 1
-        end_month = now
-        due_period = f"{format_month(start_month)} - {format_month(end_month)}"
-        due_amount = months_due * 20
-
-        dues.append({
-            "Name": member["Name"],
-            "Member ID": member["Member ID"],
-            "Due Period": due_period,
-            "Due Months": months_due,
-            "Due Amount (INR)": due_amount
-        })
-
-    if dues:
-        total_months = sum(d["Due Months"] for d in dues)
-        total_amount = sum(d["Due Amount (INR)"] for d in dues)
-        dues.append({
-            "Name": "TOTAL",
-            "Member ID": "",
-            "Due Period": "",
-            "Due Months": total_months,
-            "Due Amount (INR)": total_amount
-        })
-
-        df = pd.DataFrame(dues)
+    if not due_table.empty:
+        df = with_total(due_table)
         st.dataframe(df, use_container_width=True)
 
-        # Generate PDF in memory
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=False)
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(200, 10, f"RKSC Club - Due List ({now.strftime('%d %B %Y')})", ln=True, align='C')
-
-        pdf.set_font("Arial", "B", 10)
-        headers = ["Name", "Member ID", "Due Period", "Due Months", "Due Amount (INR)"]
-        col_widths = [40, 30, 50, 30, 40]
-        line_height = 10
-
-        for i, header in enumerate(headers):
-            pdf.cell(col_widths[i], line_height, header, border=1)
-        pdf.ln(line_height)
-
-        max_y = 297
-        margin_bottom = 15
-        usable_height = max_y - margin_bottom
-
-        for row in dues:
-            if pdf.get_y() + line_height > usable_height:
-                pdf.add_page()
-                pdf.set_font("Arial", "B", 10)
-                for i, header in enumerate(headers):
-                    pdf.cell(col_widths[i], line_height, header, border=1)
-                pdf.ln(line_height)
-
-            font_style = "B" if row["Name"] == "TOTAL" else ""
-            pdf.set_font("Arial", font_style, 10)
-            pdf.cell(col_widths[0], 10, row["Name"], border=1)
-            pdf.cell(col_widths[1], 10, row["Member ID"], border=1)
-            pdf.cell(col_widths[2], 10, row["Due Period"], border=1)
-            pdf.cell(col_widths[3], 10, str(row["Due Months"]), border=1)
-            pdf.cell(col_widths[4], 10, f"INR {row['Due Amount (INR)']}", border=1)
-            pdf.ln(line_height)
-
-        # Save to BytesIO
-        pdf_bytes = pdf.output(dest='S').encode('latin1')
-        pdf_buffer = io.BytesIO(pdf_bytes)
-        pdf_buffer.seek(0)
-
-
-        # Offer as download
-        st.download_button(
-            label="📄 Download Due List PDF",
-            data=pdf_buffer,
-            file_name=f"duelist_{now.strftime('%d_%B_%Y')}.pdf",
-            mime="application/pdf"
-        )
+        # The PDF is only rendered when the button is clicked, and reruns
+        # with the same dues serve the cached document
+        import reports
+        unwritable = reports.unwritable(df["Name"])
+        if unwritable:
+            st.warning("The due list PDF cannot be made: its fonts cannot write "
+                       f"{', '.join(unwritable[:5])}{' and others' if len(unwritable) > 5 else ''}. "
+                       "The CSV and Excel exports include every name.")
+        else:
+            fingerprint = dues_fingerprint(df, now)
+            st.download_button(
+                label="📄 Download Due List PDF",
+                data=lambda: due_list_pdf(fingerprint, df, now),
+                file_name=f"duelist_{now.strftime('%d_%B_%Y')}.pdf",
+                mime="application/pdf"
+            )
     else:
         st.success("✅ No dues. All members are up to date!")
+    if as_of is None:
+        show_exports(members, now)
+
+def show_exports(members, now):
+    # Files are written row by row from the member records when a button is
+    # clicked, without building a table first
+    formats = [("CSV", exports.write_csv, "csv", "text/csv")]
+    if exports.xlsx_available():
+        formats.append(("XLSX", exports.write_xlsx, "xlsx",
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"))
+    with st.expander("⬇️ Export dues and roster"):
+        for label, write, extension, mime in formats:
+            cols = st.columns(2)
+            cols[0].download_button(
+                label=f"Dues ({label})",
+                data=lambda write=write: exports.render(write, exports.due_rows(members, now)),
+                file_name=f"dues_{now.strftime('%d_%B_%Y')}.{extension}", mime=mime, key=f"dues_{extension}")
+            cols[1].download_button(
+                label=f"Roster ({label})",
+                data=lambda write=write: exports.render(write, exports.roster_rows(members)),
+                file_name=f"roster_{datetime.now().strftime('%d_%B_%Y')}.{extension}", mime=mime,
+                key=f"roster_{extension}")
+        if len(formats) == 1:
+            st.caption("Install openpyxl for Excel (XLSX) exports.")
 
 
 # from fpdf import FPDF
 # from io import BytesIO
 # from datetime import datetime
-# from dateutil.relativedelta import relativedelta
-
+# 
 # def show_due_list():
 #     now = datetime.now().replace(day=1)
 #     dues = []
@@ -462,9 +635,83 @@ st.markdown("""
     </h1>
 """, unsafe_allow_html=True)
 
-menu = ["➕ Add New Member", "💰 Record Payment", "📋 View Dues", "👤 Member Account"]
+menu = ["➕ Add New Member", "💰 Record Payment", "📥 Import Payments", "📋 View Dues", "👤 Member Account"]
 page = st.sidebar.radio("Menu", menu)
 
+def pick_member(key):
+    # Search box plus the best matches from the member index, instead of
+    # sending the whole roster to the browser. Returns the chosen member ID.
+    index = get_member_index()
+    try:
+        index.sync(read_roster())
+    except storage.STORAGE_ERRORS:
+        # A failed load must not empty the index every session searches, nor
+        # roll back the writes it has seen since; search it as it is
+        st.warning("⚠️ Storage cannot be reached right now; searching the members as last loaded.")
+    query = st.text_input("Search member by ID or name", key=f"{key}_search")
+    matches = index.search(query)
+    selected = st.selectbox("Select member", [""] + matches, key=f"{key}_member",
+                            format_func=lambda m: index.label(m) if index.get(m) else m)
+    return selected or None
+
+def finish_rerun():
+    # Log this rerun's storage calls and phases, and show them in the sidebar
+    # when asked. Called at the end of the script and before any st.stop().
+    diagnostics.log_summary(recorder, page=page, backend=STORAGE_BACKEND)
+    if not st.sidebar.checkbox("🩺 Show diagnostics"):
+        return
+    import pandas as pd
+    summary = recorder.summary()
+    with st.sidebar.expander("Diagnostics (this rerun)", expanded=True):
+        st.metric("Total time", f"{summary['elapsed']:.3f} s")
+        st.metric("Storage calls", summary["storage_calls"], f"{summary['storage_seconds']:.3f} s", delta_color="off")
+        if summary["calls"]:
+            st.dataframe(pd.DataFrame([{"Call": name, "Count": t["count"], "Total (s)": t["seconds"],
+                                        "Max (s)": t["max"], "Errors": t["errors"]}
+                                       for name, t in summary["calls"].items()]),
+                         hide_index=True, use_container_width=True)
+        if summary["phases"]:
+            st.dataframe(pd.DataFrame(summary["phases"]).rename(columns={"phase": "Phase", "seconds": "Time (s)"}),
+                         hide_index=True, use_container_width=True)
+        stats = get_shared_roster().stats
+        st.caption(f"Shared roster since start: {stats['loads']} loads, {stats['hits']} reused, "
+                   f"{stats['waits']} waited on another session's load")
+        for name, seconds, path, _ in recorder.slow_calls():
+            st.warning(f"Slow call: {name} {path} took {seconds:.3f} s (threshold {SLOW_CALL_SECONDS} s)")
+
+def stop():
+    finish_rerun()
+    st.stop()
+
+if MEMBER_STORAGE == "files" and st.sidebar.button("🔄 Resync Members"):
+    try:
+        get_store().resync()
+        get_shared_roster().invalidate()
+        st.sidebar.success("Member cache rebuilt.")
+    except storage.STORAGE_ERRORS:
+        st.sidebar.error("Failed to resync members.")
+
+if WRITE_BEHIND:
+    queue = get_write_queue()
+    depth, rejected = queue.depth(), queue.failed()
+    if depth:
+        retry = f" Retrying: {queue.last_error}." if queue.last_error else ""
+        st.sidebar.info(f"⏳ {depth} write{'s' if depth != 1 else ''} waiting to sync.{retry}")
+    else:
+        st.sidebar.caption("✅ All writes synced.")
+    if rejected:
+        with st.sidebar.expander(f"⚠️ {len(rejected)} queued write{'s' if len(rejected) != 1 else ''} rejected"):
+            for entry in rejected:
+                what = f"₹{entry['amount']}" if entry["kind"] == "payment" else f"new member {entry['name']}"
+                st.write(f"{entry['member_id']}: {what} ({entry['at'][:16]}) - {entry['failed']}")
+
+# The first rerun of a new month checkpoints the month that just ended
+try:
+    if get_month_end().ensure(datetime.now()) is not None:
+        checkpoint_months.clear()
+except Exception as e:
+    diagnostics.logger.warning(json.dumps({"event": "checkpoint_failed", "error": f"{type(e).__name__}: {e}"}))
+
 # ➕ Add New Member
 if page == "➕ Add New Member":
     st.markdown("""
@@ -475,10 +722,60 @@ if page == "➕ Add New Member":
     if st.button("Add Member"):
         if name.strip():
             new_id = create_member(name.strip())
-            st.success(f"✅ Member added successfully with ID: `{new_id}`")
+            if new_id:
+                st.success(f"✅ Member added successfully with ID: `{new_id}`")
         else:
             st.warning("⚠️ Please enter the name.")
 
+    st.subheader("Enroll from a CSV")
+    st.caption('Upload a CSV with a "Name" column. Every name gets the next free Member ID.')
+    uploaded = st.file_uploader("Names (CSV)", type="csv")
+    if uploaded:
+        sheet = uploaded.getvalue()
+        sheet_hash = hashlib.sha256(sheet).hexdigest()
+        existing = {enrollment.name_key(m.get("Name", "")): m.get("Member ID") for m in list_members() or []}
+        try:
+            rows = enrollment.read_name_rows(sheet.decode("utf-8-sig"), existing)
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"Could not read the sheet: {e}")
+            stop()
+
+        if st.session_state.get("enrolled_sheet") == sheet_hash:
+            st.warning("⚠️ This sheet has already been enrolled. Upload a new sheet to add more members.")
+            stop()
+
+        same_name = len(enrollment.already_members(rows))
+        if same_name:
+            st.warning(f"⚠️ {same_name} name{'s' if same_name != 1 else ''} in the sheet "
+                       f"{'are' if same_name != 1 else 'is'} already on the roster and will not be enrolled.")
+            if st.checkbox("They are different people: enroll them as new members too"):
+                rows = enrollment.read_name_rows(sheet.decode("utf-8-sig"), existing, enroll_existing=True)
+
+        enroll_now = st.button("Enroll Members")
+        try:
+            report = enroll_members(rows, dry_run=not enroll_now)
+        except dropbox.exceptions.ApiError:
+            st.error("Failed to enroll members.")
+            stop()
+
+        if enroll_now:
+            st.session_state["enrolled_sheet"] = sheet_hash
+            ids = enrollment.enrolled_ids(report)
+            first, last = (min(ids.values(), key=member_number), max(ids.values(), key=member_number)) if ids else (0, 0)
+            assigned = f" with IDs {first} to {last}" if ids else ""
+            st.success(f"✅ {len(ids)} of {len(report)} members enrolled{assigned}.")
+            st.download_button(
+                label="Download names and IDs (CSV)",
+                data=b"".join(exports.iter_csv([["Name", "Member ID"]] + [list(item) for item in ids.items()])),
+                file_name=f"enrolled_{datetime.now().strftime('%d_%B_%Y')}.csv",
+                mime="text/csv"
+            )
+        else:
+            ready = len(enrollment.ready_rows(report))
+            st.info(f"Preview: {ready} of {len(report)} names are ready. Nothing has been saved yet.")
+        import pandas as pd
+        st.dataframe(pd.DataFrame(report, columns=enrollment.REPORT_COLUMNS), use_container_width=True)
+
 # 💰 Record Payment
 elif page == "💰 Record Payment":
     st.markdown("""
@@ -486,101 +783,101 @@ elif page == "💰 Record Payment":
             💰 RECORD MEMBER'S PAYMENTS
         </h1>""", unsafe_allow_html=True)
 
-    member_objs = list_members()
-    member_display_list = [f"{m['Member ID']} - {m['Name']}" for m in member_objs]
-    member_display_list = sorted(member_display_list)
-
-    selected_member = st.selectbox("Select or search member", [""] + member_display_list)
+    member_id = pick_member("payment")
     amount = st.number_input("Enter Amount (Min ₹20)", min_value=20, step=20)
 
     if st.button("Submit Payment"):
-        if selected_member:
-            member_id = selected_member.split()[0]
+        if member_id:
             update_payment(member_id, amount)
         else:
             st.warning("⚠️ Please select a member.")
 
+# 📥 Import Payments
+elif page == "📥 Import Payments":
+    st.markdown("""
+        <h1 style='text-align: center; font-size: 2em; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;'>
+            📥 IMPORT COLLECTION SHEET
+        </h1>""", unsafe_allow_html=True)
+    st.caption('Upload a CSV with "Member ID" and "Amount" columns. Rows for the same member are applied in order.')
+
+    uploaded = st.file_uploader("Collection sheet (CSV)", type="csv")
+    if uploaded:
+        sheet = uploaded.getvalue()
+        sheet_hash = hashlib.sha256(sheet).hexdigest()
+        try:
+            rows = payments.read_payment_rows(sheet.decode("utf-8-sig"))
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"Could not read the sheet: {e}")
+            stop()
+
+        if st.session_state.get("imported_sheet") == sheet_hash:
+            st.warning("⚠️ This sheet has already been imported. Upload a new sheet to record more payments.")
+            stop()
+
+        apply_now = st.button("Apply Payments")
+        try:
+            report = import_payments(rows, dry_run=not apply_now)
+        except dropbox.exceptions.ApiError:
+            st.error("Failed to import payments.")
+            stop()
+
+        if apply_now:
+            st.session_state["imported_sheet"] = sheet_hash
+            saved = sum(row["Status"] == "Saved" for row in report)
+            st.success(f"✅ {saved} of {len(report)} payments saved.")
+        else:
+            ready = sum(row["Status"] == "Ready" for row in report)
+            st.info(f"Preview: {ready} of {len(report)} payments are ready. Nothing has been saved yet.")
+        import pandas as pd
+        st.dataframe(pd.DataFrame(report, columns=payments.REPORT_COLUMNS), use_container_width=True)
+
 # 📋 View Dues
 elif page == "📋 View Dues":
     st.markdown("""
         <h1 style='text-align: center; font-size: 2em; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;'>
             📋 MEMBERS WITH DUES
         </h1>""", unsafe_allow_html=True)
+    show_dues_header()
     show_due_list()
 
 
 elif page == "👤 Member Account":
-    # Load all members using Dropbox
-    member_objs = list_members()
-    members_list = [f"{m['Member ID']} - {m.get('Name', 'Unknown')}" for m in member_objs]
-    members_list = sorted(members_list)
-
-    selected_member = st.selectbox("Select or search member", [""] + members_list)
-
-    if selected_member:
-        member_id = selected_member.split(" - ")[0]
+    member_id = pick_member("account")
 
+    if member_id:
         if st.button("Show Details"):
             member = read_member(member_id)
             if member:
+                import pandas as pd
+                from dues import compute_dues
                 now = datetime.now().replace(day=1)
-                valid_upto_str = member.get("Valid Upto", "None")
-
-                # Handle "up to date" condition
-                if valid_upto_str == "None":
-                    start_month = now
-                else:
-                    last_paid_date = parse_month(valid_upto_str)
-                    if last_paid_date >= now:
-                        due_info = {
-                            "Name": member["Name"],
-                            "Member ID": member_id,
-                            "Last Payment Month": member.get("Last Payment Month", "N/A"),
-                            "Valid Upto": member.get("Valid Upto", "N/A"),
-                            "Due Period": "No dues",
-                            "Due Months": 0,
-                            "Due Amount (₹)": 0
-                        }
-                        df = pd.DataFrame([due_info])
-                        st.dataframe(df, use_container_width=True)
-                        st.success("✅ Member is up to date.")
-                        st.stop()
-                    start_month = last_paid_date + relativedelta(months=1)
-
-                # Extra validation: future start date
-                if start_month > now:
-                    due_info = {
-                        "Name": member["Name"],
-                        "Member ID": member_id,
-                        "Last Payment Month": member.get("Last Payment Month", "N/A"),
-                        "Valid Upto": member.get("Valid Upto", "N/A"),
-                        "Due Period": "No dues",
-                        "Due Months": 0,
-                        "Due Amount (₹)": 0
-                    }
-                    df = pd.DataFrame([due_info])
-                    st.dataframe(df, use_container_width=True)
-                    st.success("✅ Member is up to date.")
-                    st.stop()
-
-                # Calculate due period and amount
-                months_due = (now.year - start_month.year) * 12 + (now.month - start_month.month) + 1
-                end_month = now
-                due_period = f"{format_month(start_month)} - {format_month(end_month)}"
-                due_amount = months_due * 20
+                with diagnostics.phase("compute dues"):
+                    member_dues = compute_dues([member], now)
 
                 due_info = {
                     "Name": member["Name"],
                     "Member ID": member_id,
                     "Last Payment Month": member.get("Last Payment Month", "N/A"),
                     "Valid Upto": member.get("Valid Upto", "N/A"),
-                    "Due Period": due_period,
-                    "Due Months": months_due,
-                    "Due Amount (₹)": due_amount
+                    "Due Period": "No dues",
+                    "Due Months": 0,
+                    "Due Amount (₹)": 0
                 }
 
-                df = pd.DataFrame([due_info])
-                st.dataframe(df, use_container_width=True)
-                st.error("❌ Member has dues.")
+                if member_dues.empty:
+                    df = pd.DataFrame([due_info])
+                    st.dataframe(df, use_container_width=True)
+                    st.success("✅ Member is up to date.")
+                else:
+                    row = member_dues.iloc[0]
+                    due_info["Due Period"] = row["Due Period"]
+                    due_info["Due Months"] = int(row["Due Months"])
+                    due_info["Due Amount (₹)"] = int(row["Due Amount (INR)"])
+
+                    df = pd.DataFrame([due_info])
+                    st.dataframe(df, use_container_width=True)
+                    st.error("❌ Member has dues.")
             else:
                 st.warning("⚠️ Member not found. Please check the ID.")
+
+finish_rerun()
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+import dues
+import member_cache
+import member_ids
+import member_paths
+import payments
+import reports
+import roster
+import storage
+from members import MONTHLY_FEE, format_member, format_month
+
+# Benchmarks the roster operations against a local stand-in for Dropbox.
+#
+#   python bench.py --sizes 1000,10000 --latency 0.02 --output bench_results.json
+#
+# Results are written as JSON; pass --baseline with an earlier results file
+# to print how each timing changed.
+
+MEMBER_DIR = "/members"
+DEFAULT_SIZES = "1000,10000,100000"
+OPERATIONS = ["list_members_cold", "list_members_warm", "compute_dues", "due_list_pdf",
+              "member_id_scan", "member_id_allocation", "update_payment"]
+
+# Share of synthetic members that are paid up, overdue or have never paid
+MIX = {"paid_up": 0.55, "overdue": 0.35, "new": 0.10}
+
+
+def synthetic_members(count, now, seed=0):
+    rng = random.Random(seed)
+    for number in range(1, count + 1):
+        member = {"Name": f"Member {number}", "Member ID": f"RKSC{number:04d}"}
+        kind = rng.random()
+        if kind < MIX["new"]:
+            member.update({"Total Paid": "0", "Last Payment Month": "None", "Valid Upto": "None"})
+        else:
+            if kind < MIX["new"] + MIX["paid_up"]:
+                valid_upto = now + relativedelta(months=rng.randint(0, 12))
+            else:
+                valid_upto = now - relativedelta(months=rng.randint(1, 36))
+            last_payment = valid_upto - relativedelta(months=rng.randint(0, 11))
+            member.update({
+                "Total Paid": str(MONTHLY_FEE * rng.randint(1, 60)),
+                "Last Payment Month": format_month(last_payment),
+                "Valid Upto": format_month(valid_upto),
+            })
+        yield member
+
+
+def populate(backend, count, now, shard_size=0):
+    latency, backend.latency = backend.latency, 0.0
+    try:
+        for member in synthetic_members(count, now):
+            backend.files_upload(format_member(member).encode(),
+                                 member_paths.member_path(MEMBER_DIR, member["Member ID"], shard_size))
+    finally:
+        backend.latency = latency
+
+
+def time_runs(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def bench_size(args, size, workdir):
+    now = datetime.now().replace(day=1)
+    if args.backend == "local":
+        backend = storage.LocalBackend(os.path.join(workdir, f"roster_{size}"), latency=args.latency)
+    else:
+        backend = storage.MemoryBackend(latency=args.latency)
+    populate(backend, size, now, args.shard_size)
+
+    members = roster.load_members(backend, MEMBER_DIR, max_workers=args.workers)
+    due_rows = dues.with_total(dues.compute_dues(members, now)).to_dict("records")
+    cache = member_cache.MemberCache(backend, MEMBER_DIR, os.path.join(workdir, f"cache_{size}.json"),
+                                     max_workers=args.workers)
+    cache.sync()
+    member_ids.reserve_ids(backend, 1, seed=lambda: size)
+    rng = random.Random(size)
+
+    operations = {
+        "list_members_cold": lambda: roster.load_members(backend, MEMBER_DIR, max_workers=args.workers),
+        "list_members_warm": cache.sync,
+        "compute_dues": lambda: dues.with_total(dues.compute_dues(members, now)),
+        "due_list_pdf": lambda: reports.render_due_list_pdf(due_rows, now),
+        "member_id_scan": lambda: member_ids.highest_existing_number(backend, MEMBER_DIR),
+        "member_id_allocation": lambda: member_ids.reserve_ids(backend, 1),
+        "update_payment": lambda: payments.record_payment(
+            backend, member_paths.member_path(MEMBER_DIR, f"RKSC{rng.randint(1, size):04d}", args.shard_size),
+            MONTHLY_FEE, datetime.now()),
+    }
+
+    results = []
+    for name in OPERATIONS:
+        if name in args.skip:
+            continue
+        runs = time_runs(operations[name], args.repeat)
+        results.append({
+            "roster_size": size,
+            "operation": name,
+            "runs": runs,
+            "min": min(runs),
+            "median": statistics.median(runs),
+        })
+        print(f"{size:>8} {name:<22} {min(runs):>10.4f}s  (median {statistics.median(runs):.4f}s)")
+    return results
+
+
+def git_revision():
+    try:
+        # Ask the repository bench.py is in, wherever it is run from
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["roster_size"], r["operation"]): r["median"] for r in json.load(f)["results"]}
+    print(f"\nChange against {baseline_path} (median):")
+    for r in results:
+        before = baseline.get((r["roster_size"], r["operation"]))
+        if before:
+            print(f"{r['roster_size']:>8} {r['operation']:<22} {before:>10.4f}s -> {r['median']:.4f}s"
+                  f"  ({r['median'] / before:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark roster operations on synthetic members")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated roster sizes")
+    parser.add_argument("--backend", choices=["memory", "local"], default="memory")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every storage call")
+    parser.add_argument("--workers", type=int, default=roster.DEFAULT_MAX_WORKERS)
+    parser.add_argument("--shard-size", type=int, default=0, help="members per shard folder (0 = flat folder)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip", default="", help=f"comma-separated operations to skip ({', '.join(OPERATIONS)})")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+    args.skip = set(filter(None, args.skip.split(",")))
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            results.extend(bench_size(args, size, workdir))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "latency": args.latency,
+            "workers": args.workers,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
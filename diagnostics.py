@@ -0,0 +1,132 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DEFAULT_SLOW_CALL_SECONDS = 1.0
+
+logger = logging.getLogger("rksc")
+
+# The recorder for the Streamlit rerun (or command) running in this thread.
+# Worker pools created with thread_pool() hand it on to their threads, so
+# parallel downloads are counted against the rerun that started them.
+_recorder = contextvars.ContextVar("recorder", default=None)
+
+
+class Recorder:
+    # Storage calls and page phases timed during one rerun
+
+    def __init__(self, slow_threshold=DEFAULT_SLOW_CALL_SECONDS):
+        self.slow_threshold = slow_threshold
+        self.started = time.perf_counter()
+        self.calls = []  # (name, seconds, path, error)
+        self.phases = []  # (name, seconds)
+        self._lock = threading.Lock()
+
+    def record_call(self, name, seconds, path="", error=None):
+        with self._lock:
+            self.calls.append((name, seconds, path, error))
+        if seconds >= self.slow_threshold:
+            logger.warning(json.dumps({"event": "slow_call", "call": name, "path": path,
+                                       "seconds": round(seconds, 4), "threshold": self.slow_threshold}, ensure_ascii=False))
+
+    def record_phase(self, name, seconds):
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    def slow_calls(self):
+        return [c for c in self.calls if c[1] >= self.slow_threshold]
+
+    def call_totals(self):
+        totals = {}
+        for name, seconds, _, error in self.calls:
+            t = totals.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0, "errors": 0})
+            t["count"] += 1
+            t["seconds"] += seconds
+            t["max"] = max(t["max"], seconds)
+            t["errors"] += error is not None
+        return totals
+
+    def summary(self, **fields):
+        return dict(
+            fields,
+            elapsed=round(time.perf_counter() - self.started, 4),
+            storage_calls=len(self.calls),
+            storage_seconds=round(sum(c[1] for c in self.calls), 4),
+            calls={name: dict(t, seconds=round(t["seconds"], 4), max=round(t["max"], 4))
+                   for name, t in self.call_totals().items()},
+            phases=[{"phase": name, "seconds": round(seconds, 4)} for name, seconds in self.phases],
+            slow_calls=len(self.slow_calls()),
+        )
+
+
+def start(slow_threshold=DEFAULT_SLOW_CALL_SECONDS):
+    recorder = Recorder(slow_threshold)
+    _recorder.set(recorder)
+    return recorder
+
+
+def current():
+    return _recorder.get()
+
+
+def log_summary(recorder, **fields):
+    logger.info(json.dumps(dict(recorder.summary(**fields), event="rerun"), ensure_ascii=False))
+
+
+def configure_logging(level="INFO"):
+    # One JSON object per line on stderr; leaves handlers alone if the
+    # embedding process already set some up
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+@contextmanager
+def phase(name):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder = current()
+        if recorder:
+            recorder.record_phase(name, time.perf_counter() - start_time)
+
+
+def thread_pool(max_workers):
+    return ThreadPoolExecutor(max_workers=max(1, max_workers), initializer=_recorder.set,
+                              initargs=(_recorder.get(),))
+
+
+class InstrumentedBackend:
+    # Wraps a storage backend (or dropbox.Dropbox client) and times every
+    # files_* call against the current recorder. Everything else is passed
+    # straight through.
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if not name.startswith("files_") or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            start_time = time.perf_counter()
+            error = None
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                recorder = current()
+                if recorder:
+                    path = kwargs.get("path") or next((a for a in args if isinstance(a, str)), "")
+                    recorder.record_call(name, time.perf_counter() - start_time, path[:120], error)
+        return timed
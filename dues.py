@@ -0,0 +1,63 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from members import MONTHLY_FEE, Member, month_ordinal, months_due, valid_upto_ordinal
+
+MONTH_NAMES = np.array(["JAN", "FEB", "MAR", "APR", "MAY", "JUN",
+                        "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], dtype=object)
+YEAR_LABELS = np.array([f"{y:02d}" for y in range(100)], dtype=object)
+DUE_COLUMNS = ["Name", "Member ID", "Due Period", "Due Months", "Due Amount (INR)"]
+
+
+# Months are handled as integer ordinals (year * 12 + month - 1) so the whole
+# roster can be compared and subtracted as columns.
+def ordinal_labels(ordinals):
+    # Vectorized format_month: ordinal -> "OCT25"
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    return MONTH_NAMES[ordinals % 12] + YEAR_LABELS[ordinals // 12 % 100]
+
+def _valid_upto(member):
+    if isinstance(member, Member) and isinstance(member.valid_upto, int):
+        return member.valid_upto
+    return member.get("Valid Upto", "None")
+
+
+def compute_dues(members, now):
+    # members.months_due() is applied once per distinct Valid Upto (a roster
+    # only has a few hundred) and broadcast back to the rows; a missing value
+    # (code -1) picks the trailing entry for members without one
+    now_ord = month_ordinal(now)
+    codes, uniques = pd.factorize(pd.Series([_valid_upto(m) for m in members], dtype=object))
+    months = np.array([months_due(valid_upto_ordinal(v), now_ord) for v in uniques] + [months_due(None, now_ord)],
+                      dtype=np.int64)[codes]
+    due = months > 0
+
+    due_months = months[due]
+    start_ord = now_ord - due_months + 1
+    idx = np.flatnonzero(due)
+    return pd.DataFrame({
+        "Name": [members[i].get("Name", "") for i in idx],
+        "Member ID": [members[i].get("Member ID", "") for i in idx],
+        "Due Period": ordinal_labels(start_ord) + " - " + ordinal_labels([now_ord])[0],
+        "Due Months": due_months,
+        "Due Amount (INR)": due_months * MONTHLY_FEE,
+    }, columns=DUE_COLUMNS)
+
+
+def with_total(dues):
+    total = pd.DataFrame([{
+        "Name": "TOTAL",
+        "Member ID": "",
+        "Due Period": "",
+        "Due Months": int(dues["Due Months"].sum()),
+        "Due Amount (INR)": int(dues["Due Amount (INR)"].sum()),
+    }])
+    return pd.concat([dues, total], ignore_index=True)
+
+
+def dues_fingerprint(dues, now):
+    # Digest of a dues table and its report date; equal tables give equal
+    # fingerprints, so it can key caches of anything rendered from them
+    digest = hashlib.sha256(pd.util.hash_pandas_object(dues, index=False).values.tobytes())
+    digest.update(now.strftime("%Y-%m-%d").encode())
+    return digest.hexdigest()
@@ -0,0 +1,155 @@
+import json
+import dropbox
+from members import MONTHLY_FEE, Member, format_ordinal, month_ordinal, months_due, parse_ordinal, valid_upto_ordinal
+from writes import conditional_mode, is_conflict, retry_on_conflict
+
+# Club-wide dues in one small Dropbox file, so the totals need one download
+# instead of loading and recomputing the whole roster. The file keeps a
+# histogram of members per Valid Upto month ("None" for members who never
+# paid); the totals and overdue buckets are worked out from it for the month
+# in "month". A payment moves one member between two months of the
+# histogram, and a new calendar month only recomputes the totals from the
+# histogram, a few hundred entries at most.
+DEFAULT_PATH = "/dues_summary.json"
+NEVER_PAID = "None"
+# Months overdue, as (label, lowest, highest); None means no upper limit
+BUCKETS = [("1", 1, 1), ("2", 2, 2), ("3", 3, 3), ("4-6", 4, 6), ("7-12", 7, 12), ("13+", 13, None)]
+
+
+def month_key(value):
+    # A Valid Upto value as the dues rule (members.valid_upto_ordinal) reads
+    # it: "OCT25", or "None" when it is missing or unreadable
+    ordinal = valid_upto_ordinal(value)
+    return NEVER_PAID if ordinal is None else format_ordinal(ordinal)
+
+def valid_upto_key(member):
+    return month_key(member.valid_upto if isinstance(member, Member) else member.get("Valid Upto", "None"))
+
+
+def roll_forward(histogram, now):
+    # The summary of `histogram` for the calendar month of `now`
+    now_ord = month_ordinal(now)
+    summary = {"month": format_ordinal(now_ord), "members": 0, "never_paid": 0, "due_members": 0,
+               "due_months": 0, "due_amount": 0, "overdue": {label: 0 for label, _, _ in BUCKETS}}
+    ordinals = {}
+    for key, count in histogram.items():
+        if count:
+            ordinals[key] = parse_ordinal(key)
+    for key, ordinal in ordinals.items():
+        count = histogram[key]
+        months = months_due(ordinal, now_ord)
+        summary["members"] += count
+        if ordinal is None:
+            summary["never_paid"] += count
+        if not months:
+            continue
+        summary["due_members"] += count
+        summary["due_months"] += months * count
+        for label, lowest, highest in BUCKETS:
+            if months >= lowest and (highest is None or months <= highest):
+                summary["overdue"][label] += count
+    summary["due_amount"] = summary["due_months"] * MONTHLY_FEE
+    # Oldest month first, members who never paid last
+    summary["valid_upto"] = {key: histogram[key] for key in
+                             sorted(ordinals, key=lambda k: (ordinals[k] is None, ordinals[k] or 0))}
+    return summary
+
+def build_summary(members, now):
+    histogram = {}
+    for member in members:
+        key = valid_upto_key(member)
+        histogram[key] = histogram.get(key, 0) + 1
+    return roll_forward(histogram, now)
+
+def apply_changes(summary, changes, now):
+    # changes: (before, after) Valid Upto keys per member written; before is
+    # None for a member that did not exist yet
+    histogram = dict(summary["valid_upto"])
+    for before, after in changes:
+        if before is not None:
+            histogram[before] = histogram.get(before, 0) - 1
+        histogram[after] = histogram.get(after, 0) + 1
+    return roll_forward(histogram, now)
+
+def row_changes(rows):
+    # (before, after) per member from the saved rows of an import report
+    first, last = {}, {}
+    for row in rows:
+        if row["Status"] == "Saved":
+            first.setdefault(row["Member ID"], row["Valid Upto (before)"])
+            last[row["Member ID"]] = row["Valid Upto (after)"]
+    return [(month_key(first[member_id]), month_key(last[member_id])) for member_id in first]
+
+
+def read_summary(dbx, path=DEFAULT_PATH):
+    try:
+        metadata, res = dbx.files_download(path)
+    except dropbox.exceptions.ApiError as e:
+        if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+            return None, None
+        raise
+    return json.loads(res.content), metadata.rev
+
+def write_summary(dbx, path, summary, rev=None):
+    return dbx.files_upload(json.dumps(summary, indent=1).encode(), path, mode=conditional_mode(rev),
+                            strict_conflict=True)
+
+
+def update_summary(dbx, path, changes, now):
+    # Apply one write's changes with a rev-conditional upload, starting over
+    # when another station updated the summary in between. Without a summary
+    # yet there is nothing to update: the first read builds it.
+    def attempt():
+        summary, rev = read_summary(dbx, path)
+        if summary is None:
+            return None
+        summary = apply_changes(summary, changes, now)
+        write_summary(dbx, path, summary, rev)
+        return summary
+
+    summary, _ = retry_on_conflict(attempt)
+    return summary
+
+def rebuild_summary(dbx, path, members, now):
+    # Replace the summary with one built from `members`
+    summary = build_summary(members, now)
+    def attempt():
+        _, rev = read_summary(dbx, path)
+        write_summary(dbx, path, summary, rev)
+
+    retry_on_conflict(attempt)
+    return summary
+
+def current_summary(dbx, path, now, load):
+    # The summary for this month: built from load() the first time, and
+    # rolled forward (and saved) once when a new month starts
+    summary, rev = read_summary(dbx, path)
+    if summary is not None and summary["month"] == format_ordinal(month_ordinal(now)):
+        return summary
+    summary = build_summary(load(), now) if summary is None else roll_forward(summary["valid_upto"], now)
+    try:
+        write_summary(dbx, path, summary, rev)
+    except dropbox.exceptions.ApiError as e:
+        # Another station saved it first; this copy is still good to show
+        if not is_conflict(e):
+            raise
+    return summary
+
+
+def check_summary(summary, members, now):
+    # Rebuild from the roster and compare. Returns (field, stored, rebuilt)
+    # for each difference; an empty list means the summary is consistent.
+    rebuilt = build_summary(members, now)
+    stored = summary if summary["month"] == rebuilt["month"] else roll_forward(summary["valid_upto"], now)
+    differences = []
+    for field in ["members", "never_paid", "due_members", "due_months", "due_amount"]:
+        if stored[field] != rebuilt[field]:
+            differences.append((field, stored[field], rebuilt[field]))
+    for label, _, _ in BUCKETS:
+        if stored["overdue"][label] != rebuilt["overdue"][label]:
+            differences.append((f"overdue {label}", stored["overdue"][label], rebuilt["overdue"][label]))
+    for key in sorted(set(stored["valid_upto"]) | set(rebuilt["valid_upto"])):
+        if stored["valid_upto"].get(key, 0) != rebuilt["valid_upto"].get(key, 0):
+            differences.append((f"valid upto {key}", stored["valid_upto"].get(key, 0),
+                                rebuilt["valid_upto"].get(key, 0)))
+    return differences
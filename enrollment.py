@@ -0,0 +1,105 @@
+import csv
+import io
+import time
+import dropbox
+from members import format_member, new_member
+from roster import DEFAULT_MAX_WORKERS
+from writes import WRITE_ATTEMPTS, backoff_delay, is_retryable_failure, upload_batch
+
+# Bulk enrollment from a CSV with a "Name" column: every new member gets an
+# ID from one contiguous block reserved up front, and all the files are
+# committed in one upload batch.
+
+REPORT_COLUMNS = ["Row", "Name", "Member ID", "Status", "Note"]
+
+
+def name_key(name):
+    return " ".join(name.split()).casefold()
+
+
+def read_name_rows(text, existing=None, enroll_existing=False):
+    # existing: name_key(name) -> Member ID of members already on the roster.
+    # Empty names and names repeated in the sheet are reported and not
+    # enrolled. A name already on the roster is held back too (so a sheet
+    # uploaded twice does not enroll everyone twice), unless enroll_existing
+    # says they are different people; they are then enrolled with a note.
+    reader = csv.DictReader(io.StringIO(text))
+    fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+    name_field = fields.get("name")
+    if not name_field:
+        raise ValueError('The CSV needs a "Name" column.')
+
+    existing = existing or {}
+    rows, seen = [], {}
+    for record in reader:
+        name = " ".join((record.get(name_field) or "").split())
+        row = {"Row": reader.line_num, "Name": name, "Member ID": "", "Status": "Ready", "Note": ""}
+        key = name_key(name)
+        if not name:
+            row["Status"] = "Empty name"
+        elif key in seen:
+            row["Status"] = f"Duplicate of row {seen[key]}"
+        elif key in existing and not enroll_existing:
+            row["Status"] = f"Already a member ({existing[key]})"
+        else:
+            if key in existing:
+                row["Note"] = f"Same name as {existing[key]}"
+            seen[key] = row["Row"]
+        rows.append(row)
+    return rows
+
+
+def ready_rows(rows):
+    return [row for row in rows if row["Status"] == "Ready"]
+
+def already_members(rows):
+    return [row for row in rows if row["Status"].startswith("Already a member")]
+
+def enrolled_ids(rows):
+    # Name -> Member ID of everyone enrolled
+    return {row["Name"]: row["Member ID"] for row in rows if row["Status"] == "Enrolled"}
+
+
+def enroll_files(dbx, folder, rows, reserve, max_workers=DEFAULT_MAX_WORKERS, path_of=None):
+    # Files layout: reserve(count) hands out `count` consecutive Member IDs
+    # (member_ids.reserve_ids), and every new file is written with
+    # WriteMode.add in one upload batch. A file whose ID turns out to be
+    # taken gets a fresh ID on the next attempt; one that was only throttled
+    # is retried with the same ID. Returns (rows, saved) where saved lists
+    # (metadata, member) per file, as in payments.import_payments.
+    path_of = path_of or (lambda member_id: f"{folder}/{member_id}.txt")
+    pending = ready_rows(rows)
+    saved = []
+    for attempt in range(WRITE_ATTEMPTS):
+        unassigned = [row for row in pending if not row["Member ID"]]
+        for row, member_id in zip(unassigned, reserve(len(unassigned)) if unassigned else []):
+            row["Member ID"] = member_id
+
+        members = []
+        for row in pending:
+            member = new_member(row["Name"], row["Member ID"])
+            member.eol = "\n"
+            members.append(member)
+        files = [(path_of(m.member_id), format_member(m).encode(), dropbox.files.WriteMode.add) for m in members]
+
+        retry = []
+        for row, member, result in zip(pending, members, upload_batch(dbx, files, max_workers)):
+            if result.is_success():
+                row["Status"] = "Enrolled"
+                saved.append((result.get_success(), member))
+                continue
+            failure = result.get_failure()
+            if not is_retryable_failure(failure):
+                row["Status"], row["Member ID"] = f"Failed: {failure}", ""
+                continue
+            if failure.is_path():
+                row["Member ID"] = ""  # ID already taken
+            retry.append(row)
+        pending = retry
+        if not pending:
+            break
+        time.sleep(backoff_delay(attempt))
+
+    for row in pending:
+        row["Status"], row["Member ID"] = "Not enrolled, please try again.", ""
+    return rows, saved
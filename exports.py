@@ -0,0 +1,99 @@
+import csv
+import importlib.util
+import io
+import tempfile
+from dues_summary import month_key
+from members import FIELDS, MONTHLY_FEE, format_ordinal, month_ordinal, months_due, valid_upto_ordinal
+
+# CSV and XLSX exports of the roster and the dues table, written row by row
+# straight from the member records: no DataFrame and no list of row dicts,
+# so memory does not grow with the roster beyond the output itself.
+DUE_COLUMNS = ["Name", "Member ID", "Due Period", "Due Months", "Due Amount (INR)"]
+CHUNK_ROWS = 1000  # CSV rows encoded per chunk
+
+
+def _amount(value):
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+def _month(value):
+    # "Oct25" -> "OCT25" like format_month; text that is no month stays as it is
+    key = month_key(value)
+    return key if key != "None" else value
+
+
+def roster_rows(members):
+    # Header, one row per member (months as format_month writes them), then
+    # a TOTAL row with the Total Paid of everyone
+    yield FIELDS
+    total_paid = 0
+    for member in members:
+        row = [member.get(field, "None") for field in FIELDS]
+        row[2], row[3], row[4] = _amount(row[2]), _month(row[3]), _month(row[4])
+        if isinstance(row[2], int):
+            total_paid += row[2]
+        yield row
+    yield ["TOTAL", "", total_paid, "", ""]
+
+
+def due_rows(members, now):
+    # The rows of dues.with_total(dues.compute_dues(members, now)), one at a
+    # time, by the same members.months_due() rule
+    yield DUE_COLUMNS
+    now_ord = month_ordinal(now)
+    now_label = format_ordinal(now_ord)
+    total_months = 0
+    for member in members:
+        months = months_due(valid_upto_ordinal(member.get("Valid Upto", "None")), now_ord)
+        if not months:
+            continue
+        total_months += months
+        yield [member.get("Name", ""), member.get("Member ID", ""),
+               f"{format_ordinal(now_ord - months + 1)} - {now_label}", months, months * MONTHLY_FEE]
+    yield ["TOTAL", "", "", total_months, total_months * MONTHLY_FEE]
+
+
+def iter_csv(rows, chunk_rows=CHUNK_ROWS):
+    # CSV as a stream of UTF-8 byte chunks; the byte order mark lets Excel
+    # pick the right encoding, and the payment import reads it back too
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % chunk_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def write_csv(rows, out):
+    for chunk in iter_csv(rows):
+        out.write(chunk)
+
+
+def xlsx_available():
+    return importlib.util.find_spec("openpyxl") is not None
+
+
+def write_xlsx(rows, out, title="Sheet"):
+    # openpyxl's write-only mode streams the rows to a temporary file instead
+    # of keeping every cell in memory. openpyxl is in requirements.txt; an
+    # install without it only offers CSV.
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(out)
+
+
+def render(write, rows, **kwargs):
+    # The finished file as bytes, for a download button. It is built in a
+    # temporary file that moves to disk once it is large, so the worker holds
+    # the rows being written plus the output, never the table.
+    with tempfile.SpooledTemporaryFile(max_size=1 << 20) as out:
+        write(rows, out, **kwargs)
+        out.seek(0)
+        return out.read()
@@ -0,0 +1,222 @@
+import gzip
+import json
+import threading
+import time
+from datetime import datetime
+import dropbox
+from members import format_ordinal, month_ordinal, parse_ordinal
+from writes import is_conflict
+
+# Month-end checkpoints: each member's Valid Upto and Total Paid as they
+# stood when a month ended, one small file per month:
+#
+#   /history/2026-09.json       recent months, plain JSON
+#   /history/2025-06.json.gz    older months, gzip-compressed
+#   /history/watching.json      the month the app started taking checkpoints
+#
+# Dues "as of" a past month are answered from one checkpoint instead of the
+# member files, which only keep their latest state. Checkpoints older than
+# keep_months are deleted, except the December (year-end) ones.
+DEFAULT_ROOT = "/history"
+DEFAULT_KEEP_MONTHS = 24
+PLAIN_MONTHS = 3  # checkpoints this recent stay uncompressed
+COLUMNS = ["Member ID", "Name", "Valid Upto", "Total Paid"]
+WATCHING_NAME = "watching.json"
+RETRY_BASE = 60.0  # seconds before retrying a failed month-end checkpoint
+RETRY_MAX = 3600.0
+
+
+def checkpoint_name(ordinal, compressed=False):
+    return f"{ordinal // 12:04d}-{ordinal % 12 + 1:02d}.json" + (".gz" if compressed else "")
+
+def checkpoint_ordinal(name):
+    # "2026-09.json" or "2026-09.json.gz" -> ordinal; None for anything else
+    stem = name[:-len(".gz")] if name.endswith(".gz") else name
+    try:
+        month = datetime.strptime(stem, "%Y-%m.json")
+    except ValueError:
+        return None
+    return month_ordinal(month)
+
+
+def encode_checkpoint(members, ordinal, now):
+    # The checkpoint is taken from the roster as it is when first seen after
+    # the month ended; "paid_after" counts members who had already paid again
+    # by then, whose figures include that payment
+    rows, paid_after = [], 0
+    for member in members:
+        total_paid = str(member.get("Total Paid", "0"))
+        rows.append([member.get("Member ID", ""), member.get("Name", ""), member.get("Valid Upto", "None"),
+                     int(total_paid) if total_paid.isdigit() else total_paid])
+        last_payment = parse_ordinal(member.get("Last Payment Month", "None"))
+        if isinstance(last_payment, int) and last_payment > ordinal:
+            paid_after += 1
+    return json.dumps({"month": format_ordinal(ordinal), "taken": now.isoformat(timespec="seconds"),
+                       "paid_after": paid_after, "columns": COLUMNS, "members": rows},
+                      ensure_ascii=False).encode("utf-8")
+
+def decode_checkpoint(data, compressed=False):
+    # -> (header, members) where members are dicts with the COLUMNS
+    checkpoint = json.loads(gzip.decompress(data) if compressed else data)
+    columns = checkpoint.pop("columns")
+    members = [dict(zip(columns, row)) for row in checkpoint.pop("members")]
+    return checkpoint, members
+
+
+def list_checkpoints(dbx, root=DEFAULT_ROOT):
+    # ordinal -> file name, oldest first; a plain copy wins over a compressed one
+    try:
+        res = dbx.files_list_folder(root)
+    except dropbox.exceptions.ApiError as e:
+        if isinstance(e.error, dropbox.files.ListFolderError) and e.error.is_path():
+            return {}
+        raise
+    names = []
+    while True:
+        names += [entry.name for entry in res.entries if isinstance(entry, dropbox.files.FileMetadata)]
+        if not res.has_more:
+            break
+        res = dbx.files_list_folder_continue(res.cursor)
+    checkpoints = {}
+    for name in sorted(names, key=lambda n: n.endswith(".gz")):
+        ordinal = checkpoint_ordinal(name)
+        if ordinal is not None:
+            checkpoints.setdefault(ordinal, name)
+    return dict(sorted(checkpoints.items()))
+
+def nearest(checkpoints, ordinal):
+    # The latest checkpoint at or before the month, or None
+    earlier = [c for c in checkpoints if c <= ordinal]
+    return max(earlier) if earlier else None
+
+
+def write_checkpoint(dbx, root, members, ordinal, now):
+    # False when the month already has a checkpoint (e.g. another station
+    # took it first); checkpoints are never replaced
+    try:
+        dbx.files_upload(encode_checkpoint(members, ordinal, now), f"{root}/{checkpoint_name(ordinal)}",
+                         mode=dropbox.files.WriteMode.add, strict_conflict=True)
+    except dropbox.exceptions.ApiError as e:
+        if is_conflict(e):
+            return False
+        raise
+    return True
+
+def read_checkpoint(dbx, root, ordinal):
+    # -> (header, members), or None when the month has no checkpoint. The
+    # compressed copy is tried second, as prune() may have just replaced
+    # the plain one.
+    for compressed in (False, True):
+        try:
+            _, res = dbx.files_download(f"{root}/{checkpoint_name(ordinal, compressed)}")
+        except dropbox.exceptions.ApiError as e:
+            if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+                continue
+            raise
+        return decode_checkpoint(res.content, compressed)
+    return None
+
+
+def prune(dbx, root, now, keep_months=DEFAULT_KEEP_MONTHS, checkpoints=None):
+    # Retention: delete checkpoints more than keep_months old unless they
+    # are a year end, and gzip the ones older than PLAIN_MONTHS.
+    # Returns (compressed, deleted) counts.
+    if checkpoints is None:
+        checkpoints = list_checkpoints(dbx, root)
+    now_ord = month_ordinal(now)
+    compressed = deleted = 0
+    for ordinal, name in checkpoints.items():
+        age = now_ord - ordinal
+        if keep_months and age > keep_months and ordinal % 12 != 11:
+            dbx.files_delete_v2(f"{root}/{name}")
+            deleted += 1
+        elif age > PLAIN_MONTHS and not name.endswith(".gz"):
+            _, res = dbx.files_download(f"{root}/{name}")
+            try:
+                dbx.files_upload(gzip.compress(res.content), f"{root}/{name}.gz",
+                                 mode=dropbox.files.WriteMode.add, strict_conflict=True)
+            except dropbox.exceptions.ApiError as e:
+                if not is_conflict(e):  # already compressed by an interrupted run
+                    raise
+            dbx.files_delete_v2(f"{root}/{name}")
+            compressed += 1
+    return compressed, deleted
+
+
+def take_month_end(dbx, root, now, load, ordinal=None):
+    # Checkpoint the month `ordinal` (by default the one before `now`) from
+    # load() unless it already has one. Returns the ordinal written, or None
+    # when there was nothing to do.
+    if ordinal is None:
+        ordinal = month_ordinal(now) - 1
+    if ordinal in list_checkpoints(dbx, root):
+        return None
+    return ordinal if write_checkpoint(dbx, root, load(), ordinal, now) else None
+
+
+def watching_since(dbx, root, month):
+    # The first month checkpoints were being taken in, recorded in
+    # WATCHING_NAME the first time this is asked. A history that already has
+    # checkpoints started with the oldest of them; otherwise with `month`.
+    path = f"{root}/{WATCHING_NAME}"
+    try:
+        _, res = dbx.files_download(path)
+        return parse_ordinal(json.loads(res.content)["since"])
+    except dropbox.exceptions.ApiError as e:
+        if not (isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path()):
+            raise
+    since = min(list_checkpoints(dbx, root), default=month)
+    try:
+        dbx.files_upload(json.dumps({"since": format_ordinal(since)}).encode(), path,
+                         mode=dropbox.files.WriteMode.add, strict_conflict=True)
+    except dropbox.exceptions.ApiError as e:
+        if not is_conflict(e):
+            raise
+        return watching_since(dbx, root, month)  # another station recorded it first
+    return since
+
+
+# Takes the month-end checkpoint the first time the app runs in a new month,
+# and applies the retention policy after writing one. The month is
+# remembered per process, so later reruns cost nothing, and a lock keeps
+# concurrent sessions from all doing it at once. A month that ended before
+# the app started watching is not checkpointed, as the roster no longer
+# shows it. After a failure the month is tried again only once a growing
+# delay has passed, rather than on every rerun.
+class MonthEnd:
+    def __init__(self, dbx, root, load, keep_months=DEFAULT_KEEP_MONTHS):
+        self.dbx = dbx
+        self.root = root
+        self.load = load
+        self.keep_months = keep_months
+        self._lock = threading.Lock()
+        self._checked = None  # ordinal of the month already handled
+        self._failed = None  # (month, failures, time.monotonic() of the next try)
+
+    def ensure(self, now):
+        # -> the ordinal checkpointed by this call, or None
+        month = month_ordinal(now)
+        if self._checked == month:
+            return None
+        with self._lock:
+            if self._checked == month:
+                return None
+            failures = 0
+            if self._failed is not None and self._failed[0] == month:
+                _, failures, retry_at = self._failed
+                if time.monotonic() < retry_at:
+                    return None
+            try:
+                written = None
+                if watching_since(self.dbx, self.root, month) < month:
+                    written = take_month_end(self.dbx, self.root, now, self.load)
+                if written is not None:
+                    prune(self.dbx, self.root, now, self.keep_months)
+            except Exception:
+                delay = min(RETRY_MAX, RETRY_BASE * 2 ** failures)
+                self._failed = (month, failures + 1, time.monotonic() + delay)
+                raise
+            self._checked = month
+            self._failed = None
+            return written
+
@@ -0,0 +1,227 @@
+import json
+import threading
+import uuid
+from datetime import datetime
+import dropbox
+import diagnostics
+from members import FIELDS, Member, apply_payment
+from roster import DEFAULT_MAX_WORKERS
+from snapshot import decode_snapshot, encode_snapshot
+from writes import WRITE_ATTEMPTS, conditional_mode
+
+# Members and payments as an append-only ledger:
+#
+#   /ledger/checkpoint.jsonl    compacted roster: a header line naming the
+#                               segments folded into it, then one member per line
+#   /ledger/segments/<day>/<stamp>-<id>.jsonl
+#                               events not yet compacted, one JSON object per line
+#   /ledger/archive/...         segments already folded in, kept as the payment history
+#
+# Every write is a new segment (WriteMode.add): recording a payment is a single
+# upload with no download first and nothing to conflict with. A segment holds
+# one event, or every payment of an import batch. Member state is the
+# checkpoint plus the remaining segments replayed in name order; compact()
+# folds those segments into a new checkpoint and moves them to the archive.
+DEFAULT_ROOT = "/ledger"
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+
+def payment_event(member_id, amount, now):
+    return {"type": "payment", "member_id": member_id, "amount": amount, "at": now.isoformat()}
+
+def member_event(member):
+    return {"type": "member", "member": {key: member.get(key, "None") for key in FIELDS}}
+
+def apply_event(members, event):
+    # members maps member ID -> member and is edited in place
+    if event["type"] == "member":
+        members.setdefault(event["member"]["Member ID"], Member.from_mapping(event["member"]))
+    elif event["type"] == "payment":
+        member = members.get(event["member_id"])
+        if member is not None:
+            apply_payment(member, event["amount"], datetime.fromisoformat(event["at"]))
+
+
+def encode_events(events):
+    return "\n".join(json.dumps(e, ensure_ascii=False) for e in events).encode("utf-8")
+
+def encode_checkpoint(members, folded):
+    return json.dumps({"folded": folded}).encode("utf-8") + b"\n" + encode_snapshot(members)
+
+def decode_checkpoint(data):
+    # Segments, checkpoints and snapshots are all JSON Lines
+    records = decode_snapshot(data)
+    if records and "folded" in records[0]:
+        return [Member.from_mapping(m) for m in records[1:]], records[0]["folded"]
+    return [Member.from_mapping(m) for m in records], []
+
+
+def segment_key(now, tag=None):
+    # Sorts by time; the random suffix keeps stations from colliding. A
+    # caller that may retry the same write passes its own fixed tag.
+    return f"{now:%Y-%m-%d}/{now:%Y%m%dT%H%M%S%f}-{tag or uuid.uuid4().hex[:8]}.jsonl"
+
+def checkpoint_path(root):
+    return f"{root}/{CHECKPOINT_NAME}"
+
+
+def read_checkpoint(dbx, root=DEFAULT_ROOT):
+    # -> (members, folded segment keys, rev); an empty ledger has rev None
+    try:
+        metadata, res = dbx.files_download(checkpoint_path(root))
+    except dropbox.exceptions.ApiError as e:
+        if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+            return [], [], None
+        raise
+    members, folded = decode_checkpoint(res.content)
+    return members, folded, metadata.rev
+
+def read_segment(dbx, root, key):
+    # None when the segment has been archived since it was listed
+    try:
+        _, res = dbx.files_download(f"{root}/segments/{key}")
+    except dropbox.exceptions.ApiError as e:
+        if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+            return None
+        raise
+    return decode_snapshot(res.content)
+
+def list_segments(dbx, root=DEFAULT_ROOT):
+    # Keys ("<day>/<name>") of the segments not yet archived, in replay order
+    folder = f"{root}/segments"
+    try:
+        res = dbx.files_list_folder(folder, recursive=True)
+    except dropbox.exceptions.ApiError as e:
+        if isinstance(e.error, dropbox.files.ListFolderError) and e.error.is_path():
+            return []
+        raise
+    keys = []
+    while True:
+        keys += [entry.path_display[len(folder) + 1:] for entry in res.entries
+                 if isinstance(entry, dropbox.files.FileMetadata) and entry.name.endswith(".jsonl")]
+        if not res.has_more:
+            return sorted(keys)
+        res = dbx.files_list_folder_continue(res.cursor)
+
+
+def append_events(dbx, events, now, root=DEFAULT_ROOT, tag=None):
+    key = segment_key(now, tag)
+    dbx.files_upload(encode_events(events), f"{root}/segments/{key}", mode=dropbox.files.WriteMode.add)
+    return key
+
+
+def archive_segments(dbx, root, keys):
+    for key in keys:
+        try:
+            dbx.files_move_v2(f"{root}/segments/{key}", f"{root}/archive/{key}")
+        except dropbox.exceptions.ApiError as e:
+            # Already archived by an earlier, interrupted compaction
+            if not (isinstance(e.error, dropbox.files.RelocationError) and e.error.is_from_lookup()):
+                raise
+
+
+def compact(dbx, root=DEFAULT_ROOT, max_workers=DEFAULT_MAX_WORKERS):
+    # Fold every pending segment into a new checkpoint, then archive them.
+    # The checkpoint write is conditional on the rev we read, so a compaction
+    # racing with another one fails with a conflict instead of losing events.
+    # Returns the number of segments folded.
+    members, folded, rev = read_checkpoint(dbx, root)
+    archive_segments(dbx, root, folded)
+    pending = [key for key in list_segments(dbx, root) if key not in set(folded)]
+    if not pending:
+        return 0
+
+    by_id = {m["Member ID"]: m for m in members}
+    with diagnostics.thread_pool(max_workers) as pool:
+        for events in pool.map(lambda key: read_segment(dbx, root, key), pending):
+            if events is None:
+                raise RuntimeError("A ledger segment disappeared during compaction; is another compaction running?")
+            for event in events:
+                apply_event(by_id, event)
+    dbx.files_upload(encode_checkpoint(list(by_id.values()), pending), checkpoint_path(root),
+                     mode=conditional_mode(rev), strict_conflict=True)
+    # Readers skip segments named in the checkpoint header, so it does not
+    # matter if they still see some of these before the moves finish
+    archive_segments(dbx, root, pending)
+    return len(pending)
+
+
+def start_ledger(dbx, members, root=DEFAULT_ROOT):
+    # Seed an empty ledger with an existing roster as its first checkpoint
+    dbx.files_upload(encode_checkpoint(members, []), checkpoint_path(root), mode=dropbox.files.WriteMode.add)
+    return len(members)
+
+
+# Replayed ledger state kept in memory between reruns. refresh() lists the
+# pending segments and downloads only the ones it has not seen; the
+# checkpoint is downloaded again only when its rev changes.
+class Ledger:
+    def __init__(self, dbx, root=DEFAULT_ROOT, max_workers=DEFAULT_MAX_WORKERS):
+        self.dbx = dbx
+        self.root = root
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.checkpoint_rev = None
+        self.base = []  # members as of the checkpoint
+        self.folded = set()
+        self.events = {}  # segment key -> events
+        self.applied = None  # segment keys replayed onto base, in order
+        self.members = {}  # member ID -> member
+
+    def _checkpoint_rev(self):
+        try:
+            res = self.dbx.files_list_folder(self.root)
+        except dropbox.exceptions.ApiError as e:
+            if isinstance(e.error, dropbox.files.ListFolderError) and e.error.is_path():
+                return None
+            raise
+        for entry in res.entries:
+            if isinstance(entry, dropbox.files.FileMetadata) and entry.name == CHECKPOINT_NAME:
+                return entry.rev
+        return None
+
+    def refresh(self):
+        # Current members (shared objects; copy before editing)
+        with self._lock:
+            for _ in range(WRITE_ATTEMPTS):
+                members = self._refresh()
+                if members is not None:
+                    return members
+            raise RuntimeError("The ledger kept changing while it was being read.")
+
+    def _refresh(self):
+        # Segments first: any that a concurrent compaction folds in the
+        # meantime are named in the newer checkpoint's header and skipped
+        keys = list_segments(self.dbx, self.root)
+        rev = self._checkpoint_rev()
+        if rev != self.checkpoint_rev:
+            self.base, folded, self.checkpoint_rev = read_checkpoint(self.dbx, self.root)
+            self.folded = set(folded)
+            self.applied = None
+
+        pending = [key for key in keys if key not in self.folded]
+        missing = [key for key in pending if key not in self.events]
+        with diagnostics.thread_pool(self.max_workers) as pool:
+            for key, events in zip(missing, pool.map(lambda k: read_segment(self.dbx, self.root, k), missing)):
+                if events is None:
+                    return None  # compacted under us; start over with the new checkpoint
+                self.events[key] = events
+        self.events = {key: self.events[key] for key in pending}
+
+        if self.applied is None or pending[:len(self.applied)] != self.applied:
+            # New checkpoint, or a segment that sorts before ones already
+            # applied: replay everything from the checkpoint
+            self.members = {m["Member ID"]: m.copy() for m in self.base}
+            self.applied = []
+        for key in pending[len(self.applied):]:
+            for event in self.events[key]:
+                apply_event(self.members, event)
+        self.applied = pending
+        return list(self.members.values())
+
+    def append(self, events, now):
+        key = append_events(self.dbx, events, now, self.root)
+        with self._lock:
+            # Our own segment does not need downloading on the next refresh
+            self.events[key] = events
+        return key
@@ -0,0 +1,208 @@
+import argparse
+import dropbox
+import dues_summary
+import history
+import ledger
+import member_paths
+import roster
+import snapshot
+import storage
+from datetime import datetime
+from members import format_ordinal, month_ordinal
+from settings import get_setting
+from writes import is_conflict
+
+
+def get_storage(max_connections=roster.DEFAULT_MAX_WORKERS):
+    # Same settings as the app: STORAGE_BACKEND picks Dropbox or a local stand-in
+    kind = get_setting("STORAGE_BACKEND", "dropbox")
+    client = None
+    if kind == "dropbox":
+        token = get_setting("DROPBOX_ACCESS_TOKEN")
+        if not token:
+            raise SystemExit("DROPBOX_ACCESS_TOKEN is not set (environment or .streamlit/secrets.toml).")
+        client = dropbox.Dropbox(token, session=dropbox.create_session(max_connections=max_connections))
+    return storage.make_backend(kind, client, get_setting("LOCAL_STORAGE_ROOT", storage.DEFAULT_LOCAL_ROOT),
+                                float(get_setting("STORAGE_LATENCY", 0)))
+
+
+def migrate_snapshot(args):
+    dbx = get_storage(args.workers)
+    count = snapshot.migrate_folder(dbx, args.folder, args.snapshot, max_workers=args.workers)
+    print(f"Wrote {count} members from {args.folder} to {args.snapshot}.")
+    print("Set MEMBER_STORAGE = \"snapshot\" in secrets.toml to switch the app over.")
+
+
+def migrate_ledger(args):
+    dbx = get_storage(args.workers)
+    if args.source == "snapshot":
+        members, _ = snapshot.read_snapshot(dbx, args.snapshot)
+    else:
+        members = roster.load_members(dbx, args.folder, max_workers=args.workers)
+    try:
+        count = ledger.start_ledger(dbx, members, args.ledger)
+    except dropbox.exceptions.ApiError:
+        raise SystemExit(f"{args.ledger} already has a checkpoint; nothing was changed.")
+    print(f"Wrote {count} members to the ledger checkpoint in {args.ledger}.")
+    print("Set MEMBER_STORAGE = \"ledger\" in secrets.toml to switch the app over.")
+
+
+def compact_ledger(args):
+    dbx = get_storage(args.workers)
+    try:
+        count = ledger.compact(dbx, args.ledger, max_workers=args.workers)
+    except dropbox.exceptions.ApiError as e:
+        if is_conflict(e):
+            raise SystemExit("Another compaction updated the checkpoint first; run again.")
+        raise
+    print(f"Folded {count} segments into {ledger.checkpoint_path(args.ledger)}.")
+
+
+def load_roster(dbx, args):
+    if args.source == "snapshot":
+        return snapshot.read_snapshot(dbx, args.snapshot)[0]
+    if args.source == "ledger":
+        return ledger.Ledger(dbx, args.ledger, max_workers=args.workers).refresh()
+    return roster.load_members(dbx, args.folder, max_workers=args.workers)
+
+
+def check_dues_summary(args):
+    dbx = get_storage(args.workers)
+    now = datetime.now()
+    members = load_roster(dbx, args)
+    summary, _ = dues_summary.read_summary(dbx, args.summary)
+    if summary is None:
+        differences = [("summary", "missing", f"{len(members)} members")]
+    else:
+        differences = dues_summary.check_summary(summary, members, now)
+    if not differences:
+        print(f"{args.summary} matches the {len(members)} members in the roster.")
+        return
+    for field, stored, rebuilt in differences:
+        print(f"{field}: {stored} in the summary, {rebuilt} in the roster")
+    if not args.fix:
+        raise SystemExit(f"{args.summary} differs from the roster; run again with --fix to rebuild it.")
+    dues_summary.rebuild_summary(dbx, args.summary, members, now)
+    print(f"Rebuilt {args.summary} from the {len(members)} members in the roster.")
+
+
+def due_report(args):
+    import dues
+    import reports
+    dbx = get_storage(args.workers)
+    now = datetime.now().replace(day=1)
+    members = load_roster(dbx, args)
+    due_table = dues.compute_dues(members, now)
+    unwritable = reports.unwritable(due_table["Name"])
+    if unwritable:
+        raise SystemExit(f"The PDF fonts cannot write these names: {', '.join(unwritable)}. "
+                         f"The CSV and Excel exports on the View Dues page include them.")
+    output = args.output or f"due_report_{now.strftime('%B_%Y')}.zip"
+    count = reports.write_report_zip(reports.iter_rows(dues.with_total(due_table)),
+                                     reports.statement_rows(members, due_table), now, output,
+                                     processes=args.processes)
+    print(f"Wrote the due list and {count} member statements to {output}.")
+
+
+def checkpoint_month(args):
+    dbx = get_storage(args.workers)
+    now = datetime.now()
+    month = month_ordinal(now) - (0 if args.current else 1)
+    written = history.take_month_end(dbx, args.history, now, lambda: load_roster(dbx, args), ordinal=month)
+    label = format_ordinal(month)
+    if written is None:
+        print(f"{label} already has a checkpoint in {args.history}.")
+    else:
+        print(f"Wrote the {label} checkpoint to {args.history}.")
+    compressed, deleted = history.prune(dbx, args.history, now, args.keep_months)
+    if compressed or deleted:
+        print(f"Compressed {compressed} and deleted {deleted} older checkpoints.")
+
+
+def reshard_members(args):
+    dbx = get_storage(args.workers)
+    try:
+        shard_size = member_paths.check_shard_size(args.shard_size)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    moved, skipped = roster.reshard_folder(dbx, args.folder, shard_size, max_workers=args.workers)
+    layout = f"shards of {shard_size}" if shard_size else "one flat folder"
+    print(f"Moved {moved} member files in {args.folder} into {layout}.")
+    for path in skipped:
+        print(f"Skipped {path}: a file with the same name is already in place.")
+    if shard_size != int(get_setting("MEMBER_SHARD_SIZE", member_paths.DEFAULT_SHARD_SIZE)):
+        print(f"Set MEMBER_SHARD_SIZE = {shard_size} in secrets.toml so new members are written there too.")
+
+
+def build_parser():
+    # Options shared by several commands live in parent parsers: --workers
+    # everywhere, where the roster is kept, and which layout to read it from
+    workers = argparse.ArgumentParser(add_help=False)
+    workers.add_argument("--workers", type=int,
+                         default=int(get_setting("MEMBER_LOAD_WORKERS", roster.DEFAULT_MAX_WORKERS)))
+    locations = argparse.ArgumentParser(add_help=False, parents=[workers])
+    locations.add_argument("--folder", default="/members")
+    locations.add_argument("--snapshot", default=get_setting("SNAPSHOT_PATH", snapshot.DEFAULT_PATH))
+    locations.add_argument("--ledger", default=get_setting("LEDGER_ROOT", ledger.DEFAULT_ROOT))
+    source = argparse.ArgumentParser(add_help=False, parents=[locations])
+    source.add_argument("--source", choices=["files", "snapshot", "ledger"],
+                        default=get_setting("MEMBER_STORAGE", "files"))
+
+    parser = argparse.ArgumentParser(description="RKSC membership maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-snapshot", parents=[workers],
+                                  help="Convert the per-member files into a single roster snapshot")
+    migrate.add_argument("--folder", default="/members")
+    migrate.add_argument("--snapshot", default=get_setting("SNAPSHOT_PATH", snapshot.DEFAULT_PATH))
+    migrate.set_defaults(func=migrate_snapshot)
+
+    start = commands.add_parser("migrate-ledger", parents=[locations],
+                                help="Seed the payment ledger with the current roster as its first checkpoint")
+    start.add_argument("--source", choices=["files", "snapshot"],
+                       default="snapshot" if get_setting("MEMBER_STORAGE") == "snapshot" else "files")
+    start.set_defaults(func=migrate_ledger)
+
+    compact = commands.add_parser("compact-ledger", parents=[workers],
+                                  help="Fold pending ledger segments into a new checkpoint and archive them")
+    compact.add_argument("--ledger", default=get_setting("LEDGER_ROOT", ledger.DEFAULT_ROOT))
+    compact.set_defaults(func=compact_ledger)
+
+    reshard = commands.add_parser("reshard-members", parents=[workers],
+                                  help="Move the per-member files into shard folders of --shard-size members")
+    reshard.add_argument("--folder", default="/members")
+    reshard.add_argument("--shard-size", type=int,
+                         default=int(get_setting("MEMBER_SHARD_SIZE", member_paths.DEFAULT_SHARD_SIZE)),
+                         help="members per shard folder (a power of ten); 0 moves every file back to the folder")
+    reshard.set_defaults(func=reshard_members)
+
+    check = commands.add_parser("check-dues-summary", parents=[source],
+                                help="Rebuild the dues summary from the roster and show where it differs")
+    check.add_argument("--summary", default=get_setting("DUES_SUMMARY_PATH", dues_summary.DEFAULT_PATH))
+    check.add_argument("--fix", action="store_true", help="replace the summary with the rebuilt one")
+    check.set_defaults(func=check_dues_summary)
+
+    report = commands.add_parser("due-report", parents=[source],
+                                 help="Write the due list and a statement for every member with dues to one zip")
+    report.add_argument("--output", help="zip file to write (default due_report_<Month>_<Year>.zip)")
+    report.add_argument("--processes", type=int, help="worker processes rendering statements (default: one per core)")
+    report.set_defaults(func=due_report)
+
+    month_end = commands.add_parser("checkpoint-month", parents=[source],
+                                    help="Record last month's Valid Upto and Total Paid per member, then prune")
+    month_end.add_argument("--current", action="store_true",
+                           help="checkpoint the current month instead (run it late on the month's last day)")
+    month_end.add_argument("--history", default=get_setting("HISTORY_ROOT", history.DEFAULT_ROOT))
+    month_end.add_argument("--keep-months", type=int,
+                           default=int(get_setting("HISTORY_KEEP_MONTHS", history.DEFAULT_KEEP_MONTHS)))
+    month_end.set_defaults(func=checkpoint_month)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import dropbox
+import diagnostics
+from member_paths import is_member_path, member_id_of
+from members import Member, format_member, parse_member
+from roster import DEFAULT_MAX_WORKERS, download_member, is_member_file, iter_listings
+
+
+# On-disk cache of parsed member files. The Dropbox listing cursor is stored
+# with it so a warm load only fetches files that were added or changed. The
+# cursor is recursive, so member files in shard folders are followed too.
+class MemberCache:
+    def __init__(self, dbx, folder, path, max_workers=DEFAULT_MAX_WORKERS):
+        self.dbx = dbx
+        self.folder = folder
+        self.path = path
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.cursor = None
+        self.entries = {}  # path_lower -> {"rev", "content_hash", "member", "path"}
+        self._paths = None  # upper-cased member ID -> path, built on demand
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("folder") == self.folder:
+            # Caches from before shard support hold a non-recursive cursor
+            self.cursor = state.get("cursor") if state.get("recursive") else None
+            self.entries = state.get("entries", {})
+            for entry in self.entries.values():
+                member = entry["member"]
+                entry["member"] = parse_member(member) if isinstance(member, str) else Member.from_mapping(member)
+
+    def _save(self):
+        state = {"folder": self.folder, "recursive": True, "cursor": self.cursor, "entries": self.entries}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # Members are stored as their file text, which parses back exactly
+            json.dump(state, f, default=format_member)
+        os.replace(tmp_path, self.path)
+
+    def _list_all(self):
+        # Full listing, with each shard folder listed in parallel. The cursor
+        # is taken first, so anything changed meanwhile comes up again at the
+        # next sync (and is skipped there if its rev is already cached).
+        cursor = self.dbx.files_list_folder_get_latest_cursor(self.folder, recursive=True).cursor
+        changes = [entry for page in iter_listings(self.dbx, self.folder, self.max_workers) for entry in page]
+        return changes, cursor
+
+    def _list_changes(self, cursor):
+        if cursor is None:
+            return self._list_all()
+        res = self.dbx.files_list_folder_continue(cursor)
+        changes = list(res.entries)
+        while res.has_more:
+            res = self.dbx.files_list_folder_continue(res.cursor)
+            changes.extend(res.entries)
+        return changes, res.cursor
+
+    def _fetch_changes(self, full):
+        if full or self.cursor is None:
+            return self._list_changes(None) + (True,)
+        try:
+            return self._list_changes(self.cursor) + (False,)
+        except dropbox.exceptions.ApiError as e:
+            # An expired cursor means Dropbox can no longer describe the changes
+            if isinstance(e.error, dropbox.files.ListFolderContinueError) and e.error.is_reset():
+                return self._list_changes(None) + (True,)
+            raise
+
+    def sync(self, full=False):
+        with self._lock:
+            changes, cursor, reset = self._fetch_changes(full)
+            if reset:
+                # After an expired cursor, unchanged files can still be reused by rev
+                previous, entries = ({} if full else self.entries), {}
+            else:
+                previous, entries = {}, self.entries
+
+            to_fetch = []
+            for entry in changes:
+                key = entry.path_lower
+                if isinstance(entry, dropbox.files.DeletedMetadata):
+                    entries.pop(key, None)
+                    prefix = key + "/"
+                    for child in [k for k in entries if k.startswith(prefix)]:
+                        del entries[child]
+                elif is_member_file(entry) and is_member_path(entry.path_display, self.folder):
+                    cached = entries.get(key) or previous.get(key)
+                    if cached and (cached["rev"] == entry.rev or cached["content_hash"] == entry.content_hash):
+                        entries[key] = dict(cached, rev=entry.rev, path=entry.path_display)
+                    else:
+                        to_fetch.append(entry)
+
+            if to_fetch:
+                with diagnostics.thread_pool(self.max_workers) as pool:
+                    members = list(pool.map(lambda e: download_member(self.dbx, e.path_display, rev=e.rev), to_fetch))
+                for entry, member in zip(to_fetch, members):
+                    entries[entry.path_lower] = {
+                        "rev": entry.rev,
+                        "content_hash": entry.content_hash,
+                        "member": member,
+                        "path": entry.path_display,
+                    }
+
+            changed = reset or bool(changes) or cursor != self.cursor
+            if reset or changes:
+                self._paths = None
+            self.entries = entries
+            self.cursor = cursor
+            if changed:
+                self._save()
+            return [e["member"] for e in self.entries.values()]
+
+    def find(self, member_id):
+        self.sync()
+        path = self.path_of(member_id)
+        cached = self.entries.get(path.lower()) if path else None
+        return cached["member"].copy() if cached else None
+
+    def path_of(self, member_id):
+        # Where the member's file was last listed (flat or in any shard), or
+        # None if it was not
+        with self._lock:
+            if self._paths is None:
+                self._paths = {member_id_of(key).upper(): entry.get("path", key) for key, entry in self.entries.items()}
+            return self._paths.get(member_id.upper())
+
+    def remember(self, metadata, member):
+        # Seed the cache with a file we just uploaded so the next sync,
+        # which will see the same rev, does not download it again.
+        with self._lock:
+            self.entries[metadata.path_lower] = {
+                "rev": metadata.rev,
+                "content_hash": metadata.content_hash,
+                "member": member,
+                "path": metadata.path_display,
+            }
+            if self._paths is not None:
+                self._paths[member_id_of(metadata.path_lower).upper()] = metadata.path_display
@@ -0,0 +1,73 @@
+import dropbox
+from member_paths import shard_start
+from roster import is_member_file, is_shard_folder, iter_member_entries, iter_pages
+from writes import conditional_mode, retry_on_conflict
+
+# Small Dropbox file holding the last member number handed out
+DEFAULT_COUNTER_PATH = "/member_counter.txt"
+
+
+def format_member_id(number):
+    return f"RKSC{number:04d}"
+
+def read_counter(dbx, path):
+    try:
+        metadata, res = dbx.files_download(path)
+    except dropbox.exceptions.ApiError as e:
+        if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+            return None, None
+        raise
+    return int(res.content.decode("utf-8").strip()), metadata.rev
+
+def reserve_ids(dbx, count=1, path=DEFAULT_COUNTER_PATH, seed=None):
+    # Reserve `count` consecutive member IDs with one download and one
+    # rev-conditional upload. seed() supplies the highest existing number the
+    # first time, before the counter file exists.
+    def attempt():
+        last, rev = read_counter(dbx, path)
+        if last is None:
+            last = seed() if seed else 0
+        dbx.files_upload(str(last + count).encode(), path, mode=conditional_mode(rev), strict_conflict=True)
+        return [format_member_id(n) for n in range(last + 1, last + count + 1)]
+
+    ids, _ = retry_on_conflict(attempt)
+    return ids
+
+
+def file_number(filename):
+    try:
+        return int(filename.replace("RKSC", "").replace(".txt", ""))
+    except:
+        return None
+
+def highest_existing_number(dbx, folder):
+    # Folder scan; only used to seed the counter file the first time. Shard
+    # folders hold ID ranges, so only the highest one with files is listed.
+    try:
+        existing_ids = []
+        shards = []
+
+        for page in iter_pages(dbx, folder):
+            for entry in page:
+                if is_shard_folder(entry):
+                    shards.append(entry)
+                elif is_member_file(entry) and entry.name.startswith("RKSC"):
+                    existing_ids.append(file_number(entry.name))
+
+        for shard in sorted(shards, key=lambda e: shard_start(e.name), reverse=True):
+            numbers = [file_number(e.name) for e in iter_member_entries(dbx, shard.path_display)
+                       if e.name.startswith("RKSC")]
+            if any(n is not None for n in numbers):
+                existing_ids += numbers
+                break
+
+        existing_ids = [n for n in existing_ids if n is not None]
+        return max(existing_ids) if existing_ids else 0
+
+    except dropbox.exceptions.ApiError as e:
+        # If folder doesn't exist, create it and start with ID 0001
+        if isinstance(e.error, dropbox.files.ListFolderError) and e.error.is_path():
+            dbx.files_create_folder_v2(folder)
+            return 0
+        else:
+            raise
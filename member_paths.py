@@ -0,0 +1,52 @@
+import re
+from members import member_number
+
+# Optional sharded layout of the member folder. With a shard size of 100,
+# RKSC0042.txt lives in /members/RKSC00xx/ and RKSC1234.txt in
+# /members/RKSC12xx/, so no folder holds more than 100 members. A shard size
+# of 0 keeps every file directly in the folder (the original layout).
+#
+# Reading does not depend on the setting: listings take member files from
+# the folder itself and from any shard folder, so a folder in the middle of
+# being re-sharded still reads complete. The shard size only decides where
+# new files are written and where reshard moves existing ones.
+DEFAULT_SHARD_SIZE = 0
+SHARD_NAME = re.compile(r"RKSC(\d+)(x+)", re.IGNORECASE)
+
+
+def check_shard_size(shard_size):
+    if shard_size and not re.fullmatch(r"10+", str(shard_size)):
+        raise ValueError(f"Member shard size must be 0 or a power of ten (10, 100, ...), not {shard_size}")
+    return shard_size
+
+
+def shard_name(member_id, shard_size):
+    # "RKSC1234" -> "RKSC12xx" with shards of 100; None when not sharded
+    number = member_number(member_id)
+    if not shard_size or number is None:
+        return None
+    digits = len(str(shard_size)) - 1
+    return f"RKSC{number // shard_size * shard_size:04d}"[:-digits] + "x" * digits
+
+
+def shard_start(name):
+    # "RKSC12xx" -> 1200, the lowest member number the shard can hold
+    match = SHARD_NAME.fullmatch(name)
+    return int(match.group(1)) * 10 ** len(match.group(2)) if match else None
+
+
+def member_path(folder, member_id, shard_size=DEFAULT_SHARD_SIZE):
+    shard = shard_name(member_id, shard_size)
+    return f"{folder}/{shard}/{member_id}.txt" if shard else f"{folder}/{member_id}.txt"
+
+
+def is_member_path(path, folder):
+    # A member file directly in folder or in one of its shard folders
+    parts = path[len(folder) + 1:].split("/") if path.lower().startswith(folder.lower() + "/") else []
+    return (len(parts) == 1 or (len(parts) == 2 and SHARD_NAME.fullmatch(parts[0]) is not None)) \
+        and parts[-1].lower().endswith(".txt")
+
+
+def member_id_of(path):
+    # "/members/RKSC00xx/RKSC0042.txt" -> "RKSC0042"
+    return path.rsplit("/", 1)[-1][:-len(".txt")]
@@ -0,0 +1,225 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from collections import Counter
+
+DEFAULT_LIMIT = 20
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MAX_TOKENS = 8  # most similar name tokens used per query
+FUZZY_MAX_MEMBERS = 2000  # members gathered from more than one of them
+SHORT_PREFIX = 2  # name prefixes up to this long keep their own member sets
+DENSE_RATIO = 64  # matches as common as one member in this many are looked for in ID order
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _WORD.findall(str(text).casefold())
+
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def member_label(member):
+    return f"{member.get('Member ID', '')} - {member.get('Name', 'Unknown')}"
+
+
+def _sorted_remove(keys, key):
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+def _prefixed(keys, prefix):
+    # Entries of the sorted list that start with prefix, in order
+    i = bisect.bisect_left(keys, prefix)
+    while i < len(keys) and keys[i].startswith(prefix):
+        yield keys[i]
+        i += 1
+
+
+# In-memory search index over the roster for the member pickers:
+#   - upper-cased Member IDs in a sorted list, so an ID prefix is one bisect
+#   - name tokens -> member IDs, with the tokens kept sorted for prefix matches
+#   - one- and two-letter name prefixes -> member IDs, as these match so many
+#     tokens that merging their member sets on every keystroke is too slow
+#   - token trigrams -> tokens, for typo-tolerant matching when the exact and
+#     prefix matches come up short
+# Built once, then kept current with update() as members are written and
+# sync() when a freshly loaded roster is at hand.
+class MemberIndex:
+    def __init__(self, members=()):
+        self._lock = threading.Lock()
+        self.members = {}  # member ID -> member
+        self.words = {}  # member ID -> name tokens
+        self.id_keys = []  # sorted upper-cased member IDs
+        self.by_key = {}  # upper-cased member ID -> member ID
+        self.postings = {}  # name token -> set of member IDs
+        self.tokens = []  # sorted name tokens
+        self.short = {}  # name prefix of up to SHORT_PREFIX letters -> set of member IDs
+        self.grams = {}  # trigram -> set of name tokens
+        self.sync(members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def _add(self, member):
+        member_id = member.get("Member ID")
+        if not member_id:
+            return
+        self._remove(member_id)
+        words = tuple(set(tokenize(member.get("Name", ""))))
+        self.members[member_id] = member
+        self.words[member_id] = words
+        self.by_key[member_id.upper()] = member_id
+        bisect.insort(self.id_keys, member_id.upper())
+        for prefix in {token[:n] for token in words for n in range(1, SHORT_PREFIX + 1)}:
+            self.short.setdefault(prefix, set()).add(member_id)
+        for token in words:
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                bisect.insort(self.tokens, token)
+                for gram in trigrams(token):
+                    self.grams.setdefault(gram, set()).add(token)
+            ids.add(member_id)
+
+    def _remove(self, member_id):
+        if self.members.pop(member_id, None) is None:
+            return
+        del self.by_key[member_id.upper()]
+        _sorted_remove(self.id_keys, member_id.upper())
+        words = self.words.pop(member_id)
+        for prefix in {token[:n] for token in words for n in range(1, SHORT_PREFIX + 1)}:
+            ids = self.short[prefix]
+            ids.discard(member_id)
+            if not ids:
+                del self.short[prefix]
+        for token in words:
+            ids = self.postings[token]
+            ids.discard(member_id)
+            if not ids:
+                del self.postings[token]
+                _sorted_remove(self.tokens, token)
+                for gram in trigrams(token):
+                    self.grams[gram].discard(token)
+
+    def update(self, member):
+        with self._lock:
+            self._add(member)
+
+    def sync(self, members):
+        # Bring the index in line with a full roster, re-indexing only the
+        # members that were added, changed or removed since the last sync
+        with self._lock:
+            seen = set()
+            for member in members:
+                member_id = member.get("Member ID")
+                seen.add(member_id)
+                current = self.members.get(member_id)
+                if current is not member and current != member:
+                    self._add(member)
+            for member_id in self.members.keys() - seen:
+                self._remove(member_id)
+
+    def get(self, member_id):
+        return self.members.get(member_id)
+
+    def label(self, member_id):
+        return member_label(self.members[member_id])
+
+    def _with_prefix(self, word):
+        # Members with a name word starting with word (a shared set; do not edit)
+        if len(word) <= SHORT_PREFIX:
+            return self.short.get(word, set())
+        sets = [self.postings[token] for token in _prefixed(self.tokens, word)]
+        return sets[0] if len(sets) == 1 else set().union(*sets)
+
+    def _first(self, sets, count, skip=()):
+        # The first count member IDs in ID order (the order of id_keys) that
+        # are in every one of sets, leaving out those in skip. When even the
+        # smallest set holds a good share of the roster, the matches usually
+        # turn up within a short walk along the sorted IDs; otherwise, or when
+        # that walk comes up short, the sets are intersected, smallest first.
+        sets = sorted(sets, key=len)
+        if count <= 0 or not sets[0]:
+            return []
+        if len(sets[0]) * DENSE_RATIO >= len(self.id_keys):
+            # filter() and map() keep the walk itself out of the interpreter loop
+            steps = count * DENSE_RATIO
+            found = map(self.by_key.__getitem__, itertools.islice(self.id_keys, steps))
+            for ids in sets:
+                found = filter(ids.__contains__, found)
+            picked = list(itertools.islice(itertools.filterfalse(skip.__contains__, found), count))
+            if len(picked) == count or steps >= len(self.id_keys):
+                return picked
+        ids = set.intersection(*sets)
+        return heapq.nsmallest(count, (member_id for member_id in ids if member_id not in skip), key=str.upper)
+
+    def _fuzzy_tokens(self, word):
+        # (similarity, token) for the name tokens spelt like word
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        # Dice coefficient over the trigram sets. A token has at least n
+        # trigrams, so one sharing fewer than a third of word's cannot reach
+        # FUZZY_MIN_SIMILARITY and is skipped without working out its own.
+        similar = ((2 * n / (len(grams) + len(trigrams(token))), token)
+                   for token, n in shared.items() if 3 * n >= len(grams))
+        return [(score, token) for score, token in similar if score >= FUZZY_MIN_SIMILARITY]
+
+    def _fuzzy_members(self, words):
+        # Members with a name token spelt like one of words, from the
+        # FUZZY_MAX_TOKENS most similar tokens. The most similar one's members
+        # are taken as they are; the others' are merged in only while that
+        # keeps the total under FUZZY_MAX_MEMBERS, so a typo never costs a
+        # merge of large member sets. Only words of letters are looked up
+        # this way: an ID or a number is matched by its digits, not spelling.
+        scored = [match for word in words if len(word) >= 3 and word.isalpha() for match in self._fuzzy_tokens(word)]
+        sets = [self.postings[token] for _, token in heapq.nlargest(FUZZY_MAX_TOKENS, set(scored))]
+        if not sets:
+            return set()
+        picked, total = [sets[0]], len(sets[0])
+        for ids in sets[1:]:
+            if total + len(ids) <= FUZZY_MAX_MEMBERS:
+                picked.append(ids)
+                total += len(ids)
+        return picked[0] if len(picked) == 1 else set().union(*picked)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        # Up to limit member IDs for the query, best first: exact ID, ID
+        # prefix (a bare number also matches RKSC####), names where every
+        # query word is a whole word, names where every query word starts a
+        # word, then names with a similarly spelt word. Within each group the
+        # lowest IDs are shown first, so the same query always shows the same
+        # members. Neither the roster nor the matches are scanned in full, so
+        # the cost stays well below a millisecond on a large roster.
+        with self._lock:
+            text = query.strip().upper()
+            if not text:
+                return [self.by_key[key] for key in self.id_keys[:limit]]
+
+            ranked = {}
+            prefixes = [f"RKSC{int(text):04d}", f"RKSC{text}"] if text.isdigit() else [text]
+            for prefix in prefixes:
+                for key in _prefixed(self.id_keys, prefix):
+                    if len(ranked) >= limit:
+                        break
+                    ranked.setdefault(self.by_key[key], 0 if key == prefix else 1)
+
+            words = set(tokenize(query))
+            if words and len(ranked) < limit:
+                whole = [self.postings.get(word, set()) for word in words]
+                for member_id in self._first(whole, limit - len(ranked), ranked):
+                    ranked[member_id] = 2
+            if words and len(ranked) < limit:
+                starts = [self._with_prefix(word) for word in words]
+                for member_id in self._first(starts, limit - len(ranked), ranked):
+                    ranked[member_id] = 3
+
+            if words and len(ranked) < limit:
+                for member_id in self._first([self._fuzzy_members(words)], limit - len(ranked), ranked):
+                    ranked[member_id] = 4
+
+            return sorted(ranked, key=lambda member_id: (ranked[member_id], member_id.upper()))[:limit]
@@ -0,0 +1,325 @@
+import abc
+import copy
+from datetime import datetime
+import dropbox
+import enrollment
+import ledger
+import member_cache
+import member_ids
+import member_paths
+import payments
+import snapshot
+import write_queue
+from dues_summary import valid_upto_key
+from members import apply_payment, format_member, member_number, new_member
+from roster import DEFAULT_MAX_WORKERS
+from writes import retry_on_conflict
+
+STORES = ["files", "snapshot", "ledger"]
+
+
+# One class per storage layout of the roster (MEMBER_STORAGE), all with the
+# same methods, so the app makes one call instead of branching per layout:
+#
+#   load()                        every member
+#   read(member_id)               one member as stored, or None
+#   reserve(count)                new member IDs from the counter file
+#   add(names)                    new members with consecutive IDs, written;
+#                                 returns them
+#   create(name)                  add() for one name; returns the member
+#   enroll(rows)                  the "Ready" rows of an enrollment sheet
+#                                 (enrollment.read_name_rows) as new members;
+#                                 returns (rows, members written)
+#   pay(member_id, amount, now)   (member, new Valid Upto, retries, Valid Upto
+#                                 key before) or None when there is no such member
+#   import_payments(rows, now, dry_run)
+#                                 a collection sheet (payments.read_payment_rows);
+#                                 returns (rows, members written)
+#   flush(entries, intents)       a batch of the write queue; see the flushers
+#                                 in write_queue
+#
+# Every layout takes new member IDs from the same counter file, so IDs handed
+# out directly and by the write queue never overlap.
+class MemberStore(abc.ABC):
+    def __init__(self, dbx, counter_path=member_ids.DEFAULT_COUNTER_PATH, max_workers=DEFAULT_MAX_WORKERS):
+        self.dbx = dbx
+        self.counter_path = counter_path
+        self.max_workers = max_workers
+
+    def using(self, dbx):
+        # The same store writing through another client (e.g. the write
+        # queue's); caches are shared with this one
+        store = copy.copy(self)
+        store.dbx = dbx
+        return store
+
+    @abc.abstractmethod
+    def load(self):
+        pass
+
+    @abc.abstractmethod
+    def read(self, member_id):
+        pass
+
+    @abc.abstractmethod
+    def highest_number(self):
+        # Highest member number stored; seeds the counter file the first time
+        pass
+
+    @abc.abstractmethod
+    def add(self, names):
+        pass
+
+    @abc.abstractmethod
+    def pay(self, member_id, amount, now):
+        pass
+
+    @abc.abstractmethod
+    def import_payments(self, rows, now, dry_run=True):
+        pass
+
+    @abc.abstractmethod
+    def flush(self, entries, intents):
+        pass
+
+    def reserve(self, count):
+        return member_ids.reserve_ids(self.dbx, count, self.counter_path, seed=self.highest_number)
+
+    def create(self, name):
+        return self.add([name])[0]
+
+    def enroll(self, rows):
+        ready = enrollment.ready_rows(rows)
+        added = self.add([row["Name"] for row in ready]) if ready else []
+        for row, member in zip(ready, added):
+            row["Member ID"], row["Status"] = member.member_id, "Enrolled"
+        return rows, added
+
+
+def _highest(members):
+    return max((member_number(m.get("Member ID")) or 0 for m in members), default=0)
+
+
+# One RKSC####.txt per member in folder (flat or in shard folders), read
+# through the on-disk MemberCache
+class FileStore(MemberStore):
+    def __init__(self, dbx, folder, cache_path, shard_size=member_paths.DEFAULT_SHARD_SIZE,
+                 counter_path=member_ids.DEFAULT_COUNTER_PATH, max_workers=DEFAULT_MAX_WORKERS):
+        super().__init__(dbx, counter_path, max_workers)
+        self.folder = folder
+        self.shard_size = shard_size
+        self.cache = member_cache.MemberCache(dbx, folder, cache_path, max_workers=max_workers)
+
+    def path_of(self, member_id):
+        # Where the member's file is, as last listed (flat or in any shard, so a
+        # folder being re-sharded still resolves); otherwise where a new file
+        # goes. A cache that has never listed the folder lists it first, or a
+        # file outside the current layout would not be found.
+        if self.cache.cursor is None:
+            self.cache.sync()
+        return self.cache.path_of(member_id) or member_paths.member_path(self.folder, member_id, self.shard_size)
+
+    def highest_number(self):
+        return member_ids.highest_existing_number(self.dbx, self.folder)
+
+    def load(self):
+        return self.cache.sync()
+
+    def resync(self):
+        return self.cache.sync(full=True)
+
+    def read(self, member_id):
+        return self.cache.find(member_id)
+
+    def add(self, names):
+        ids = self.reserve(len(names)) if names else []
+        return [self._write_new(name, member_id) for name, member_id in zip(names, ids)]
+
+    def _write_new(self, name, member_id):
+        ids = [member_id]
+        def attempt():
+            member = new_member(name, ids.pop() if ids else self.reserve(1)[0])
+            member.eol = "\n"
+            path = member_paths.member_path(self.folder, member.member_id, self.shard_size)
+            # "add" never replaces an existing member; if the ID is somehow taken
+            # the conflict is retried with a freshly allocated one
+            metadata = self.dbx.files_upload(format_member(member).encode(), path, mode=dropbox.files.WriteMode.add)
+            self.cache.remember(metadata, member)
+            return member
+
+        member, _ = retry_on_conflict(attempt)
+        return member
+
+    def enroll(self, rows):
+        # One upload batch for the whole sheet
+        rows, saved = enrollment.enroll_files(self.dbx, self.folder, rows, self.reserve, self.max_workers,
+                                              path_of=self.path_of)
+        for metadata, member in saved:
+            self.cache.remember(metadata, member)
+        return rows, [member for _, member in saved]
+
+    def pay(self, member_id, amount, now):
+        try:
+            member, new_valid_upto, metadata, retries, before = payments.record_payment(
+                self.dbx, self.path_of(member_id), amount, now)
+        except dropbox.exceptions.ApiError as e:
+            if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+                return None
+            raise
+        self.cache.remember(metadata, member)
+        return member, new_valid_upto, retries, before
+
+    def import_payments(self, rows, now, dry_run=True):
+        rows, saved = payments.import_payments(self.dbx, self.folder, rows, now, dry_run=dry_run,
+                                               path_of=self.path_of, max_workers=self.max_workers)
+        for metadata, member in saved:
+            self.cache.remember(metadata, member)
+        return rows, [member for _, member in saved]
+
+    def flush(self, entries, intents):
+        return write_queue.flush_to_files(self.dbx, self.folder, entries, intents, self.max_workers,
+                                          path_of=self.path_of)
+
+
+# The whole roster in one snapshot file, rewritten with a rev-conditional
+# upload on every change
+class SnapshotStore(MemberStore):
+    def __init__(self, dbx, path=snapshot.DEFAULT_PATH, counter_path=member_ids.DEFAULT_COUNTER_PATH,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        super().__init__(dbx, counter_path, max_workers)
+        self.path = path
+
+    def highest_number(self):
+        return _highest(self.load())
+
+    def load(self):
+        return snapshot.read_snapshot(self.dbx, self.path)[0]
+
+    def read(self, member_id):
+        return snapshot.find_member(self.load(), member_id)
+
+    def add(self, names):
+        # An ID already in the snapshot (e.g. a counter seeded before the last
+        # members were added) is swapped for a fresh one
+        ids = self.reserve(len(names))
+        def add(members):
+            taken = {m.get("Member ID") for m in members}
+            for i, member_id in enumerate(ids):
+                while member_id in taken:
+                    member_id = self.reserve(1)[0]
+                ids[i] = member_id
+                taken.add(member_id)
+            members.extend(new_member(name, member_id) for name, member_id in zip(names, ids))
+            return ids
+
+        snapshot.update_snapshot(self.dbx, self.path, add)
+        return [new_member(name, member_id) for name, member_id in zip(names, ids)]
+
+    def pay(self, member_id, amount, now):
+        paid = {}
+        def pay(members):
+            member = snapshot.find_member(members, member_id)
+            if member is None:
+                return None
+            before = valid_upto_key(member)
+            paid["result"] = member, apply_payment(member, amount, now), before
+            return True
+
+        found, retries = snapshot.update_snapshot(self.dbx, self.path, pay)
+        if not found:
+            return None
+        member, new_valid_upto, before = paid["result"]
+        return member, new_valid_upto, retries, before
+
+    def import_payments(self, rows, now, dry_run=True):
+        # The whole sheet is one edit of the snapshot
+        groups = payments.group_rows(rows)
+        if dry_run:
+            payments.apply_to_roster(self.load(), groups, now)
+            return rows, []
+        saved, _ = snapshot.update_snapshot(
+            self.dbx, self.path, lambda members: payments.apply_to_roster(members, groups, now) or None)
+        for row in rows:
+            if row["Status"] == "Ready":
+                row["Status"] = "Saved"
+        return rows, saved or []
+
+    def flush(self, entries, intents):
+        return write_queue.flush_to_snapshot(self.dbx, self.path, entries)
+
+
+# The append-only ledger (see ledger.py): every write is one new segment, so
+# nothing is downloaded first and nothing can conflict. Segments are named
+# after the time they are written, not the payment date they carry, so they
+# replay in the order they were made.
+class LedgerStore(MemberStore):
+    def __init__(self, dbx, root=ledger.DEFAULT_ROOT, counter_path=member_ids.DEFAULT_COUNTER_PATH,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        super().__init__(dbx, counter_path, max_workers)
+        self.root = root
+        self.ledger = ledger.Ledger(dbx, root, max_workers=max_workers)
+
+    def highest_number(self):
+        return _highest(self.load())
+
+    def load(self):
+        # Shared members; copy before editing
+        return self.ledger.refresh()
+
+    def read(self, member_id):
+        member = snapshot.find_member(self.load(), member_id)
+        return member.copy() if member else None
+
+    def add(self, names):
+        # A member event for an ID already in the ledger would be ignored on
+        # replay, so such an ID is swapped for a fresh one
+        taken = {m.get("Member ID") for m in self.load()}
+        ids = self.reserve(len(names)) if names else []
+        for i, member_id in enumerate(ids):
+            while member_id in taken:
+                member_id = self.reserve(1)[0]
+            ids[i] = member_id
+            taken.add(member_id)
+        added = [new_member(name, member_id) for name, member_id in zip(names, ids)]
+        if added:
+            self.ledger.append([ledger.member_event(member) for member in added], datetime.now())
+        return added
+
+    def pay(self, member_id, amount, now):
+        # The current state only checks the member and works out the new
+        # Valid Upto; the payment itself is appended as it is
+        member = self.read(member_id)
+        if member is None:
+            return None
+        before = valid_upto_key(member)
+        new_valid_upto = apply_payment(member, amount, now)
+        self.ledger.append([ledger.payment_event(member_id, amount, now)], datetime.now())
+        return member, new_valid_upto, 0, before
+
+    def import_payments(self, rows, now, dry_run=True):
+        # The whole sheet becomes one segment
+        members = [m.copy() for m in self.load()]
+        saved = payments.apply_to_roster(members, payments.group_rows(rows), now)
+        ready = [row for row in rows if row["Status"] == "Ready"]
+        if dry_run or not ready:
+            return rows, []
+        self.ledger.append([ledger.payment_event(row["Member ID"], int(row["Amount"]), now) for row in ready],
+                           datetime.now())
+        for row in ready:
+            row["Status"] = "Saved"
+        return rows, saved
+
+    def flush(self, entries, intents):
+        return write_queue.flush_to_ledger(self.dbx, self.root, entries)
+
+
+def make_store(kind, dbx, folder, cache_path, shard_size=member_paths.DEFAULT_SHARD_SIZE,
+               snapshot_path=snapshot.DEFAULT_PATH, ledger_root=ledger.DEFAULT_ROOT,
+               counter_path=member_ids.DEFAULT_COUNTER_PATH, max_workers=DEFAULT_MAX_WORKERS):
+    if kind == "files":
+        return FileStore(dbx, folder, cache_path, shard_size, counter_path, max_workers)
+    if kind == "snapshot":
+        return SnapshotStore(dbx, snapshot_path, counter_path, max_workers)
+    if kind == "ledger":
+        return LedgerStore(dbx, ledger_root, counter_path, max_workers)
+    raise ValueError(f"Unknown member storage {kind!r}; expected one of {', '.join(STORES)}")
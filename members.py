@@ -0,0 +1,245 @@
+from datetime import datetime
+from functools import lru_cache
+from dateutil.relativedelta import relativedelta
+
+FIELDS = ["Name", "Member ID", "Total Paid", "Last Payment Month", "Valid Upto"]
+MONTHLY_FEE = 20
+
+
+def format_month(date_obj):
+    return date_obj.strftime("%b%y").upper()
+
+def parse_month(month_str):
+    return datetime.strptime(month_str, "%b%y")
+
+
+# Months are kept as integer ordinals (year * 12 + month - 1), so comparing
+# or advancing them is integer arithmetic instead of strptime/relativedelta
+MONTH_ABBR = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+_MONTH_INDEX = {name: i for i, name in enumerate(MONTH_ABBR)}
+
+def month_ordinal(date_obj):
+    return date_obj.year * 12 + date_obj.month - 1
+
+def ordinal_month(ordinal):
+    return datetime(ordinal // 12, ordinal % 12 + 1, 1)
+
+def format_ordinal(ordinal):
+    return f"{MONTH_ABBR[ordinal % 12]}{ordinal // 12 % 100:02d}"
+
+@lru_cache(maxsize=4096)  # a roster only has a few hundred distinct months
+def parse_ordinal(month_str):
+    # "OCT25" -> ordinal and "None" -> None without going through strptime.
+    # Anything not written exactly the way format_month writes it is returned
+    # unchanged, so it can be saved back as it was.
+    if month_str == "None":
+        return None
+    month = _MONTH_INDEX.get(month_str[:3])
+    if month is None or len(month_str) != 5 or not (month_str[3] in "0123456789" and month_str[4] in "0123456789"):
+        return month_str
+    year = int(month_str[3:])
+    return (year + 2000 if year < 69 else year + 1900) * 12 + month  # same century rule as %y
+
+
+# The dues rule, kept in one place so everything that counts dues agrees: a
+# member owes every month after Valid Upto up to and including the current
+# one, and a member without a usable Valid Upto owes the current month only.
+def valid_upto_ordinal(value):
+    # A Valid Upto (text or ordinal) as the rule reads it: the month's
+    # ordinal, or None when it is "None", missing or unreadable
+    if isinstance(value, str):
+        value = parse_ordinal(value)
+        if isinstance(value, str):
+            try:
+                value = month_ordinal(parse_month(value))
+            except ValueError:
+                value = None
+    return value if isinstance(value, int) else None
+
+def months_due(valid_upto, now_ord):
+    # valid_upto as returned by valid_upto_ordinal(); 0 when nothing is due.
+    # The due period runs from now_ord - months + 1 to now_ord.
+    return 1 if valid_upto is None else max(now_ord - valid_upto, 0)
+
+
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+MISSING = _Missing()  # field absent from the file
+
+def _parse_amount(text):
+    return int(text) if text.isdigit() and str(int(text)) == text else text
+
+_FIELD_PARSERS = {"name": str, "member_id": str, "total_paid": _parse_amount,
+                  "last_payment": parse_ordinal, "valid_upto": parse_ordinal}
+
+def _format_field(slot, value):
+    if slot in ("last_payment", "valid_upto"):
+        return "None" if value is None else format_ordinal(value) if isinstance(value, int) else value
+    return str(value)
+
+
+# One member, typed: months as ordinals, Total Paid as an int. A value the app
+# did not write itself (e.g. "Oct25" or "20.0") is kept as its text, unknown
+# fields are kept too and missing ones stay missing, so format_member() gives
+# back the file that was parsed as long as its lines are in the order the app
+# writes them (FIELDS first, then any others). It also reads and writes like
+# the dicts used before (member["Valid Upto"], member.get("Name")), with the
+# values as text.
+class Member:
+    __slots__ = ("name", "member_id", "total_paid", "last_payment", "valid_upto", "extra", "eol")
+    SLOTS = {"Name": "name", "Member ID": "member_id", "Total Paid": "total_paid",
+             "Last Payment Month": "last_payment", "Valid Upto": "valid_upto"}
+
+    def __init__(self, name=MISSING, member_id=MISSING, total_paid=MISSING, last_payment=MISSING,
+                 valid_upto=MISSING, extra=None, eol=""):
+        self.name = name
+        self.member_id = member_id
+        self.total_paid = total_paid
+        self.last_payment = last_payment
+        self.valid_upto = valid_upto
+        self.extra = extra  # other "Key: value" lines, in file order
+        self.eol = eol  # "\n" if the file ended with a newline
+
+    @classmethod
+    def from_mapping(cls, data):
+        member = cls()
+        for key, value in data.items():
+            member[key] = value
+        return member
+
+    def __getitem__(self, key):
+        slot = self.SLOTS.get(key)
+        if slot is None:
+            if self.extra and key in self.extra:
+                return self.extra[key]
+            raise KeyError(key)
+        value = getattr(self, slot)
+        if value is MISSING:
+            raise KeyError(key)
+        return _format_field(slot, value)
+
+    def __setitem__(self, key, value):
+        slot = self.SLOTS.get(key)
+        if slot is None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        else:
+            setattr(self, slot, _FIELD_PARSERS[slot](str(value)))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        present = [key for key, slot in self.SLOTS.items() if getattr(self, slot) is not MISSING]
+        return present + list(self.extra or ())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def copy(self):
+        return Member(self.name, self.member_id, self.total_paid, self.last_payment, self.valid_upto,
+                      dict(self.extra) if self.extra else None, self.eol)
+
+    def __eq__(self, other):
+        if isinstance(other, Member):
+            return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+        try:
+            return self.to_dict() == dict(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Member({self.to_dict()!r})"
+
+    def add_payment(self, amount, now):
+        # apply_payment() on ordinals; returns the new Valid Upto as a datetime
+        months_paid = amount // MONTHLY_FEE
+        valid_upto = self.valid_upto
+        if isinstance(valid_upto, str):
+            try:
+                valid_upto = month_ordinal(parse_month(valid_upto))
+            except ValueError:
+                valid_upto = None
+        if isinstance(valid_upto, int):
+            new_valid_upto = ordinal_month(valid_upto + months_paid)
+        else:
+            new_valid_upto = now + relativedelta(months=months_paid - 1)
+
+        total_paid = 0 if self.total_paid is MISSING else self.total_paid
+        self.total_paid = int(total_paid) + amount
+        self.last_payment = month_ordinal(now)
+        self.valid_upto = month_ordinal(new_valid_upto)
+        return new_valid_upto
+
+
+def parse_member(content):
+    # The one parser for member files: "Key: value" per line
+    member = Member(eol="\n" if content.endswith("\n") else "")
+    for line in content.split("\n"):
+        key, sep, value = line.partition(":")
+        if sep:
+            slot = Member.SLOTS.get(key)
+            if slot is None:
+                member[key] = value.strip()
+            else:
+                setattr(member, slot, _FIELD_PARSERS[slot](value.strip()))
+    return member
+
+def format_member(data):
+    if isinstance(data, Member):
+        # FIELDS in order, then the other fields; ones the file did not have
+        # are left out rather than written as None
+        return "\n".join(f"{key}: {value}" for key, value in data.items()) + data.eol
+    return "\n".join([f"{key}: {data.get(key, 'None')}" for key in FIELDS])
+
+def new_member(name, member_id):
+    return Member(name, member_id, 0, None, None)
+
+
+def member_number(member_id):
+    try:
+        return int(member_id.replace("RKSC", ""))
+    except (AttributeError, ValueError):
+        return None
+
+
+def apply_payment(data, amount, now):
+    if isinstance(data, Member):
+        return data.add_payment(amount, now)
+
+    months_paid = amount // MONTHLY_FEE
+
+    valid_upto_str = data.get("Valid Upto", "None")
+    if valid_upto_str == "None":
+        new_valid_upto = now + relativedelta(months=months_paid - 1)
+    else:
+        try:
+            last_valid_date = parse_month(valid_upto_str)
+            new_valid_upto = last_valid_date + relativedelta(months=months_paid)
+        except:
+            new_valid_upto = now + relativedelta(months=months_paid - 1)
+
+    data["Total Paid"] = str(int(data.get("Total Paid", 0)) + amount)
+    data["Last Payment Month"] = format_month(now)
+    data["Valid Upto"] = format_month(new_valid_upto)
+    return new_valid_upto
@@ -0,0 +1,158 @@
+import csv
+import io
+import time
+import dropbox
+import diagnostics
+from dues_summary import valid_upto_key
+from members import MONTHLY_FEE, parse_member, format_member, apply_payment
+from roster import DEFAULT_MAX_WORKERS
+from writes import WRITE_ATTEMPTS, backoff_delay, is_retryable_failure, retry_on_conflict, upload_batch
+
+
+def record_payment(dbx, file_path, amount, now):
+    # Optimistic concurrency: the upload only succeeds if the file still has
+    # the rev we downloaded. If another station wrote in between, re-read the
+    # member and apply the payment again on top of their change. Also returns
+    # the Valid Upto the payment started from, as a dues summary key.
+    def attempt():
+        metadata, res = dbx.files_download(file_path)
+        member = parse_member(res.content.decode("utf-8").strip())
+        before = valid_upto_key(member)
+        new_valid_upto = apply_payment(member, amount, now)
+        uploaded = dbx.files_upload(format_member(member).encode(), file_path,
+                                    mode=dropbox.files.WriteMode.update(metadata.rev), strict_conflict=True)
+        return member, new_valid_upto, uploaded, before
+
+    (member, new_valid_upto, uploaded, before), retries = retry_on_conflict(attempt)
+    return member, new_valid_upto, uploaded, retries, before
+
+
+# Bulk import of a collection sheet (CSV with "Member ID" and "Amount" columns)
+
+REPORT_COLUMNS = ["Row", "Member ID", "Name", "Amount", "Valid Upto (before)", "Valid Upto (after)", "Status"]
+
+
+def read_payment_rows(text):
+    reader = csv.DictReader(io.StringIO(text))
+    fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+    id_field, amount_field = fields.get("member id"), fields.get("amount")
+    if not id_field or not amount_field:
+        raise ValueError('The CSV needs "Member ID" and "Amount" columns.')
+
+    rows = []
+    for record in reader:
+        member_id = (record.get(id_field) or "").strip().upper()
+        amount = (record.get(amount_field) or "").strip()
+        if not member_id and not amount:
+            continue
+        row = {column: "" for column in REPORT_COLUMNS}
+        row.update({"Row": reader.line_num, "Member ID": member_id, "Amount": amount, "valid": False})
+        if not member_id:
+            row["Status"] = "Missing Member ID"
+        elif not amount.isdigit() or int(amount) < MONTHLY_FEE:
+            row["Status"] = f"Invalid amount (minimum {MONTHLY_FEE})"
+        else:
+            row["valid"] = True
+        rows.append(row)
+    return rows
+
+
+def group_rows(rows):
+    # Valid rows per member, in sheet order, so repeated payments stack up
+    groups = {}
+    for row in rows:
+        if row["valid"]:
+            groups.setdefault(row["Member ID"], []).append(row)
+    return groups
+
+def apply_rows(member, member_rows, now):
+    for row in member_rows:
+        row["Name"] = member.get("Name", "")
+        row["Valid Upto (before)"] = member.get("Valid Upto", "None")
+        apply_payment(member, int(row["Amount"]), now)
+        row["Valid Upto (after)"] = member["Valid Upto"]
+
+def set_status(member_rows, status):
+    for row in member_rows:
+        row["Status"] = status
+
+
+def apply_to_roster(members, groups, now):
+    # Snapshot and ledger layouts: the whole import is one edit of the roster
+    # list. groups comes from group_rows(); returns the members paid for.
+    index = {m.get("Member ID"): m for m in members}
+    applied = []
+    for member_id, member_rows in groups.items():
+        member = index.get(member_id)
+        if member is None:
+            set_status(member_rows, "Member not found")
+        else:
+            apply_rows(member, member_rows, now)
+            set_status(member_rows, "Ready")
+            applied.append(member)
+    return applied
+
+
+def fetch_members(dbx, paths, max_workers=DEFAULT_MAX_WORKERS):
+    # path -> (member, rev), or None when the file does not exist
+    def fetch(path):
+        try:
+            metadata, res = dbx.files_download(path)
+        except dropbox.exceptions.ApiError as e:
+            if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+                return None
+            raise
+        return parse_member(res.content.decode("utf-8").strip()), metadata.rev
+
+    with diagnostics.thread_pool(max_workers) as pool:
+        return dict(zip(paths, pool.map(fetch, paths)))
+
+
+def import_payments(dbx, folder, rows, now, dry_run=True, max_workers=DEFAULT_MAX_WORKERS, path_of=None):
+    # Files layout: fetch every affected member concurrently, apply all their
+    # payments in memory and commit the changed files in one upload batch.
+    # Each file is written with WriteMode.update(rev); members that conflict
+    # with another station are re-read and retried. With dry_run nothing is
+    # written and the report shows the Valid Upto each member would get.
+    # Returns (rows, saved) where saved lists (metadata, member) per file.
+    # path_of(member_id) locates a member's file; by default it is directly
+    # in folder.
+    path_of = path_of or (lambda member_id: f"{folder}/{member_id}.txt")
+    groups = group_rows(rows)
+    saved = []
+    pending = list(groups)
+    for attempt in range(WRITE_ATTEMPTS):
+        paths = {member_id: path_of(member_id) for member_id in pending}
+        fetched = fetch_members(dbx, list(paths.values()), max_workers)
+
+        files, changed = [], []
+        for member_id in pending:
+            found = fetched[paths[member_id]]
+            if found is None:
+                set_status(groups[member_id], "Member not found")
+                continue
+            member, rev = found
+            apply_rows(member, groups[member_id], now)
+            set_status(groups[member_id], "Ready")
+            files.append((paths[member_id], format_member(member).encode(), dropbox.files.WriteMode.update(rev)))
+            changed.append((member_id, member))
+
+        if dry_run:
+            return rows, saved
+
+        pending = []
+        for (member_id, member), result in zip(changed, upload_batch(dbx, files, max_workers)):
+            if result.is_success():
+                set_status(groups[member_id], "Saved")
+                saved.append((result.get_success(), member))
+            elif is_retryable_failure(result.get_failure()):
+                pending.append(member_id)
+            else:
+                set_status(groups[member_id], f"Failed: {result.get_failure()}")
+        if not pending:
+            break
+        time.sleep(backoff_delay(attempt))
+
+    for member_id in pending:
+        set_status(groups[member_id], "Conflict, not saved. Please import this row again.")
+    return rows, saved
@@ -0,0 +1,325 @@
+import io
+import unicodedata
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# A4 portrait in mm, laid out exactly like the FPDF version of the due list
+# (same margins, cells and fonts), but written out one page at a time: each
+# finished page is compressed and sent to the output stream straight away,
+# so only the page being filled is ever held in memory.
+K = 72 / 25.4  # points per mm
+PAGE_WIDTH_PT, PAGE_HEIGHT_PT = 595.28, 841.89
+PAGE_HEIGHT = PAGE_HEIGHT_PT / K
+MARGIN = 28.35 / K
+CELL_MARGIN = MARGIN / 10
+LINE_WIDTH = 0.567 / K
+ENCODING = "cp1252"  # WinAnsiEncoding, as declared for the fonts
+
+# Widths of the 256 WinAnsiEncoding codes in Helvetica and Helvetica-Bold,
+# in 1/1000 of the font size (the standard Adobe font metrics)
+HELVETICA_WIDTHS = (
+    278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278,
+    278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278,
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584, 350,
+    556, 350, 222, 556, 333, 1000, 556, 556, 333, 1000, 667, 333, 1000, 350, 611, 350,
+    350, 222, 222, 333, 333, 350, 556, 1000, 333, 1000, 500, 333, 944, 350, 500, 667,
+    278, 333, 556, 556, 556, 556, 260, 556, 333, 737, 370, 556, 584, 333, 737, 333,
+    400, 584, 333, 333, 333, 556, 537, 278, 333, 333, 365, 556, 834, 834, 834, 611,
+    667, 667, 667, 667, 667, 667, 1000, 722, 667, 667, 667, 667, 278, 278, 278, 278,
+    722, 722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+    556, 556, 556, 556, 556, 556, 889, 500, 556, 556, 556, 556, 278, 278, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 584, 611, 556, 556, 556, 556, 500, 556, 500,
+)
+HELVETICA_BOLD_WIDTHS = (
+    278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278,
+    278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278,
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584, 350,
+    556, 350, 278, 556, 500, 1000, 556, 556, 333, 1000, 667, 333, 1000, 350, 611, 350,
+    350, 278, 278, 500, 500, 350, 556, 1000, 333, 1000, 556, 333, 944, 350, 500, 667,
+    278, 333, 556, 556, 556, 556, 280, 556, 333, 737, 370, 556, 584, 333, 737, 333,
+    400, 584, 333, 333, 333, 611, 556, 278, 333, 333, 365, 556, 834, 834, 834, 611,
+    722, 722, 722, 722, 722, 722, 1000, 722, 667, 667, 667, 667, 278, 278, 278, 278,
+    722, 722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+    556, 556, 556, 556, 556, 556, 889, 556, 556, 556, 556, 556, 278, 278, 278, 278,
+    611, 611, 611, 611, 611, 611, 611, 584, 611, 611, 611, 611, 611, 556, 611, 556,
+)
+FONTS = {"": ("F1", "Helvetica", HELVETICA_WIDTHS), "B": ("F2", "Helvetica-Bold", HELVETICA_BOLD_WIDTHS)}
+
+HEADERS = ["Name", "Member ID", "Due Period", "Due Months", "Due Amount (INR)"]
+COL_WIDTHS = [40, 30, 50, 30, 40]
+STATEMENT_FIELDS = ["Name", "Member ID", "Total Paid", "Last Payment Month", "Valid Upto",
+                    "Due Period", "Due Months", "Due Amount (INR)"]
+STATEMENT_COL_WIDTHS = [60, 130]
+STATEMENT_CHUNK = 200  # statements per task sent to a worker process
+LINE_HEIGHT = 10
+USABLE_HEIGHT = 297 - 15  # bottom margin
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace(")", "\\)").replace("(", "\\(").replace("\r", "\\r")
+
+
+def _writable(text):
+    try:
+        text.encode(ENCODING)
+        return True
+    except UnicodeEncodeError:
+        return False
+
+def pdf_text(text):
+    # text as the built-in fonts can write it. Letters they have no glyph
+    # for lose their accents ("Bālā" -> "Bala"); text that still cannot be
+    # written, such as a name in a non-Latin script, raises ValueError
+    # rather than being printed as question marks.
+    if _writable(text):
+        return text
+    chars = []
+    for char in text:
+        if not _writable(char):
+            stripped = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+            if not _writable(stripped) or not (stripped or unicodedata.combining(char)):
+                raise ValueError(f"{text!r} cannot be written in the PDF's fonts")
+            char = stripped
+        chars.append(char)
+    return "".join(chars)
+
+def unwritable(texts):
+    # The texts pdf_text() rejects, each once
+    rejected = []
+    for text in texts:
+        try:
+            pdf_text(str(text))
+        except ValueError:
+            if text not in rejected:
+                rejected.append(text)
+    return rejected
+
+
+def string_width(text, style, size):
+    widths = FONTS[style][2]
+    return sum(widths[code] for code in text.encode(ENCODING)) * size / 1000 / K
+
+
+class PdfWriter:
+    # Minimal PDF 1.3 writer for text and boxes in the standard Helvetica
+    # fonts. Objects 1 (page tree) and 2 (resources) are written last, once
+    # the page count is known; everything else goes out as it is produced.
+
+    def __init__(self, out):
+        self.out = out
+        self.position = 0
+        self.offsets = [None, None, None]
+        self.page_objects = []
+        self._write("%PDF-1.3\n")
+
+    def _write(self, data):
+        if isinstance(data, str):
+            data = data.encode(ENCODING)
+        self.out.write(data)
+        self.position += len(data)
+
+    def _object(self, body, number=None):
+        if number is None:
+            number = len(self.offsets)
+            self.offsets.append(None)
+        self.offsets[number] = self.position
+        self._write(f"{number} 0 obj\n")
+        self._write(body)
+        self._write("\nendobj\n")
+        return number
+
+    def add_page(self, content):
+        stream = zlib.compress(content.encode(ENCODING))
+        page = len(self.offsets)
+        self.page_objects.append(page)
+        self._object(f"<</Type /Page\n/Parent 1 0 R\n/Resources 2 0 R\n/Contents {page + 1} 0 R>>")
+        self._object(b"<</Filter /FlateDecode /Length %d>>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    def close(self, title=""):
+        kids = " ".join(f"{n} 0 R" for n in self.page_objects)
+        self._object(f"<</Type /Pages\n/Kids [{kids} ]\n/Count {len(self.page_objects)}\n"
+                     f"/MediaBox [0 0 {PAGE_WIDTH_PT:.2f} {PAGE_HEIGHT_PT:.2f}]\n>>", number=1)
+        fonts = [self._object(f"<</Type /Font\n/BaseFont /{base}\n/Subtype /Type1\n/Encoding /WinAnsiEncoding\n>>")
+                 for _, base, _ in FONTS.values()]
+        font_refs = "\n".join(f"/{key} {n} 0 R" for (key, _, _), n in zip(FONTS.values(), fonts))
+        self._object(f"<<\n/ProcSet [/PDF /Text /ImageB /ImageC /ImageI]\n/Font <<\n{font_refs}\n>>\n>>", number=2)
+        info = self._object(f"<<\n/Title ({_escape(pdf_text(title))})\n"
+                            f"/CreationDate (D:{datetime.now().strftime('%Y%m%d%H%M%S')})\n>>")
+        catalog = self._object("<<\n/Type /Catalog\n/Pages 1 0 R\n>>")
+
+        xref = self.position
+        self._write(f"xref\n0 {len(self.offsets)}\n0000000000 65535 f \n")
+        self._write("".join(f"{offset:010d} 00000 n \n" for offset in self.offsets[1:]))
+        self._write(f"trailer\n<<\n/Size {len(self.offsets)}\n/Root {catalog} 0 R\n/Info {info} 0 R\n>>\n"
+                    f"startxref\n{xref}\n%%EOF\n")
+
+
+class _Page:
+    # Cursor and content stream of the page being filled, mm from the top left
+
+    def __init__(self):
+        self.ops = [f"2 J\n{LINE_WIDTH * K:.2f} w"]
+        self.x, self.y = MARGIN, MARGIN
+        self.font = None
+
+    def set_font(self, style, size):
+        if self.font != (style, size):
+            self.font = (style, size)
+            self.ops.append(f"BT /{FONTS[style][0]} {size:.2f} Tf ET")
+
+    def cell(self, w, h, text, border=0, align=""):
+        op = f"{self.x * K:.2f} {(PAGE_HEIGHT - self.y) * K:.2f} {w * K:.2f} {-h * K:.2f} re S " if border else ""
+        if text:
+            text = pdf_text(text)
+            style, size = self.font
+            dx = (w - string_width(text, style, size)) / 2 if align == "C" else CELL_MARGIN
+            op += (f"BT {(self.x + dx) * K:.2f} {(PAGE_HEIGHT - (self.y + .5 * h + .3 * (size / K))) * K:.2f} Td "
+                   f"({_escape(text)}) Tj ET")
+        if op:
+            self.ops.append(op)
+        self.x += w
+
+    def ln(self, h):
+        self.x = MARGIN
+        self.y += h
+
+    def content(self):
+        return "\n".join(self.ops) + "\n"
+
+
+def _header_row(page):
+    page.set_font("B", 10)
+    for width, header in zip(COL_WIDTHS, HEADERS):
+        page.cell(width, LINE_HEIGHT, header, border=1)
+    page.ln(LINE_HEIGHT)
+
+
+def write_due_list_pdf(dues, now, out):
+    # dues is any iterable of due-table rows (dicts), e.g. iter_rows(df)
+    writer = PdfWriter(out)
+    title = f"RKSC Club - Due List ({now.strftime('%d %B %Y')})"
+    page = _Page()
+    page.set_font("B", 14)
+    page.cell(200, 10, title, align="C")
+    page.ln(10)
+    _header_row(page)
+
+    for row in dues:
+        if page.y + LINE_HEIGHT > USABLE_HEIGHT:
+            writer.add_page(page.content())
+            page = _Page()
+            _header_row(page)
+
+        page.set_font("B" if row["Name"] == "TOTAL" else "", 10)
+        page.cell(COL_WIDTHS[0], 10, str(row["Name"]), border=1)
+        page.cell(COL_WIDTHS[1], 10, str(row["Member ID"]), border=1)
+        page.cell(COL_WIDTHS[2], 10, str(row["Due Period"]), border=1)
+        page.cell(COL_WIDTHS[3], 10, str(row["Due Months"]), border=1)
+        page.cell(COL_WIDTHS[4], 10, f"INR {row['Due Amount (INR)']}", border=1)
+        page.ln(LINE_HEIGHT)
+
+    writer.add_page(page.content())
+    writer.close(title)
+
+
+def render_due_list_pdf(dues, now):
+    return _render(write_due_list_pdf, dues, now)
+
+
+def iter_rows(table):
+    # DataFrame rows as dicts, one at a time instead of to_dict("records")
+    columns = list(table.columns)
+    for values in zip(*(table[c].tolist() for c in columns)):
+        yield dict(zip(columns, values))
+
+
+# Member statements: one single-page PDF per member with dues
+
+def write_statement_pdf(statement, now, out):
+    # statement is a dict with the STATEMENT_FIELDS, see statement_rows()
+    writer = PdfWriter(out)
+    title = f"RKSC Club - Member Statement ({now.strftime('%d %B %Y')})"
+    page = _Page()
+    page.set_font("B", 14)
+    page.cell(200, 10, title, align="C")
+    page.ln(15)
+    for field in STATEMENT_FIELDS:
+        value = statement.get(field, "")
+        page.set_font("B", 10)
+        page.cell(STATEMENT_COL_WIDTHS[0], LINE_HEIGHT, field, border=1)
+        page.set_font("", 10)
+        page.cell(STATEMENT_COL_WIDTHS[1], LINE_HEIGHT, f"INR {value}" if field in ("Total Paid", "Due Amount (INR)")
+                  else str(value), border=1)
+        page.ln(LINE_HEIGHT)
+    writer.add_page(page.content())
+    writer.close(title)
+
+
+def statement_rows(members, dues):
+    # One statement per row of the dues table (without the TOTAL row), with
+    # the member's own fields alongside its dues
+    by_id = {m.get("Member ID"): m for m in members}
+    for row in iter_rows(dues):
+        member = by_id.get(row["Member ID"], {})
+        statement = {field: member.get(field, "None") for field in STATEMENT_FIELDS[:5]}
+        statement.update({field: row[field] for field in STATEMENT_FIELDS[5:]})
+        statement["Due Months"] = int(statement["Due Months"])
+        statement["Due Amount (INR)"] = int(statement["Due Amount (INR)"])
+        yield statement
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _render_statements(task):
+    # Runs in a worker process: render one chunk, return (Member ID, PDF bytes)
+    statements, now = task
+    return [(s["Member ID"], _render(write_statement_pdf, s, now)) for s in statements]
+
+
+def _render(write, rows, now):
+    buffer = io.BytesIO()
+    write(rows, now, buffer)
+    return buffer.getvalue()
+
+
+def write_report_zip(due_rows, statements, now, out, processes=None):
+    # The due list and every statement as one zip: due list at the top,
+    # statements under statements/. Statements are rendered in chunks across
+    # a pool of `processes` worker processes (default: one per core) while
+    # this process streams the due list into its zip entry; the finished
+    # statements are then added in order. The PDF pages are already
+    # compressed, so the entries are stored as they are. Returns the number
+    # of statements written.
+    count = 0
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as archive, \
+            ProcessPoolExecutor(max_workers=processes) as pool:
+        results = pool.map(_render_statements, ((chunk, now) for chunk in _chunks(statements, STATEMENT_CHUNK)))
+        due_list = zipfile.ZipInfo(f"duelist_{now.strftime('%d_%B_%Y')}.pdf", datetime.now().timetuple()[:6])
+        with archive.open(due_list, "w") as entry:
+            write_due_list_pdf(due_rows, now, entry)
+        for chunk in results:
+            for member_id, pdf in chunk:
+                archive.writestr(f"statements/{member_id}.pdf", pdf)
+                count += 1
+    return count
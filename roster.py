@@ -0,0 +1,95 @@
+import dropbox
+import diagnostics
+from member_paths import SHARD_NAME, member_id_of, member_path
+from members import parse_member
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def is_member_file(entry):
+    return isinstance(entry, dropbox.files.FileMetadata) and entry.name.endswith(".txt")
+
+
+def is_shard_folder(entry):
+    return isinstance(entry, dropbox.files.FolderMetadata) and SHARD_NAME.fullmatch(entry.name) is not None
+
+
+def iter_pages(dbx, folder):
+    # Follow the listing cursor so rosters spanning several pages are complete
+    res = dbx.files_list_folder(folder)
+    while True:
+        yield res.entries
+        if not res.has_more:
+            break
+        res = dbx.files_list_folder_continue(res.cursor)
+
+
+def iter_member_entries(dbx, folder):
+    # Member files directly in folder (not in its shard folders)
+    return (entry for page in iter_pages(dbx, folder) for entry in page if is_member_file(entry))
+
+
+def iter_listings(dbx, folder, max_workers=DEFAULT_MAX_WORKERS):
+    # Entries of folder page by page as they arrive, then the entries of each
+    # shard folder found in it; the shards are listed in parallel
+    shards = []
+    for page in iter_pages(dbx, folder):
+        shards += [entry.path_display for entry in page if is_shard_folder(entry)]
+        yield page
+    if shards:
+        with diagnostics.thread_pool(max_workers) as pool:
+            yield from pool.map(lambda shard: [e for page in iter_pages(dbx, shard) for e in page], shards)
+
+
+def list_member_files(dbx, folder, max_workers=DEFAULT_MAX_WORKERS):
+    # Every member file, flat or sharded
+    return [entry for page in iter_listings(dbx, folder, max_workers) for entry in page if is_member_file(entry)]
+
+
+def download_member(dbx, path, rev=None):
+    _, res = dbx.files_download(path, rev=rev)
+    return parse_member(res.content.decode("utf-8"))
+
+
+def load_members(dbx, folder, max_workers=DEFAULT_MAX_WORKERS):
+    # Downloads start as soon as each listing page (or shard listing)
+    # arrives, at most max_workers at a time. Results keep the listing order.
+    with diagnostics.thread_pool(max_workers) as pool:
+        futures = [pool.submit(download_member, dbx, entry.path_display)
+                   for page in iter_listings(dbx, folder, max_workers) for entry in page if is_member_file(entry)]
+        return [future.result() for future in futures]
+
+
+def reshard_folder(dbx, folder, shard_size, max_workers=DEFAULT_MAX_WORKERS):
+    # Move every member file to where shard_size puts it (0 = directly in the
+    # folder), in place. Files already in place are skipped, so an
+    # interrupted run can simply be started again. Each worker moves one
+    # target shard at a time. Returns (moved, skipped) where skipped lists
+    # files whose target already exists and were left alone.
+    moves = {}
+    for entry in list_member_files(dbx, folder, max_workers):
+        target = member_path(folder, member_id_of(entry.path_display), shard_size)
+        if target.lower() != entry.path_lower:
+            moves.setdefault(target.rsplit("/", 1)[0].lower(), []).append((entry.path_display, target))
+
+    def move_shard(pairs):
+        moved, skipped = 0, []
+        for source, target in pairs:
+            try:
+                dbx.files_move_v2(source, target)
+                moved += 1
+            except dropbox.exceptions.ApiError as e:
+                if not isinstance(e.error, dropbox.files.RelocationError):
+                    raise
+                if e.error.is_to():
+                    skipped.append(source)
+                elif not e.error.is_from_lookup():
+                    raise  # from_lookup: moved by another run meanwhile
+        return moved, skipped
+
+    moved, skipped = 0, []
+    with diagnostics.thread_pool(max_workers) as pool:
+        for shard_moved, shard_skipped in pool.map(move_shard, moves.values()):
+            moved += shard_moved
+            skipped += shard_skipped
+    return moved, skipped
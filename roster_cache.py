@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_MAX_AGE = 5.0  # seconds
+
+
+# The roster shared by every session in the process. A load is reused for
+# max_age seconds, and sessions asking while one is in flight wait for it
+# instead of starting their own (single flight), so five open browsers cost
+# one storage read, not five. invalidate() after a write makes the next
+# get() load again; a load that was already running when the write happened
+# is handed to the sessions waiting on it but not kept. The last roster
+# loaded survives invalidate() as last_good(), for pages to fall back on
+# while storage cannot be reached.
+class SharedRoster:
+    def __init__(self, load, max_age=DEFAULT_MAX_AGE):
+        self.load = load
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._members = None
+        self._loaded_at = 0.0
+        self._flight = None
+        self._version = 0  # bumped by invalidate()
+        self._last_good = None
+        self.stats = {"hits": 0, "waits": 0, "loads": 0}
+
+    def get(self):
+        # The members as a new list; the member objects are shared, so copy
+        # one before changing it
+        with self._lock:
+            if self._members is not None and time.monotonic() - self._loaded_at < self.max_age:
+                self.stats["hits"] += 1
+                return list(self._members)
+            flight, leader = self._flight, self._flight is None
+            if leader:
+                flight = self._flight = Future()
+                version = self._version
+                self.stats["loads"] += 1
+            else:
+                self.stats["waits"] += 1
+
+        if not leader:
+            return list(flight.result())
+
+        started = time.monotonic()
+        try:
+            members = self.load()
+        except BaseException as e:
+            with self._lock:
+                if self._flight is flight:
+                    self._flight = None
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            self._last_good = members
+            if self._flight is flight:
+                self._flight = None
+            if self._version == version:
+                self._members, self._loaded_at = members, started
+        flight.set_result(members)
+        return list(members)
+
+    def last_good(self):
+        # None before the first successful load
+        with self._lock:
+            return None if self._last_good is None else list(self._last_good)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._members = None
+            self._flight = None  # later callers start a fresh load
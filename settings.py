@@ -0,0 +1,13 @@
+import os
+import streamlit as st
+
+
+def get_setting(name, default=None):
+    # Environment variables win over .streamlit/secrets.toml, so the app and
+    # manage.py can run without a secrets file (e.g. against local storage)
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
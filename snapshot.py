@@ -0,0 +1,80 @@
+import json
+import dropbox
+import roster
+from members import FIELDS, Member, member_number
+from writes import conditional_mode, retry_on_conflict
+
+# Whole roster in one Dropbox file, one JSON object per member (JSON Lines)
+DEFAULT_PATH = "/roster.jsonl"
+
+
+def encode_snapshot(members, header=None):
+    lines = [json.dumps({key: m.get(key, "None") for key in FIELDS}, ensure_ascii=False) for m in members]
+    if header:
+        lines.insert(0, json.dumps(header))
+    return "\n".join(lines).encode("utf-8")
+
+def decode_snapshot(data):
+    # Parse every line in a single json.loads call instead of one per member
+    text = data.decode("utf-8").strip()
+    if not text:
+        return []
+    return json.loads("[" + ",".join(line for line in text.split("\n") if line.strip()) + "]")
+
+
+def split_header(records):
+    # -> (header, member records). The first line is a header rather than a
+    # member when it has "queues": {queue id: last seq applied}, see
+    # write_queue.flush_to_snapshot
+    if records and "queues" in records[0]:
+        return records[0], records[1:]
+    return {}, records
+
+
+def read_snapshot_file(dbx, path=DEFAULT_PATH):
+    # -> (members, header, rev)
+    try:
+        metadata, res = dbx.files_download(path)
+    except dropbox.exceptions.ApiError as e:
+        if isinstance(e.error, dropbox.files.DownloadError) and e.error.is_path():
+            return [], {}, None
+        raise
+    header, records = split_header(decode_snapshot(res.content))
+    return [Member.from_mapping(m) for m in records], header, metadata.rev
+
+def read_snapshot(dbx, path=DEFAULT_PATH):
+    members, _, rev = read_snapshot_file(dbx, path)
+    return members, rev
+
+def write_snapshot(dbx, path, members, rev=None, header=None):
+    return dbx.files_upload(encode_snapshot(members, header), path, mode=conditional_mode(rev), strict_conflict=True)
+
+
+def update_snapshot(dbx, path, apply, with_header=False):
+    # Read-modify-write of the whole roster. apply(members) edits the list in
+    # place and returns a result (None leaves the snapshot untouched); a
+    # concurrent write makes us start over. Returns (result, retries). The
+    # header is kept as it is, or with_header passes it as apply(members,
+    # header) to be edited too.
+    def attempt():
+        members, header, rev = read_snapshot_file(dbx, path)
+        result = apply(members, header) if with_header else apply(members)
+        if result is not None:
+            write_snapshot(dbx, path, members, rev, header)
+        return result
+
+    return retry_on_conflict(attempt)
+
+
+def find_member(members, member_id):
+    for member in members:
+        if member.get("Member ID") == member_id:
+            return member
+    return None
+
+
+def migrate_folder(dbx, folder, path=DEFAULT_PATH, max_workers=roster.DEFAULT_MAX_WORKERS):
+    members = roster.load_members(dbx, folder, max_workers=max_workers)
+    members.sort(key=lambda m: (member_number(m.get("Member ID")) or 0, m.get("Member ID", "")))
+    dbx.files_upload(encode_snapshot(members), path, mode=dropbox.files.WriteMode.overwrite)
+    return len(members)
@@ -0,0 +1,467 @@
+import abc
+import hashlib
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+import dropbox
+from dropbox.files import (CreateFolderError, CreateFolderResult, DeleteError, DeleteResult, DeletedMetadata,
+                           DownloadError, FileMetadata, FolderMetadata, ListFolderContinueError, ListFolderError,
+                           ListFolderGetLatestCursorResult, ListFolderResult, LookupError, RelocationError, RelocationResult, UploadError,
+                           UploadSessionFinishBatchResult,
+                           UploadSessionFinishBatchResultEntry, UploadSessionFinishError,
+                           UploadSessionStartResult, UploadWriteFailed, WriteConflictError, WriteError,
+                           WriteMode)
+
+BACKENDS = ["dropbox", "local", "memory"]
+# Everything a storage call can raise: ApiError, rate limits and other
+# Dropbox HTTP errors, and network failures (requests' errors are OSErrors)
+STORAGE_ERRORS = (dropbox.exceptions.DropboxException, OSError)
+DEFAULT_LOCAL_ROOT = ".local_storage"
+MAX_CURSORS = 64  # listing states kept for files_list_folder_continue
+
+
+class StorageBackend(abc.ABC):
+    # The part of the Dropbox API the app uses: list (with cursors),
+    # download, upload (with rev-conditional write modes and batched upload
+    # sessions), move, delete and create-folder. Every backend takes the same arguments,
+    # returns dropbox.files metadata objects and raises
+    # dropbox.exceptions.ApiError with the same error unions as Dropbox, so
+    # callers can be handed any of them in place of a dropbox.Dropbox client.
+
+    @abc.abstractmethod
+    def files_list_folder(self, path, recursive=False, limit=None):
+        pass
+
+    @abc.abstractmethod
+    def files_list_folder_continue(self, cursor):
+        pass
+
+    @abc.abstractmethod
+    def files_list_folder_get_latest_cursor(self, path, recursive=False):
+        pass
+
+    @abc.abstractmethod
+    def files_download(self, path, rev=None):
+        pass
+
+    @abc.abstractmethod
+    def files_upload(self, f, path, mode=WriteMode.add, autorename=False, strict_conflict=False):
+        pass
+
+    @abc.abstractmethod
+    def files_create_folder_v2(self, path):
+        pass
+
+    @abc.abstractmethod
+    def files_move_v2(self, from_path, to_path):
+        pass
+
+    @abc.abstractmethod
+    def files_delete_v2(self, path):
+        pass
+
+    @abc.abstractmethod
+    def files_upload_session_start(self, f, close=False):
+        pass
+
+    @abc.abstractmethod
+    def files_upload_session_finish_batch_v2(self, entries):
+        pass
+
+
+class DropboxBackend(StorageBackend):
+
+    def __init__(self, client):
+        self.client = client
+
+    def files_list_folder(self, path, recursive=False, limit=None):
+        return self.client.files_list_folder(path, recursive=recursive, limit=limit)
+
+    def files_list_folder_continue(self, cursor):
+        return self.client.files_list_folder_continue(cursor)
+
+    def files_list_folder_get_latest_cursor(self, path, recursive=False):
+        return self.client.files_list_folder_get_latest_cursor(path, recursive=recursive)
+
+    def files_download(self, path, rev=None):
+        return self.client.files_download(path, rev=rev)
+
+    def files_upload(self, f, path, mode=WriteMode.add, autorename=False, strict_conflict=False):
+        return self.client.files_upload(f, path, mode=mode, autorename=autorename,
+                                        strict_conflict=strict_conflict)
+
+    def files_create_folder_v2(self, path):
+        return self.client.files_create_folder_v2(path)
+
+    def files_move_v2(self, from_path, to_path):
+        return self.client.files_move_v2(from_path, to_path)
+
+    def files_delete_v2(self, path):
+        return self.client.files_delete_v2(path)
+
+    def files_upload_session_start(self, f, close=False):
+        return self.client.files_upload_session_start(f, close=close)
+
+    def files_upload_session_finish_batch_v2(self, entries):
+        return self.client.files_upload_session_finish_batch_v2(entries)
+
+
+def content_hash(data):
+    # Dropbox content_hash: SHA-256 over the SHA-256 of each 4 MiB block
+    blocks = [hashlib.sha256(data[i:i + 4 * 1024 * 1024]).digest() for i in range(0, len(data), 4 * 1024 * 1024)]
+    return hashlib.sha256(b"".join(blocks)).hexdigest()
+
+def api_error(error):
+    return dropbox.exceptions.ApiError("local", error, None, None)
+
+def not_found(error_type):
+    return api_error(error_type.path(LookupError.not_found))
+
+def write_conflict():
+    return api_error(UploadError.path(UploadWriteFailed(reason=WriteError.conflict(WriteConflictError.file),
+                                                        upload_session_id="")))
+
+
+class _Response:
+    # Stands in for the requests.Response returned by files_download
+
+    def __init__(self, content):
+        self.content = content
+
+    def close(self):
+        pass
+
+
+class EmulatedBackend(StorageBackend):
+    # Dropbox semantics on top of a plain byte store: revs, conditional
+    # writes, paged listings with cursors, upload sessions and an optional
+    # per-call latency to imitate a network round trip. Subclasses provide
+    # the byte store.
+
+    def __init__(self, latency=0.0, page_size=2000):
+        self.latency = latency
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._cursors = OrderedDict()  # cursor -> (folder, recursive, {path_lower: (path_display, rev)})
+        self._pending = {}             # cursor -> entries still to be paged out
+        self._sessions = {}            # upload session id -> bytes
+        self._ids = itertools.count(1)
+
+    # Byte store, implemented by subclasses. Paths are Dropbox style
+    # ("/members/RKSC0001.txt"); lookups are case-insensitive like Dropbox.
+    @abc.abstractmethod
+    def _read(self, path):
+        pass  # -> (path_display, data, rev) or None
+
+    @abc.abstractmethod
+    def _write(self, path, data):
+        pass  # -> (path_display, rev)
+
+    @abc.abstractmethod
+    def _walk(self, folder, recursive):
+        pass  # -> {path_lower: (path_display, rev or None for folders)}
+
+    @abc.abstractmethod
+    def _folder_exists(self, path):
+        pass
+
+    @abc.abstractmethod
+    def _make_folder(self, path):
+        pass
+
+    @abc.abstractmethod
+    def _delete(self, path):
+        pass
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _file_metadata(self, path_display, data, rev):
+        modified = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+        return FileMetadata(name=path_display.rsplit("/", 1)[-1], id=f"id:{path_display.lower()}",
+                            path_lower=path_display.lower(), path_display=path_display, rev=rev,
+                            size=len(data), content_hash=content_hash(data),
+                            client_modified=modified, server_modified=modified)
+
+    def _metadata(self, path_lower, path_display, rev):
+        name = path_display.rsplit("/", 1)[-1]
+        if rev is None:
+            return FolderMetadata(name=name, id=f"id:{path_lower}", path_lower=path_lower, path_display=path_display)
+        _, data, _ = self._read(path_display)
+        return self._file_metadata(path_display, data, rev)
+
+    def _remember_cursor(self, state):
+        cursor = uuid.uuid4().hex
+        self._cursors[cursor] = state
+        while len(self._cursors) > MAX_CURSORS:
+            self._cursors.popitem(last=False)
+        return cursor
+
+    def _page(self, cursor, entries, limit=None):
+        size = limit or self.page_size
+        page, rest = entries[:size], entries[size:]
+        if rest:
+            page_cursor = f"{cursor}:{next(self._ids)}"
+            self._pending[page_cursor] = (cursor, rest, size)
+            return ListFolderResult(entries=page, cursor=page_cursor, has_more=True)
+        return ListFolderResult(entries=page, cursor=cursor, has_more=False)
+
+    def files_list_folder(self, path, recursive=False, limit=None):
+        self._round_trip()
+        with self._lock:
+            folder = path.rstrip("/")
+            if folder and not self._folder_exists(folder):
+                raise not_found(ListFolderError)
+            state = self._walk(folder, recursive)
+            cursor = self._remember_cursor((folder, recursive, state))
+            entries = [self._metadata(key, display, rev) for key, (display, rev) in sorted(state.items())]
+            return self._page(cursor, entries, limit)
+
+    def files_list_folder_get_latest_cursor(self, path, recursive=False):
+        # A cursor for the folder as it is now, without listing it
+        self._round_trip()
+        with self._lock:
+            folder = path.rstrip("/")
+            if folder and not self._folder_exists(folder):
+                raise not_found(ListFolderError)
+            return ListFolderGetLatestCursorResult(cursor=self._remember_cursor((folder, recursive, self._walk(folder, recursive))))
+
+    def files_list_folder_continue(self, cursor):
+        self._round_trip()
+        with self._lock:
+            if cursor in self._pending:
+                base, rest, size = self._pending.pop(cursor)
+                return self._page(base, rest, size)
+            if cursor not in self._cursors:
+                # Cursors live in memory, so one from an earlier process (or one
+                # pushed out by newer listings) has expired
+                raise api_error(ListFolderContinueError.reset)
+            folder, recursive, before = self._cursors.pop(cursor)
+            after = self._walk(folder, recursive)
+            entries = []
+            for key in sorted(set(before) | set(after)):
+                if key not in after:
+                    display = before[key][0]
+                    entries.append(DeletedMetadata(name=display.rsplit("/", 1)[-1], path_lower=key,
+                                                   path_display=display))
+                elif before.get(key) != after[key]:
+                    entries.append(self._metadata(key, *after[key]))
+            new_cursor = self._remember_cursor((folder, recursive, after))
+            return self._page(new_cursor, entries)
+
+    def files_download(self, path, rev=None):
+        self._round_trip()
+        with self._lock:
+            # There is no revision history here: an older rev gets the latest content
+            found = self._read(path)
+            if found is None:
+                raise not_found(DownloadError)
+            path_display, data, current_rev = found
+            return self._file_metadata(path_display, data, current_rev), _Response(data)
+
+    def _commit(self, data, path, mode):
+        found = self._read(path)
+        if mode.is_add() and found is not None:
+            return None
+        if mode.is_update() and (found is None or found[2] != mode.get_update()):
+            return None
+        path_display, rev = self._write(path, data)
+        return self._file_metadata(path_display, data, rev)
+
+    def files_upload(self, f, path, mode=WriteMode.add, autorename=False, strict_conflict=False):
+        self._round_trip()
+        with self._lock:
+            metadata = self._commit(f, path, mode)
+            if metadata is None:
+                raise write_conflict()
+            return metadata
+
+    def files_create_folder_v2(self, path):
+        self._round_trip()
+        with self._lock:
+            if self._folder_exists(path):
+                raise api_error(CreateFolderError.path(WriteError.conflict(WriteConflictError.folder)))
+            self._make_folder(path)
+            return CreateFolderResult(metadata=FolderMetadata(name=path.rsplit("/", 1)[-1], id=f"id:{path.lower()}",
+                                                              path_lower=path.lower(), path_display=path))
+
+    # Move and delete handle files only; the app never relocates folders
+    def files_move_v2(self, from_path, to_path):
+        self._round_trip()
+        with self._lock:
+            found = self._read(from_path)
+            if found is None:
+                raise api_error(RelocationError.from_lookup(LookupError.not_found))
+            if self._read(to_path) is not None:
+                raise api_error(RelocationError.to(WriteError.conflict(WriteConflictError.file)))
+            path_display, data, _ = found
+            new_display, rev = self._write(to_path, data)
+            self._delete(path_display)
+            return RelocationResult(metadata=self._file_metadata(new_display, data, rev))
+
+    def files_delete_v2(self, path):
+        self._round_trip()
+        with self._lock:
+            found = self._read(path)
+            if found is None:
+                raise api_error(DeleteError.path_lookup(LookupError.not_found))
+            self._delete(found[0])
+            return DeleteResult(metadata=self._file_metadata(*found))
+
+    def files_upload_session_start(self, f, close=False):
+        self._round_trip()
+        with self._lock:
+            session_id = uuid.uuid4().hex
+            self._sessions[session_id] = f
+            return UploadSessionStartResult(session_id=session_id)
+
+    def files_upload_session_finish_batch_v2(self, entries):
+        self._round_trip()
+        with self._lock:
+            results = []
+            for entry in entries:
+                data = self._sessions.pop(entry.cursor.session_id)
+                metadata = self._commit(data, entry.commit.path, entry.commit.mode)
+                if metadata is None:
+                    failure = UploadSessionFinishError.path(WriteError.conflict(WriteConflictError.file))
+                    results.append(UploadSessionFinishBatchResultEntry.failure(failure))
+                else:
+                    results.append(UploadSessionFinishBatchResultEntry.success(metadata))
+            return UploadSessionFinishBatchResult(entries=results)
+
+
+class MemoryBackend(EmulatedBackend):
+
+    def __init__(self, latency=0.0, page_size=2000):
+        super().__init__(latency, page_size)
+        self._files = {}      # path_lower -> (path_display, data, rev)
+        self._folders = {}    # path_lower -> path_display
+        self._revs = itertools.count(1)
+
+    def _read(self, path):
+        return self._files.get(path.lower())
+
+    def _write(self, path, data):
+        found = self._files.get(path.lower())
+        path_display = found[0] if found else path
+        rev = f"{next(self._revs):016x}"
+        self._files[path.lower()] = (path_display, bytes(data), rev)
+        self._make_folder(path_display.rsplit("/", 1)[0])
+        return path_display, rev
+
+    def _walk(self, folder, recursive):
+        prefix = folder.lower() + "/"
+        state = {}
+        for items, is_file in ((self._files, True), (self._folders, False)):
+            for key, value in items.items():
+                if key.startswith(prefix) and (recursive or "/" not in key[len(prefix):]):
+                    state[key] = (value[0], value[2]) if is_file else (value, None)
+        return state
+
+    def _folder_exists(self, path):
+        return path.rstrip("/").lower() in self._folders
+
+    def _delete(self, path):
+        del self._files[path.lower()]
+
+    def _make_folder(self, path):
+        while path and path.lower() not in self._folders:
+            self._folders[path.lower()] = path
+            path = path.rsplit("/", 1)[0]
+
+
+class LocalBackend(EmulatedBackend):
+    # Dropbox paths map onto a directory on local disk. A file's rev is
+    # derived from its modification time, inode and size, so it changes on
+    # every write, including writes made outside the app.
+
+    def __init__(self, root=DEFAULT_LOCAL_ROOT, latency=0.0, page_size=2000):
+        super().__init__(latency, page_size)
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _local(self, path):
+        return os.path.join(self.root, *[p for p in path.split("/") if p])
+
+    def _resolve(self, path):
+        # Exact match first; otherwise fall back to a case-insensitive lookup
+        # of each path component
+        local = self._local(path)
+        if os.path.exists(local):
+            return local
+        local = self.root
+        for part in [p for p in path.split("/") if p]:
+            if os.path.exists(os.path.join(local, part)):
+                local = os.path.join(local, part)
+                continue
+            try:
+                local = next(os.path.join(local, c) for c in os.listdir(local) if c.lower() == part.lower())
+            except (OSError, StopIteration):
+                return None
+        return local
+
+    def _display(self, local):
+        return "/" + os.path.relpath(local, self.root).replace(os.sep, "/")
+
+    @staticmethod
+    def _rev(stat):
+        return f"{stat.st_mtime_ns:016x}{stat.st_ino:x}{stat.st_size:x}"
+
+    def _read(self, path):
+        local = self._resolve(path)
+        if local is None or not os.path.isfile(local):
+            return None
+        with open(local, "rb") as f:
+            data = f.read()
+        return self._display(local), data, self._rev(os.stat(local))
+
+    def _write(self, path, data):
+        # A new file goes into its folder as already spelled on disk
+        folder, _, name = path.rstrip("/").rpartition("/")
+        local = self._resolve(path) or os.path.join(self._resolve(folder) or self._local(folder), name)
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        tmp = f"{local}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, local)
+        return self._display(local), self._rev(os.stat(local))
+
+    def _walk(self, folder, recursive):
+        base = self._resolve(folder) if folder else self.root
+        state = {}
+        for dirpath, dirnames, filenames in os.walk(base):
+            for name in dirnames:
+                display = self._display(os.path.join(dirpath, name))
+                state[display.lower()] = (display, None)
+            for name in filenames:
+                local = os.path.join(dirpath, name)
+                display = self._display(local)
+                state[display.lower()] = (display, self._rev(os.stat(local)))
+            if not recursive:
+                break
+        return state
+
+    def _folder_exists(self, path):
+        local = self._resolve(path)
+        return local is not None and os.path.isdir(local)
+
+    def _make_folder(self, path):
+        os.makedirs(self._local(path), exist_ok=True)
+
+    def _delete(self, path):
+        os.remove(self._resolve(path))
+
+
+def make_backend(kind, client=None, root=DEFAULT_LOCAL_ROOT, latency=0.0):
+    if kind == "dropbox":
+        return DropboxBackend(client)
+    if kind == "local":
+        return LocalBackend(root, latency=latency)
+    if kind == "memory":
+        return MemoryBackend(latency=latency)
+    raise ValueError(f"Unknown storage backend {kind!r}; expected one of {', '.join(BACKENDS)}")
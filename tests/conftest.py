@@ -0,0 +1,7 @@
+import pytest
+import storage
+
+
+@pytest.fixture
+def dbx():
+    return storage.MemoryBackend()
@@ -0,0 +1,56 @@
+import logging
+import dropbox
+import pytest
+import diagnostics
+import roster
+import storage
+
+
+@pytest.fixture
+def recorder():
+    return diagnostics.start(slow_threshold=0.05)
+
+
+def test_calls_are_recorded(recorder):
+    dbx = diagnostics.InstrumentedBackend(storage.MemoryBackend())
+    dbx.files_upload(b"Name: Asha", "/members/RKSC0001.txt")
+    dbx.files_download("/members/RKSC0001.txt")
+    with pytest.raises(dropbox.exceptions.ApiError):
+        dbx.files_download(path="/members/RKSC0002.txt")
+    assert dbx.page_size == 2000  # not a files_* call, passed straight through
+    assert [(name, path, error) for name, _, path, error in recorder.calls] == [
+        ("files_upload", "/members/RKSC0001.txt", None),
+        ("files_download", "/members/RKSC0001.txt", None),
+        ("files_download", "/members/RKSC0002.txt", "ApiError")]
+    totals = recorder.call_totals()
+    assert (totals["files_download"]["count"], totals["files_download"]["errors"]) == (2, 1)
+
+
+def test_worker_threads_record_to_the_rerun(recorder):
+    dbx = diagnostics.InstrumentedBackend(storage.MemoryBackend())
+    for number in range(1, 6):
+        dbx.files_upload(b"Name: x", f"/members/RKSC{number:04d}.txt")
+    recorder.calls.clear()
+    assert len(roster.load_members(dbx, "/members", max_workers=3)) == 5
+    assert recorder.call_totals()["files_download"]["count"] == 5
+
+
+def test_phases_and_slow_calls(recorder, caplog):
+    dbx = diagnostics.InstrumentedBackend(storage.MemoryBackend(latency=0.06))
+    with caplog.at_level(logging.WARNING, logger="rksc"):
+        with diagnostics.phase("load roster"):
+            dbx.files_upload(b"x", "/slow.txt")
+    assert [name for name, _ in recorder.phases] == ["load roster"]
+    assert len(recorder.slow_calls()) == 1
+    assert '"event": "slow_call"' in caplog.text
+
+    summary = recorder.summary(page="Dues")
+    assert (summary["page"], summary["storage_calls"], summary["slow_calls"]) == ("Dues", 1, 1)
+    assert summary["phases"][0]["phase"] == "load roster" and summary["phases"][0]["seconds"] >= 0.06
+
+
+def test_phase_is_recorded_when_it_fails(recorder):
+    with pytest.raises(ValueError):
+        with diagnostics.phase("import sheet"):
+            raise ValueError("bad sheet")
+    assert [name for name, _ in recorder.phases] == ["import sheet"]
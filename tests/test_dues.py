@@ -0,0 +1,65 @@
+from datetime import datetime
+import pytest
+from dateutil.relativedelta import relativedelta
+from dues import compute_dues, with_total
+from members import Member, month_ordinal, months_due, parse_member, parse_month, valid_upto_ordinal
+
+
+def old_dues(members, now):
+    # The due list loop the app used before compute_dues
+    dues = []
+    for member in members:
+        valid_upto_str = member.get("Valid Upto", "None")
+        if valid_upto_str == "None":
+            start_month = now
+        else:
+            try:
+                last_paid_date = parse_month(valid_upto_str)
+                if last_paid_date >= now:
+                    continue
+                start_month = last_paid_date + relativedelta(months=1)
+            except ValueError:
+                start_month = now
+        if start_month > now:
+            continue
+        months_due = (now.year - start_month.year) * 12 + (now.month - start_month.month) + 1
+        dues.append({
+            "Name": member["Name"],
+            "Member ID": member["Member ID"],
+            "Due Period": f"{start_month.strftime('%b%y').upper()} - {now.strftime('%b%y').upper()}",
+            "Due Months": months_due,
+            "Due Amount (INR)": months_due * 20,
+        })
+    return dues
+
+
+def roster():
+    values = ["None", "OCT26", "SEP26", "NOV26", "JAN20", "DEC99", "Mar26", "soon", "DEC30"]
+    members = [parse_member(f"Name: M{i}\nMember ID: RKSC{i:04d}\nTotal Paid: 0\nValid Upto: {value}")
+               for i, value in enumerate(values)]
+    members.append(parse_member("Name: No Valid Upto\nMember ID: RKSC0099\nTotal Paid: 0"))
+    members.append({"Name": "Plain dict", "Member ID": "RKSC0100", "Valid Upto": "AUG26"})
+    members.append(Member.from_mapping({"Name": "Snapshot", "Member ID": "RKSC0101", "Valid Upto": "FEB25"}))
+    return members
+
+
+@pytest.mark.parametrize("now", [datetime(2026, 10, 1), datetime(2000, 1, 1), datetime(2031, 6, 1)])
+def test_compute_dues_matches_old_loop(now):
+    members = roster()
+    assert compute_dues(members, now).to_dict("records") == old_dues(members, now)
+
+
+def test_no_members():
+    assert compute_dues([], datetime(2026, 10, 1)).empty
+
+
+@pytest.mark.parametrize("value, months", [("None", 1), ("soon", 1), (None, 1), ("SEP26", 1), ("JAN26", 9),
+                                           ("OCT26", 0), ("DEC30", 0), ("Oct25", 12)])
+def test_months_due(value, months):
+    assert months_due(valid_upto_ordinal(value), month_ordinal(datetime(2026, 10, 1))) == months
+
+
+def test_with_total():
+    dues = with_total(compute_dues(roster(), datetime(2026, 10, 1)))
+    assert dues.iloc[-1]["Name"] == "TOTAL"
+    assert dues.iloc[-1]["Due Amount (INR)"] == dues.iloc[:-1]["Due Amount (INR)"].sum()
@@ -0,0 +1,94 @@
+import sqlite3
+from datetime import datetime
+import pytest
+import dues_summary
+import write_queue
+from dues import compute_dues
+from members import new_member, parse_member
+
+NOW = datetime(2026, 10, 1)
+
+
+def roster():
+    values = ["None", "OCT26", "SEP26", "NOV26", "JAN20", "DEC99", "Mar26", "soon", "DEC30", "AUG26"]
+    members = [parse_member(f"Name: M{i}\nMember ID: RKSC{i:04d}\nTotal Paid: 0\nValid Upto: {value}")
+               for i, value in enumerate(values)]
+    members.append(parse_member("Name: No Valid Upto\nMember ID: RKSC0099\nTotal Paid: 0"))
+    return members
+
+
+@pytest.mark.parametrize("now", [NOW, datetime(2000, 1, 1), datetime(2031, 6, 1)])
+def test_summary_matches_the_due_list(now):
+    summary = dues_summary.build_summary(roster(), now)
+    dues = compute_dues(roster(), now)
+    assert summary["members"] == len(roster())
+    assert (summary["due_members"], summary["due_months"], summary["due_amount"]) == (
+        len(dues), int(dues["Due Months"].sum()), int(dues["Due Amount (INR)"].sum()))
+    assert sum(summary["overdue"].values()) == summary["due_members"]
+
+
+def test_month_key():
+    assert [dues_summary.month_key(v) for v in ["OCT25", "Oct25", "soon", "None", None]] == [
+        "OCT25", "OCT25", "None", "None", "None"]
+    assert dues_summary.valid_upto_key(roster()[-1]) == "None"
+
+
+def test_changes_and_roll_forward():
+    members = roster()
+    summary = dues_summary.build_summary(members, NOW)
+    members.append(new_member("New", "RKSC0100"))
+    members[2]["Valid Upto"] = "DEC26"  # SEP26 paid up
+    changes = [(None, dues_summary.NEVER_PAID), ("SEP26", "DEC26")]
+    assert dues_summary.apply_changes(summary, changes, NOW) == dues_summary.build_summary(members, NOW)
+    later = datetime(2027, 2, 1)
+    assert dues_summary.roll_forward(summary["valid_upto"], later) == dues_summary.build_summary(roster(), later)
+
+
+def test_row_changes():
+    rows = [{"Member ID": "RKSC0001", "Status": "Saved", "Valid Upto (before)": "None", "Valid Upto (after)": "OCT26"},
+            {"Member ID": "RKSC0001", "Status": "Saved", "Valid Upto (before)": "OCT26", "Valid Upto (after)": "NOV26"},
+            {"Member ID": "RKSC0002", "Status": "Member not found"}]
+    assert dues_summary.row_changes(rows) == [("None", "NOV26")]
+
+
+def test_stored_summary(dbx):
+    load = lambda: roster()
+    summary = dues_summary.current_summary(dbx, "/dues.json", NOW, load)
+    assert dues_summary.read_summary(dbx, "/dues.json")[0] == summary
+    dues_summary.update_summary(dbx, "/dues.json", [("SEP26", "OCT26")], NOW)
+    updated = dues_summary.current_summary(dbx, "/dues.json", NOW, pytest.fail)
+    assert updated["due_members"] == summary["due_members"] - 1
+    assert dues_summary.check_summary(updated, roster(), NOW) != []
+    rolled = dues_summary.current_summary(dbx, "/dues.json", datetime(2026, 11, 1), pytest.fail)
+    assert rolled["month"] == "NOV26"
+
+
+def test_queued_writes_as_changes(tmp_path):
+    queue = write_queue.WriteQueue(str(tmp_path / "queue.sqlite3"), None)
+    queue.enqueue_payment("RKSC0002", 20, NOW, ("SEP26", "OCT26"))
+    queue.enqueue_payment("RKSC0003", 20, NOW)  # keys not known
+    queue.reserve = lambda count: ["RKSC0100"]
+    queue.top_up_ids()
+    queue.enqueue_member("New", NOW)
+    summary = dues_summary.build_summary(roster(), NOW)
+    changes = write_queue.dues_changes(queue.pending())
+    assert changes == [("SEP26", "OCT26"), (None, dues_summary.NEVER_PAID)]
+    pending = lambda loaded, entries: dues_summary.apply_changes(loaded, write_queue.dues_changes(entries), NOW)
+    shown = queue.read(lambda: summary, pending)
+    assert shown["members"] == summary["members"] + 1
+    assert shown["due_members"] == summary["due_members"]  # one paid up, one new member owing
+
+
+def test_journal_gets_the_new_columns(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE entries (seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, member_id TEXT "
+               "NOT NULL, name TEXT, amount INTEGER, at TEXT NOT NULL, batch TEXT, attempts INTEGER NOT NULL "
+               "DEFAULT 0, error TEXT, failed TEXT)")
+    db.execute("INSERT INTO entries (kind, member_id, amount, at) VALUES ('payment', 'RKSC0001', 20, ?)",
+               (NOW.isoformat(),))
+    db.commit()
+    db.close()
+    queue = write_queue.WriteQueue(path, None)
+    queue.enqueue_payment("RKSC0002", 20, NOW, ("SEP26", "OCT26"))
+    assert write_queue.dues_changes(queue.pending()) == [("SEP26", "OCT26")]
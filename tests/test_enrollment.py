@@ -0,0 +1,47 @@
+import pytest
+import enrollment
+import member_store
+from members import format_member, new_member
+
+SHEET = "name,Phone\nAsha Kumar,1\n  bala   ,2\n,3\nasha  kumar,4\nChitra,5\n"
+
+
+@pytest.fixture(params=member_store.STORES)
+def store(request, dbx, tmp_path):
+    return member_store.make_store(request.param, dbx, "/members", str(tmp_path / "cache.json"))
+
+
+def test_read_name_rows():
+    rows = enrollment.read_name_rows(SHEET, {"chitra": "RKSC0007"})
+    assert [(row["Row"], row["Name"], row["Status"]) for row in rows] == [
+        (2, "Asha Kumar", "Ready"), (3, "bala", "Ready"), (4, "", "Empty name"),
+        (5, "asha kumar", "Duplicate of row 2"), (6, "Chitra", "Already a member (RKSC0007)")]
+    assert len(enrollment.already_members(rows)) == 1
+    rows = enrollment.read_name_rows(SHEET, {"chitra": "RKSC0007"}, enroll_existing=True)
+    assert (rows[-1]["Status"], rows[-1]["Note"]) == ("Ready", "Same name as RKSC0007")
+    with pytest.raises(ValueError):
+        enrollment.read_name_rows("Member,Amount\nAsha,20\n")
+
+
+def test_enroll(store):
+    store.create("Deepa")
+    rows, saved = store.enroll(enrollment.read_name_rows(SHEET))
+    assert enrollment.enrolled_ids(rows) == {"Asha Kumar": "RKSC0002", "bala": "RKSC0003", "Chitra": "RKSC0004"}
+    assert [row["Status"] for row in rows] == ["Enrolled", "Enrolled", "Empty name", "Duplicate of row 2", "Enrolled"]
+    assert [member.member_id for member in saved] == ["RKSC0002", "RKSC0003", "RKSC0004"]
+    assert sorted(m["Name"] for m in store.load()) == ["Asha Kumar", "Chitra", "Deepa", "bala"]
+
+
+def test_enroll_nothing_ready(store):
+    store.create("Deepa")
+    rows, saved = store.enroll(enrollment.read_name_rows("Name\n\n"))
+    assert saved == [] and len(store.load()) == 1
+
+
+def test_files_enrollment_skips_a_taken_id(dbx, tmp_path):
+    store = member_store.FileStore(dbx, "/members", str(tmp_path / "cache.json"))
+    dbx.files_upload(b"0", store.counter_path)
+    dbx.files_upload(format_member(new_member("Deepa", "RKSC0002")).encode(), "/members/RKSC0002.txt")
+    rows, saved = store.enroll(enrollment.read_name_rows("Name\nAsha\nBala\n"))
+    assert sorted(enrollment.enrolled_ids(rows).values()) == ["RKSC0001", "RKSC0003"]
+    assert store.read("RKSC0002")["Name"] == "Deepa"
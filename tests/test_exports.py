@@ -0,0 +1,50 @@
+import csv
+import io
+from datetime import datetime
+import pytest
+import exports
+from dues import compute_dues, with_total
+from members import parse_member
+
+NOW = datetime(2026, 10, 1)
+
+
+def roster():
+    values = ["None", "OCT26", "SEP26", "NOV26", "JAN20", "Mar26", "soon"]
+    members = [parse_member(f"Name: M{i}\nMember ID: RKSC{i:04d}\nTotal Paid: {i * 20}\n"
+                            f"Last Payment Month: Oct25\nValid Upto: {value}") for i, value in enumerate(values)]
+    members.append(parse_member("Name: Old file\nMember ID: RKSC0099\nTotal Paid: 20.0"))
+    return members
+
+
+@pytest.mark.parametrize("now", [NOW, datetime(2000, 1, 1), datetime(2031, 6, 1)])
+def test_due_rows_match_the_due_list(now):
+    rows = list(exports.due_rows(roster(), now))
+    table = with_total(compute_dues(roster(), now))
+    assert rows[0] == exports.DUE_COLUMNS
+    assert rows[1:] == [[row[c] for c in exports.DUE_COLUMNS] for row in table.to_dict("records")]
+
+
+def test_roster_rows():
+    rows = list(exports.roster_rows(roster()))
+    assert rows[1] == ["M0", "RKSC0000", 0, "OCT25", "None"]
+    assert rows[6][4] == "MAR26" and rows[7][4] == "soon"
+    assert rows[8] == ["Old file", "RKSC0099", "20.0", "None", "None"]
+    assert rows[-1] == ["TOTAL", "", sum(i * 20 for i in range(7)), "", ""]
+
+
+def test_csv_streams_in_chunks():
+    rows = [["Name", "Member ID"]] + [[f"Member {i}", f"RKSC{i:04d}"] for i in range(25)]
+    chunks = list(exports.iter_csv(rows, chunk_rows=10))
+    assert len(chunks) == 3
+    text = b"".join(chunks).decode("utf-8")
+    assert text.startswith("﻿") and list(csv.reader(io.StringIO(text[1:]))) == rows
+
+
+def test_xlsx():
+    openpyxl = pytest.importorskip("openpyxl")
+    data = exports.render(exports.write_xlsx, exports.due_rows(roster(), NOW), title="Dues")
+    sheet = openpyxl.load_workbook(io.BytesIO(data))["Dues"]
+    # empty cells read back as None
+    assert [["" if v is None else v for v in row] for row in sheet.iter_rows(values_only=True)] == \
+        list(exports.due_rows(roster(), NOW))
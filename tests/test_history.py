@@ -0,0 +1,84 @@
+import json
+from datetime import datetime
+import pytest
+import history
+from members import month_ordinal, new_member
+
+OCT = month_ordinal(datetime(2026, 10, 1))
+
+
+def roster():
+    return [new_member("Asha", "RKSC0001")]
+
+
+def test_checkpoint_names():
+    assert history.checkpoint_name(OCT) == "2026-10.json"
+    assert history.checkpoint_name(OCT, compressed=True) == "2026-10.json.gz"
+    assert history.checkpoint_ordinal("2026-10.json.gz") == OCT
+    assert history.checkpoint_ordinal(history.WATCHING_NAME) is None
+
+
+def test_write_read_and_nearest(dbx):
+    assert history.write_checkpoint(dbx, history.DEFAULT_ROOT, roster(), OCT, datetime(2026, 11, 1))
+    assert not history.write_checkpoint(dbx, history.DEFAULT_ROOT, [], OCT, datetime(2026, 11, 2))
+    header, members = history.read_checkpoint(dbx, history.DEFAULT_ROOT, OCT)
+    assert [m["Member ID"] for m in members] == ["RKSC0001"]
+    assert history.read_checkpoint(dbx, history.DEFAULT_ROOT, OCT - 1) is None
+    assert history.nearest(history.list_checkpoints(dbx), OCT + 3) == OCT
+    assert history.nearest([OCT], OCT - 1) is None
+
+
+def test_prune(dbx):
+    for ordinal in (OCT - 30, OCT - 34, OCT - 5, OCT - 1):
+        history.write_checkpoint(dbx, history.DEFAULT_ROOT, roster(), ordinal, datetime(2026, 10, 1))
+    assert history.prune(dbx, history.DEFAULT_ROOT, datetime(2026, 10, 1)) == (2, 1)
+    names = history.list_checkpoints(dbx)
+    assert sorted(names) == [OCT - 34, OCT - 5, OCT - 1]  # OCT - 34 is a December
+    assert names[OCT - 5].endswith(".gz") and not names[OCT - 1].endswith(".gz")
+    assert history.read_checkpoint(dbx, history.DEFAULT_ROOT, OCT - 5)[1][0]["Name"] == "Asha"
+
+
+def test_first_run_does_not_backfill(dbx):
+    month_end = history.MonthEnd(dbx, history.DEFAULT_ROOT, roster)
+    assert month_end.ensure(datetime(2026, 10, 17)) is None
+    assert history.list_checkpoints(dbx) == {}
+    _, res = dbx.files_download(f"{history.DEFAULT_ROOT}/{history.WATCHING_NAME}")
+    assert json.loads(res.content) == {"since": "OCT26"}
+    # the month it started watching is checkpointed once it ends
+    later = history.MonthEnd(dbx, history.DEFAULT_ROOT, roster)
+    assert later.ensure(datetime(2026, 11, 1)) == OCT
+    assert later.ensure(datetime(2026, 11, 2)) is None
+
+
+def test_existing_checkpoints_count_as_watched(dbx):
+    history.write_checkpoint(dbx, history.DEFAULT_ROOT, roster(), OCT - 2, datetime(2026, 9, 1))
+    month_end = history.MonthEnd(dbx, history.DEFAULT_ROOT, roster)
+    assert month_end.ensure(datetime(2026, 11, 1)) == OCT
+    assert history.watching_since(dbx, history.DEFAULT_ROOT, OCT + 5) == OCT - 2
+
+
+def test_failures_back_off(dbx, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(history.time, "monotonic", lambda: clock[0])
+    history.watching_since(dbx, history.DEFAULT_ROOT, OCT)
+    calls = []
+    def load():
+        calls.append(clock[0])
+        if len(calls) < 3:
+            raise OSError("offline")
+        return roster()
+
+    month_end = history.MonthEnd(dbx, history.DEFAULT_ROOT, load)
+    now = datetime(2026, 11, 1)
+    with pytest.raises(OSError):
+        month_end.ensure(now)
+    assert month_end.ensure(now) is None  # not tried again yet
+    clock[0] += history.RETRY_BASE
+    with pytest.raises(OSError):
+        month_end.ensure(now)
+    clock[0] += history.RETRY_BASE
+    assert month_end.ensure(now) is None  # the delay has doubled
+    clock[0] += history.RETRY_BASE
+    assert month_end.ensure(now) == OCT
+    assert len(calls) == 3
+    assert month_end.ensure(now) is None and len(calls) == 3
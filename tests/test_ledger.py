@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+import dropbox
+import pytest
+import ledger
+from members import new_member
+
+START = datetime(2030, 1, 1)
+
+
+def at(n):
+    # Segments are replayed in name order, which starts with their time
+    return START + timedelta(seconds=n)
+
+
+def test_refresh_replays_segments(dbx):
+    state = ledger.Ledger(dbx)
+    assert state.refresh() == []
+    state.append([ledger.member_event(new_member("Asha", "RKSC0001"))], at(1))
+    state.append([ledger.payment_event("RKSC0001", 40, datetime(2026, 1, 15))], at(2))
+    [member] = state.refresh()
+    assert (member["Total Paid"], member["Valid Upto"]) == ("40", "FEB26")
+
+
+def test_refresh_picks_up_other_stations(dbx):
+    state = ledger.Ledger(dbx)
+    state.append([ledger.member_event(new_member("Asha", "RKSC0001"))], at(1))
+    state.refresh()
+    other = ledger.Ledger(dbx)
+    other.append([ledger.member_event(new_member("Bala", "RKSC0002"))], at(2))
+    # a segment that sorts before ones already applied is still replayed in order
+    other.append([ledger.payment_event("RKSC0001", 20, datetime(2026, 1, 15))], at(0))
+    members = {m["Member ID"]: m for m in state.refresh()}
+    assert sorted(members) == ["RKSC0001", "RKSC0002"]
+    assert members["RKSC0001"]["Total Paid"] == "0"  # paid before the member existed
+
+
+def test_compact(dbx):
+    state = ledger.Ledger(dbx)
+    ledger.start_ledger(dbx, [new_member("Asha", "RKSC0001")])
+    state.append([ledger.payment_event("RKSC0001", 20, datetime(2026, 1, 15))], at(1))
+    state.append([ledger.member_event(new_member("Bala", "RKSC0002"))], at(2))
+    before = state.refresh()
+    assert ledger.compact(dbx) == 2
+    assert ledger.list_segments(dbx) == [] and ledger.compact(dbx) == 0
+    members, folded, _ = ledger.read_checkpoint(dbx)
+    assert members == before and len(folded) == 2
+    assert state.refresh() == before and ledger.Ledger(dbx).refresh() == before
+    archived = dbx.files_list_folder("/ledger/archive", recursive=True).entries
+    assert len([e for e in archived if isinstance(e, dropbox.files.FileMetadata)]) == 2
+
+
+def test_start_ledger_only_once(dbx):
+    ledger.start_ledger(dbx, [])
+    with pytest.raises(dropbox.exceptions.ApiError):
+        ledger.start_ledger(dbx, [new_member("Asha", "RKSC0001")])
@@ -0,0 +1,58 @@
+import zipfile
+import pytest
+import manage
+import snapshot
+import storage
+from members import format_member, new_member
+
+COMMANDS = ["migrate-snapshot", "migrate-ledger", "compact-ledger", "reshard-members", "check-dues-summary",
+            "due-report", "checkpoint-month"]
+
+
+@pytest.fixture
+def local(monkeypatch, tmp_path):
+    # manage.py reads its storage settings from the environment
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORAGE_ROOT", str(tmp_path / "storage"))
+    dbx = storage.LocalBackend(str(tmp_path / "storage"))
+    for number, name in enumerate(["Asha", "Bala"], 1):
+        dbx.files_upload(format_member(new_member(name, f"RKSC{number:04d}")).encode(), f"/members/RKSC{number:04d}.txt")
+    return dbx
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_common_options(command):
+    args = manage.build_parser().parse_args([command, "--workers", "3"])
+    assert args.workers == 3
+    if command in ("check-dues-summary", "due-report", "checkpoint-month"):
+        args = manage.build_parser().parse_args([command, "--source", "snapshot", "--snapshot", "/r.jsonl"])
+        assert (args.source, args.snapshot, args.folder) == ("snapshot", "/r.jsonl", "/members")
+
+
+def test_check_dues_summary(local, capsys):
+    with pytest.raises(SystemExit):
+        manage.main(["check-dues-summary"])
+    manage.main(["check-dues-summary", "--fix"])
+    manage.main(["check-dues-summary"])
+    assert "matches the 2 members" in capsys.readouterr().out
+
+
+def test_migrate_snapshot_and_read_from_it(local, capsys):
+    manage.main(["migrate-snapshot"])
+    assert [m["Name"] for m in snapshot.read_snapshot(local)[0]] == ["Asha", "Bala"]
+    manage.main(["check-dues-summary", "--source", "snapshot", "--fix"])
+    assert "Rebuilt" in capsys.readouterr().out
+
+
+def test_checkpoint_month(local, capsys):
+    manage.main(["checkpoint-month"])
+    manage.main(["checkpoint-month"])
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("Wrote the ") and "already has a checkpoint" in out[1]
+
+
+def test_due_report(local, tmp_path):
+    output = tmp_path / "report.zip"
+    manage.main(["due-report", "--output", str(output), "--processes", "1"])
+    with zipfile.ZipFile(output) as report:
+        assert len(report.namelist()) == 3  # the due list and two statements
@@ -0,0 +1,63 @@
+import dropbox
+from member_cache import MemberCache
+from members import format_member, new_member
+
+
+def put(dbx, member):
+    dbx.files_upload(format_member(member).encode("utf-8"), f"/members/{member['Member ID']}.txt",
+                     mode=dropbox.files.WriteMode.overwrite)
+
+
+def count_downloads(dbx, monkeypatch):
+    downloaded = []
+    download = dbx.files_download
+
+    def counted(path, rev=None):
+        downloaded.append(path)
+        return download(path, rev=rev)
+    monkeypatch.setattr(dbx, "files_download", counted)
+    return downloaded
+
+
+def test_warm_start_downloads_nothing(dbx, tmp_path, monkeypatch):
+    for number in range(1, 6):
+        put(dbx, new_member(f"Member {number}", f"RKSC{number:04d}"))
+    assert len(MemberCache(dbx, "/members", str(tmp_path / "cache.json")).sync()) == 5
+    downloaded = count_downloads(dbx, monkeypatch)
+    members = MemberCache(dbx, "/members", str(tmp_path / "cache.json")).sync()
+    assert sorted(member["Member ID"] for member in members) == [f"RKSC{number:04d}" for number in range(1, 6)]
+    assert downloaded == []
+
+
+def test_sync_fetches_only_changes(dbx, tmp_path, monkeypatch):
+    for number in range(1, 4):
+        put(dbx, new_member(f"Member {number}", f"RKSC{number:04d}"))
+    cache = MemberCache(dbx, "/members", str(tmp_path / "cache.json"))
+    cache.sync()
+    downloaded = count_downloads(dbx, monkeypatch)
+    changed = new_member("Member 2", "RKSC0002")
+    changed["Total Paid"] = "40"
+    put(dbx, changed)
+    put(dbx, new_member("Member 4", "RKSC0004"))
+    dbx.files_delete_v2("/members/RKSC0001.txt")
+    members = {member["Member ID"]: member for member in cache.sync()}
+    assert sorted(members) == ["RKSC0002", "RKSC0003", "RKSC0004"]
+    assert members["RKSC0002"]["Total Paid"] == "40"
+    assert sorted(downloaded) == ["/members/RKSC0002.txt", "/members/RKSC0004.txt"]
+
+
+def test_find_returns_a_copy(dbx, tmp_path):
+    put(dbx, new_member("Asha", "RKSC0001"))
+    cache = MemberCache(dbx, "/members", str(tmp_path / "cache.json"))
+    member = cache.find("rksc0001")
+    assert member["Name"] == "Asha"
+    member["Name"] = "Changed"
+    assert cache.find("RKSC0001")["Name"] == "Asha"
+    assert cache.find("RKSC0009") is None
+
+
+def test_cache_of_another_folder_is_ignored(dbx, tmp_path):
+    put(dbx, new_member("Asha", "RKSC0001"))
+    MemberCache(dbx, "/members", str(tmp_path / "cache.json")).sync()
+    other = MemberCache(dbx, "/other", str(tmp_path / "cache.json"))
+    assert other.cursor is None and other.entries == {}
@@ -0,0 +1,45 @@
+import threading
+import member_ids
+
+
+def test_reserve_continues_the_counter(dbx):
+    assert member_ids.reserve_ids(dbx, 2) == ["RKSC0001", "RKSC0002"]
+    assert member_ids.reserve_ids(dbx, 3) == ["RKSC0003", "RKSC0004", "RKSC0005"]
+    assert member_ids.read_counter(dbx, member_ids.DEFAULT_COUNTER_PATH)[0] == 5
+
+
+def test_seed_is_only_used_without_a_counter(dbx):
+    seeds = []
+    seed = lambda: seeds.append(1) or 41
+    assert member_ids.reserve_ids(dbx, 1, seed=seed) == ["RKSC0042"]
+    assert member_ids.reserve_ids(dbx, 1, seed=seed) == ["RKSC0043"]
+    assert seeds == [1]
+
+
+def test_concurrent_reservations_never_overlap(dbx):
+    ids, lock = [], threading.Lock()
+
+    def reserve():
+        for _ in range(5):
+            reserved = member_ids.reserve_ids(dbx, 2)
+            with lock:
+                ids.extend(reserved)
+    threads = [threading.Thread(target=reserve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(ids) == [f"RKSC{n:04d}" for n in range(1, 41)]
+
+
+def test_highest_existing_number(dbx):
+    for path in ["/members/RKSC0007.txt", "/members/RKSC00xx/RKSC0012.txt", "/members/RKSC01xx/RKSC0150.txt",
+                 "/members/notes.txt"]:
+        dbx.files_upload(b"Name: x", path)
+    dbx.files_create_folder_v2("/members/RKSC02xx")  # empty shard
+    assert member_ids.highest_existing_number(dbx, "/members") == 150
+
+
+def test_highest_existing_number_creates_the_folder(dbx):
+    assert member_ids.highest_existing_number(dbx, "/members") == 0
+    assert dbx.files_list_folder("/members").entries == []
@@ -0,0 +1,59 @@
+from datetime import datetime
+import pytest
+import member_paths
+import member_store
+import roster
+from members import format_member, new_member
+
+
+def put_member(dbx, path):
+    member_id = member_paths.member_id_of(path)
+    dbx.files_upload(format_member(new_member(member_id, member_id)).encode(), path)
+
+
+def test_paths():
+    assert member_paths.shard_name("RKSC1234", 100) == "RKSC12xx"
+    assert member_paths.shard_name("RKSC0042", 10) == "RKSC004x"
+    assert member_paths.shard_name("RKSC0042", 0) is None
+    assert member_paths.member_path("/members", "RKSC0042", 100) == "/members/RKSC00xx/RKSC0042.txt"
+    assert member_paths.member_path("/members", "RKSC0042") == "/members/RKSC0042.txt"
+    assert member_paths.shard_start("RKSC12xx") == 1200 and member_paths.shard_start("misc") is None
+    assert member_paths.is_member_path("/members/rksc00xx/RKSC0042.txt", "/Members")
+    assert not member_paths.is_member_path("/members/misc/RKSC0042.txt", "/members")
+    assert not member_paths.is_member_path("/members/notes.csv", "/members")
+    with pytest.raises(ValueError):
+        member_paths.check_shard_size(50)
+
+
+def test_listing_reads_flat_and_sharded_files(dbx):
+    for path in ["/members/RKSC0001.txt", "/members/RKSC00xx/RKSC0002.txt", "/members/RKSC01xx/RKSC0150.txt",
+                 "/members/misc/RKSC0099.txt"]:
+        put_member(dbx, path)
+    members = roster.load_members(dbx, "/members")
+    assert sorted(m["Member ID"] for m in members) == ["RKSC0001", "RKSC0002", "RKSC0150"]
+
+
+def test_reshard_and_back(dbx):
+    for number in [1, 42, 150]:
+        put_member(dbx, f"/members/RKSC{number:04d}.txt")
+    assert roster.reshard_folder(dbx, "/members", 100) == (3, [])
+    paths = sorted(entry.path_display for entry in roster.list_member_files(dbx, "/members"))
+    assert paths == ["/members/RKSC00xx/RKSC0001.txt", "/members/RKSC00xx/RKSC0042.txt",
+                     "/members/RKSC01xx/RKSC0150.txt"]
+    assert roster.reshard_folder(dbx, "/members", 100) == (0, [])  # already in place
+
+    put_member(dbx, "/members/RKSC0042.txt")  # a stray copy where the file goes back to
+    moved, skipped = roster.reshard_folder(dbx, "/members", 0)
+    assert (moved, skipped) == (2, ["/members/RKSC00xx/RKSC0042.txt"])
+
+
+def test_store_writes_new_members_into_shards(dbx, tmp_path):
+    put_member(dbx, "/members/RKSC0001.txt")
+    store = member_store.FileStore(dbx, "/members", str(tmp_path / "cache.json"), shard_size=100)
+    member = store.create("Asha")
+    # paying a member in the old flat layout before anything was loaded
+    assert store.pay("RKSC0001", 20, datetime(2026, 1, 15)) is not None
+    assert store.path_of(member.member_id) == "/members/RKSC00xx/RKSC0002.txt"
+    assert store.path_of("RKSC0001") == "/members/RKSC0001.txt"
+    assert sorted(m["Member ID"] for m in store.load()) == ["RKSC0001", "RKSC0002"]
+    assert store.read("RKSC0001")["Total Paid"] == "20"
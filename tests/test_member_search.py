@@ -0,0 +1,50 @@
+import member_search
+from members import new_member
+
+
+def index(*names):
+    return member_search.MemberIndex([new_member(name, f"RKSC{n:04d}") for n, name in enumerate(names, 1)])
+
+
+def test_ranking():
+    idx = index("Asha Kumar", "Kumaran Nair", "Ravi Kumar", "Asha Menon", "Rekha Kumari")
+    assert idx.search("RKSC0002") == ["RKSC0002"]
+    assert idx.search("4") == ["RKSC0004"]  # a bare number is an ID
+    # whole words first, then words starting with the query
+    assert idx.search("kumar") == ["RKSC0001", "RKSC0003", "RKSC0002", "RKSC0005"]
+    assert idx.search("asha kum")[0] == "RKSC0001"
+    assert idx.search("") == ["RKSC0001", "RKSC0002", "RKSC0003", "RKSC0004", "RKSC0005"]
+
+
+def test_typos_match_similar_names():
+    idx = index("Asha Kumar", "Ravi Menon", "Suresh Pillai")
+    assert idx.search("kumaar") == ["RKSC0001"]
+    assert idx.search("pilai") == ["RKSC0003"]
+    assert idx.search("zzzz") == []
+
+
+def test_ids_and_numbers_are_not_spelling_matched():
+    idx = index(*[f"Member {n}" for n in range(1, 200)])
+    assert idx.search("RKSC004") == [f"RKSC{n:04d}" for n in range(40, 50)]
+    assert idx.search("1234") == []
+
+
+def test_fuzzy_candidates_are_capped(monkeypatch):
+    monkeypatch.setattr(member_search, "FUZZY_MAX_MEMBERS", 3)
+    idx = index("Kumar", "Kumar", "Kumar", "Kumar", "Kumari", "Kumaran")
+    # the most similar token's members are always used, the others only
+    # while they fit under the cap
+    assert idx.search("kumaar") == ["RKSC0001", "RKSC0002", "RKSC0003", "RKSC0004"]
+    monkeypatch.setattr(member_search, "FUZZY_MAX_MEMBERS", 5)
+    assert idx.search("kumaar") == ["RKSC0001", "RKSC0002", "RKSC0003", "RKSC0004", "RKSC0005"]
+
+
+def test_update_and_sync():
+    members = [new_member("Asha", "RKSC0001"), new_member("Bala", "RKSC0002")]
+    idx = member_search.MemberIndex(members)
+    renamed = new_member("Chitra", "RKSC0001")
+    idx.update(renamed)
+    assert idx.search("asha") == [] and idx.search("chitra") == ["RKSC0001"]
+    idx.sync([renamed, new_member("Deepa", "RKSC0003")])
+    assert idx.search("bala") == [] and idx.search("deepa") == ["RKSC0003"]
+    assert len(idx) == 2 and idx.label("RKSC0003") == "RKSC0003 - Deepa"
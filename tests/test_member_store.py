@@ -0,0 +1,71 @@
+import dropbox
+import pytest
+import member_store
+import snapshot
+from members import format_member, new_member
+
+
+@pytest.fixture(params=member_store.STORES)
+def store(request, dbx, tmp_path):
+    return member_store.make_store(request.param, dbx, "/members", str(tmp_path / "cache.json"))
+
+
+def test_create_and_read(store):
+    first, second = store.create("Asha"), store.create("Bala")
+    assert (first.member_id, second.member_id) == ("RKSC0001", "RKSC0002")
+    assert store.read("RKSC0002")["Name"] == "Bala"
+    assert store.read("RKSC0009") is None
+    assert [member["Name"] for member in store.load()] == ["Asha", "Bala"]
+
+
+def test_add_gives_consecutive_ids(store):
+    store.create("Asha")
+    added = store.add(["Bala", "Chitra", "Deepa"])
+    assert [member.member_id for member in added] == ["RKSC0002", "RKSC0003", "RKSC0004"]
+    assert sorted(member["Member ID"] for member in store.load()) == [f"RKSC{n:04d}" for n in range(1, 5)]
+
+
+def test_counter_is_seeded_from_stored_members(dbx, tmp_path):
+    dbx.files_upload(format_member(new_member("Asha", "RKSC0041")).encode(), "/members/RKSC0041.txt")
+    assert member_store.FileStore(dbx, "/members", str(tmp_path / "cache.json")).create("Chitra").member_id == "RKSC0042"
+
+
+def test_snapshot_skips_ids_already_taken(dbx):
+    store = member_store.SnapshotStore(dbx)
+    snapshot.write_snapshot(dbx, store.path, [new_member("Asha", "RKSC0001")])
+    dbx.files_upload(b"0", store.counter_path)  # counter behind the snapshot
+    assert store.create("Bala").member_id == "RKSC0002"
+
+
+def test_file_store_retries_a_taken_id(dbx, tmp_path):
+    store = member_store.FileStore(dbx, "/members", str(tmp_path / "cache.json"))
+    dbx.files_upload(b"0", store.counter_path)
+    dbx.files_upload(format_member(new_member("Asha", "RKSC0001")).encode(), "/members/RKSC0001.txt")
+    assert store.create("Bala").member_id == "RKSC0002"
+    assert store.read("RKSC0001")["Name"] == "Asha"
+
+
+def test_snapshot_round_trip(dbx):
+    members = [new_member("Asha", "RKSC0001"), new_member("Bālā", "RKSC0002")]
+    snapshot.write_snapshot(dbx, "/roster.jsonl", members, header={"queues": {"q": 3}})
+    read, header, rev = snapshot.read_snapshot_file(dbx, "/roster.jsonl")
+    assert read == members and header == {"queues": {"q": 3}} and rev
+    with pytest.raises(dropbox.exceptions.ApiError):
+        snapshot.write_snapshot(dbx, "/roster.jsonl", members)  # without the rev it must not exist yet
+
+
+def test_migrate_folder(dbx):
+    for member_id in ["RKSC0010", "RKSC0002"]:
+        dbx.files_upload(format_member(new_member(member_id, member_id)).encode(), f"/members/{member_id}.txt")
+    assert snapshot.migrate_folder(dbx, "/members") == 2
+    assert [member["Member ID"] for member in snapshot.read_snapshot(dbx)[0]] == ["RKSC0002", "RKSC0010"]
+
+
+def test_unknown_store(dbx):
+    with pytest.raises(ValueError):
+        member_store.make_store("nowhere", dbx, "/members", "cache.json")
+
+
+def test_member_store_is_abstract():
+    with pytest.raises(TypeError):
+        member_store.MemberStore(None)
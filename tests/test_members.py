@@ -0,0 +1,63 @@
+from datetime import datetime
+import pytest
+from members import (Member, apply_payment, format_member, format_ordinal, member_number, month_ordinal,
+                     new_member, parse_member, parse_ordinal)
+
+FILES = [
+    "Name: Asha Kumar\nMember ID: RKSC0001\nTotal Paid: 120\nLast Payment Month: JAN26\nValid Upto: JUN26",
+    "Name: Bala\nMember ID: RKSC0002\nTotal Paid: 0\nLast Payment Month: None\nValid Upto: None\n",
+    # values the app does not write itself, and a field it does not know
+    "Name: Chitra\nMember ID: RKSC0003\nTotal Paid: 20.0\nLast Payment Month: Oct25\nValid Upto: Oct25\nPhone: 98450\n",
+    "Name: Deepa\nMember ID: RKSC0004\nValid Upto: MAR26",
+]
+
+
+@pytest.mark.parametrize("text", FILES)
+def test_round_trip(text):
+    member = parse_member(text)
+    assert format_member(member) == text
+    assert parse_member(format_member(member.copy())) == member
+
+
+def test_typed_fields():
+    member = parse_member(FILES[0])
+    assert (member.total_paid, member.valid_upto) == (120, month_ordinal(datetime(2026, 6, 1)))
+    assert member["Valid Upto"] == "JUN26" and member.to_dict()["Total Paid"] == "120"
+    chitra = parse_member(FILES[2])
+    assert (chitra.total_paid, chitra.valid_upto) == ("20.0", "Oct25")
+    assert chitra["Phone"] == "98450" and list(chitra)[-1] == "Phone"
+
+
+def test_missing_field():
+    member = parse_member(FILES[3])
+    assert "Total Paid" not in member and member.get("Total Paid") is None
+    with pytest.raises(KeyError):
+        member["Last Payment Month"]
+    assert member == {"Name": "Deepa", "Member ID": "RKSC0004", "Valid Upto": "MAR26"}
+
+
+def test_payment():
+    now = datetime(2026, 1, 15)
+    bob = parse_member("Name: Bob\nMember ID: RKSC0002\nTotal Paid: 120\nLast Payment Month: JAN26\nValid Upto: MAR26\n")
+    as_dict = bob.to_dict()
+    assert apply_payment(bob, 40, now) == apply_payment(as_dict, 40, now) == datetime(2026, 5, 1)
+    assert (bob["Total Paid"], bob["Last Payment Month"], bob["Valid Upto"]) == ("160", "JAN26", "MAY26")
+    assert bob == as_dict
+    # without a usable Valid Upto the payment starts from the current month
+    asha = parse_member(FILES[0])
+    asha["Valid Upto"] = "someday"
+    apply_payment(asha, 40, now)
+    assert (asha["Total Paid"], asha["Valid Upto"]) == ("160", "FEB26")
+
+
+def test_new_member():
+    member = new_member("Asha", "RKSC0042")
+    assert format_member(member) == ("Name: Asha\nMember ID: RKSC0042\nTotal Paid: 0\n"
+                                     "Last Payment Month: None\nValid Upto: None")
+    assert member_number(member.member_id) == 42 and member_number("nobody") is None
+
+
+def test_month_ordinals():
+    assert format_ordinal(parse_ordinal("DEC99")) == "DEC99" and parse_ordinal("DEC68") // 12 == 2068
+    assert parse_ordinal("None") is None and parse_ordinal("Dec25") == "Dec25"
+    assert Member.from_mapping({"Valid Upto": "FEB26"}).valid_upto == parse_ordinal("FEB26")
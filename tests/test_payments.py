@@ -0,0 +1,87 @@
+from datetime import datetime
+import dropbox
+import pytest
+import member_store
+import payments
+from members import format_member, new_member, parse_member
+
+NOW = datetime(2026, 1, 15)
+
+
+def put(dbx, member, path=None):
+    return dbx.files_upload(format_member(member).encode(), path or f"/members/{member['Member ID']}.txt",
+                            mode=dropbox.files.WriteMode.overwrite)
+
+
+def read(dbx, path):
+    return parse_member(dbx.files_download(path)[1].content.decode())
+
+
+def test_record_payment(dbx):
+    put(dbx, new_member("Asha", "RKSC0001"))
+    member, new_valid_upto, metadata, retries, before = payments.record_payment(dbx, "/members/RKSC0001.txt", 60, NOW)
+    assert (member["Valid Upto"], new_valid_upto, retries, before) == ("MAR26", datetime(2026, 3, 15), 0, "None")
+    assert read(dbx, "/members/RKSC0001.txt") == member
+    assert metadata.rev == dbx.files_download("/members/RKSC0001.txt")[0].rev
+
+
+def test_concurrent_payment_is_reapplied(dbx, monkeypatch):
+    put(dbx, new_member("Asha", "RKSC0001"))
+    upload = dbx.files_upload
+
+    def other_station_first(f, path, **kwargs):
+        # Another station records a payment between our download and upload
+        monkeypatch.setattr(dbx, "files_upload", upload)
+        payments.record_payment(dbx, path, 20, NOW)
+        return upload(f, path, **kwargs)
+    monkeypatch.setattr(dbx, "files_upload", other_station_first)
+
+    member, _, _, retries, before = payments.record_payment(dbx, "/members/RKSC0001.txt", 40, NOW)
+    assert retries == 1 and before == "JAN26"
+    stored = read(dbx, "/members/RKSC0001.txt")
+    assert (stored["Total Paid"], stored["Valid Upto"]) == ("60", "MAR26")
+
+
+@pytest.fixture(params=member_store.STORES)
+def store(request, dbx, tmp_path):
+    return member_store.make_store(request.param, dbx, "/members", str(tmp_path / "cache.json"))
+
+
+def test_store_pay(store):
+    member_id = store.create("Asha").member_id
+    member, new_valid_upto, retries, before = store.pay(member_id, 40, NOW)
+    assert (member["Total Paid"], member["Valid Upto"], before) == ("40", "FEB26", "None")
+    member, _, _, before = store.pay(member_id, 20, NOW)
+    assert (member["Valid Upto"], before) == ("MAR26", "FEB26")
+    assert store.read(member_id)["Total Paid"] == "60"
+
+
+def test_store_pay_unknown_member(store):
+    store.create("Asha")
+    assert store.pay("RKSC0009", 20, NOW) is None
+
+
+def test_read_payment_rows():
+    rows = payments.read_payment_rows("member id,Amount\nrksc0001,40\n,20\nRKSC0002,15\nRKSC0003,abc\n,\n")
+    assert [(row["Member ID"], row["valid"], row["Status"]) for row in rows] == [
+        ("RKSC0001", True, ""), ("", False, "Missing Member ID"), ("RKSC0002", False, "Invalid amount (minimum 20)"),
+        ("RKSC0003", False, "Invalid amount (minimum 20)")]
+    with pytest.raises(ValueError):
+        payments.read_payment_rows("Name,Amount\nAsha,20\n")
+
+
+def test_store_import_payments(store):
+    first, second = store.add(["Asha", "Bala"])
+    text = f"Member ID,Amount\n{first.member_id},20\n{second.member_id},40\n{first.member_id},20\nRKSC0009,20\n"
+
+    rows, saved = store.import_payments(payments.read_payment_rows(text), NOW, dry_run=True)
+    assert [row["Status"] for row in rows] == ["Ready", "Ready", "Ready", "Member not found"]
+    assert saved == [] and store.read(first.member_id)["Total Paid"] == "0"
+
+    rows, saved = store.import_payments(payments.read_payment_rows(text), NOW, dry_run=False)
+    assert [row["Status"] for row in rows] == ["Saved", "Saved", "Saved", "Member not found"]
+    assert [(row["Valid Upto (before)"], row["Valid Upto (after)"]) for row in rows[:3]] == [
+        ("None", "JAN26"), ("None", "FEB26"), ("JAN26", "FEB26")]
+    assert sorted(member.member_id for member in saved) == [first.member_id, second.member_id]
+    assert store.read(first.member_id)["Total Paid"] == "40"
+    assert store.read(second.member_id)["Valid Upto"] == "FEB26"
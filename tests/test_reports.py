@@ -0,0 +1,73 @@
+import io
+import re
+import zipfile
+import zlib
+from datetime import datetime
+import pytest
+import reports
+
+NOW = datetime(2026, 3, 1)
+
+
+def due_rows(names):
+    return [{"Name": name, "Member ID": f"RKSC{i:04d}", "Due Period": "JAN26 - MAR26", "Due Months": 3,
+             "Due Amount (INR)": 60} for i, name in enumerate(names, 1)]
+
+
+def page_texts(pdf):
+    # The text shown on each page, from its compressed content stream
+    texts = []
+    for match in re.finditer(rb"/Length (\d+)>>\nstream\n", pdf):
+        content = zlib.decompress(pdf[match.end():match.end() + int(match.group(1))]).decode(reports.ENCODING)
+        texts.append(re.findall(r"\((.*?)\) Tj", content))
+    return texts
+
+
+def test_xref_points_at_every_object():
+    pdf = reports.render_due_list_pdf(due_rows(["Asha"] * 60), NOW)
+    xref = int(re.search(rb"startxref\n(\d+)\n%%EOF", pdf).group(1))
+    assert pdf[xref:].startswith(b"xref")
+    offsets = re.findall(rb"(\d{10}) 00000 n", pdf[xref:])
+    for number, offset in enumerate(offsets, 1):
+        assert pdf[int(offset):].startswith(b"%d 0 obj" % number)
+
+
+def test_due_list_pages():
+    pdf = reports.render_due_list_pdf(due_rows([f"Member {n}" for n in range(1, 61)]), NOW)
+    pages = page_texts(pdf)
+    assert len(pages) == 3 and b"/Count 3" in pdf
+    assert pages[0][0] == "RKSC Club - Due List \\(01 March 2026\\)"
+    headers = [reports._escape(header) for header in reports.HEADERS]
+    assert pages[0][1:6] == headers and pages[1][:5] == headers and pages[2][:5] == headers
+    names = [text for page in pages for text in page if text.startswith("Member ") and text != "Member ID"]
+    assert names == [f"Member {n}" for n in range(1, 61)]
+
+
+def test_accents_are_kept_or_dropped():
+    pdf = reports.render_due_list_pdf(due_rows(["José Zoë", "Bālā Śrī"]), NOW)
+    texts = page_texts(pdf)[0]
+    assert "José Zoë" in texts and "Bala Sri" in texts
+    assert reports.pdf_text("é") == "e"  # decomposed accent
+
+
+def test_unwritable_names_are_rejected():
+    assert reports.unwritable(["Asha", "राम", "Zoë", "राम", "Ωmega"]) == ["राम", "Ωmega"]
+    with pytest.raises(ValueError):
+        reports.render_due_list_pdf(due_rows(["राम"]), NOW)
+
+
+def test_string_width():
+    # A, B and C are 667, 667 and 722 thousandths of the font size
+    assert reports.string_width("ABC", "", 10) == pytest.approx(2056 * 10 / 1000 / reports.K)
+    assert reports.string_width("€", "B", 10) == pytest.approx(556 * 10 / 1000 / reports.K)
+
+
+def test_report_zip():
+    statements = [dict(row, **{"Total Paid": 0, "Last Payment Month": "None", "Valid Upto": "DEC25"})
+                  for row in due_rows(["Asha", "Bala"])]
+    out = io.BytesIO()
+    assert reports.write_report_zip(due_rows(["Asha", "Bala"]), statements, NOW, out, processes=1) == 2
+    with zipfile.ZipFile(out) as archive:
+        assert sorted(archive.namelist()) == ["duelist_01_March_2026.pdf", "statements/RKSC0001.pdf",
+                                              "statements/RKSC0002.pdf"]
+        assert "Bala" in page_texts(archive.read("statements/RKSC0002.pdf"))[0]
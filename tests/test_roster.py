@@ -0,0 +1,40 @@
+import dropbox
+import pytest
+import roster
+import storage
+from members import format_member, new_member
+
+
+def put(dbx, path, text):
+    dbx.files_upload(text.encode("utf-8"), path, mode=dropbox.files.WriteMode.overwrite)
+
+
+def test_load_members_follows_every_page():
+    dbx = storage.MemoryBackend(page_size=3)
+    for number in range(1, 11):
+        put(dbx, f"/members/RKSC{number:04d}.txt", format_member(new_member(f"Member {number}", f"RKSC{number:04d}")))
+    members = roster.load_members(dbx, "/members", max_workers=4)
+    assert sorted(member["Member ID"] for member in members) == [f"RKSC{number:04d}" for number in range(1, 11)]
+
+
+def test_load_members_keeps_listing_order(dbx):
+    for member_id in ["RKSC0003", "RKSC0001", "RKSC0002"]:
+        put(dbx, f"/members/{member_id}.txt", format_member(new_member(member_id, member_id)))
+    listed = [entry.path_display for entry in roster.list_member_files(dbx, "/members")]
+    members = roster.load_members(dbx, "/members", max_workers=3)
+    assert [f"/members/{member['Member ID']}.txt" for member in members] == listed
+
+
+def test_load_members_skips_other_files(dbx):
+    put(dbx, "/members/RKSC0001.txt", "Name: Asha\nMember ID: RKSC0001\nTotal Paid: 40\n"
+                                      "Last Payment Month: JAN26\nValid Upto: FEB26")
+    put(dbx, "/members/notes.md", "not a member")
+    dbx.files_create_folder_v2("/members/archive")
+    members = roster.load_members(dbx, "/members")
+    assert [member.to_dict() for member in members] == [{"Name": "Asha", "Member ID": "RKSC0001", "Total Paid": "40",
+                                                         "Last Payment Month": "JAN26", "Valid Upto": "FEB26"}]
+
+
+def test_load_members_of_missing_folder(dbx):
+    with pytest.raises(dropbox.exceptions.ApiError):
+        roster.load_members(dbx, "/members")
@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+from roster_cache import SharedRoster
+
+
+class Loads:
+    # A load function that counts its calls and can be held mid-load
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return [{"Member ID": f"RKSC{self.calls:04d}"}]
+
+
+def test_reused_until_stale():
+    load = Loads()
+    roster = SharedRoster(load, max_age=60)
+    first = roster.get()
+    assert roster.get() == first and load.calls == 1
+    first.append("edit")  # callers get their own list
+    assert len(roster.get()) == 1
+    stale = SharedRoster(load, max_age=0)
+    stale.get(), stale.get()
+    assert load.calls == 3
+
+
+def test_concurrent_gets_share_one_load():
+    load = Loads()
+    load.release.clear()
+    roster = SharedRoster(load, max_age=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(roster.get())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    load.started.wait(5)
+    time.sleep(0.05)
+    load.release.set()
+    for thread in threads:
+        thread.join()
+    assert load.calls == 1 and len(results) == 5
+    assert roster.stats["loads"] == 1 and roster.stats["waits"] + roster.stats["hits"] == 4
+
+
+def test_invalidate_loads_again():
+    load = Loads()
+    roster = SharedRoster(load, max_age=60)
+    roster.get()
+    roster.invalidate()
+    assert roster.get() == [{"Member ID": "RKSC0002"}] and load.calls == 2
+
+
+def test_load_running_during_a_write_is_not_kept():
+    load = Loads()
+    load.release.clear()
+    roster = SharedRoster(load, max_age=60)
+    waiting = threading.Thread(target=roster.get)
+    waiting.start()
+    load.started.wait(5)
+    roster.invalidate()  # a write lands while the load is running
+    load.release.set()
+    waiting.join()
+    assert roster.get() == [{"Member ID": "RKSC0002"}] and load.calls == 2
+
+
+def test_last_good_survives_failures():
+    roster = SharedRoster(lambda: [{"Member ID": "RKSC0001"}], max_age=0)
+    assert roster.last_good() is None
+    roster.get()
+
+    def down():
+        raise OSError("offline")
+    roster.load = down
+    roster.invalidate()
+    with pytest.raises(OSError):
+        roster.get()
+    assert roster.last_good() == [{"Member ID": "RKSC0001"}]
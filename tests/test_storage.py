@@ -0,0 +1,118 @@
+import dropbox
+import pytest
+import storage
+from dropbox.files import WriteMode
+from writes import is_conflict, upload_batch
+
+
+@pytest.fixture(params=["memory", "local"])
+def backend(request, tmp_path):
+    return storage.make_backend(request.param, root=str(tmp_path / "storage"))
+
+
+def names(result):
+    return [entry.name for entry in result.entries]
+
+
+def test_upload_and_download(backend):
+    metadata = backend.files_upload(b"Name: Asha", "/members/RKSC0001.txt")
+    downloaded, res = backend.files_download("/Members/rksc0001.TXT")
+    assert res.content == b"Name: Asha"
+    assert (downloaded.path_display, downloaded.rev) == ("/members/RKSC0001.txt", metadata.rev)
+    assert metadata.content_hash == storage.content_hash(b"Name: Asha")
+    with pytest.raises(dropbox.exceptions.ApiError) as e:
+        backend.files_download("/members/RKSC0002.txt")
+    assert e.value.error.is_path()
+    backend.files_upload(b"Name: Bala", "/MEMBERS/RKSC0002.txt")
+    assert names(backend.files_list_folder("/members")) == ["RKSC0001.txt", "RKSC0002.txt"]
+
+
+def test_conditional_writes(backend):
+    first = backend.files_upload(b"1", "/counter.txt")
+    with pytest.raises(dropbox.exceptions.ApiError) as e:
+        backend.files_upload(b"2", "/counter.txt", mode=WriteMode.add)
+    assert is_conflict(e.value)
+    second = backend.files_upload(b"2", "/counter.txt", mode=WriteMode.update(first.rev))
+    with pytest.raises(dropbox.exceptions.ApiError) as e:
+        backend.files_upload(b"3", "/counter.txt", mode=WriteMode.update(first.rev))
+    assert is_conflict(e.value)
+    backend.files_upload(b"4", "/counter.txt", mode=WriteMode.overwrite)
+    assert second.rev != first.rev
+    assert backend.files_download("/counter.txt")[1].content == b"4"
+
+
+def test_paged_listing(backend):
+    backend.page_size = 2
+    for number in range(5):
+        backend.files_upload(b"x", f"/members/RKSC000{number}.txt")
+    res = backend.files_list_folder("/members")
+    listed = names(res)
+    while res.has_more:
+        res = backend.files_list_folder_continue(res.cursor)
+        listed += names(res)
+    assert listed == [f"RKSC000{number}.txt" for number in range(5)]
+    with pytest.raises(dropbox.exceptions.ApiError):
+        backend.files_list_folder("/nowhere")
+
+
+def test_cursor_reports_changes(backend):
+    backend.files_upload(b"1", "/members/RKSC0001.txt")
+    backend.files_upload(b"2", "/members/RKSC0002.txt")
+    cursor = backend.files_list_folder_get_latest_cursor("/members", recursive=True).cursor
+    backend.files_upload(b"changed", "/members/RKSC0001.txt", mode=WriteMode.overwrite)
+    backend.files_delete_v2("/members/RKSC0002.txt")
+    backend.files_upload(b"3", "/members/RKSC00xx/RKSC0003.txt")
+    res = backend.files_list_folder_continue(cursor)
+    changes = {entry.path_lower: type(entry).__name__ for entry in res.entries}
+    assert changes["/members/rksc0001.txt"] == "FileMetadata"
+    assert changes["/members/rksc0002.txt"] == "DeletedMetadata"
+    assert changes["/members/rksc00xx/rksc0003.txt"] == "FileMetadata"
+    assert backend.files_list_folder_continue(res.cursor).entries == []
+
+
+def test_unknown_cursor_is_reset(backend):
+    with pytest.raises(dropbox.exceptions.ApiError) as e:
+        backend.files_list_folder_continue("expired")
+    assert e.value.error.is_reset()
+
+
+def test_move_and_delete(backend):
+    backend.files_upload(b"1", "/members/RKSC0001.txt")
+    backend.files_upload(b"2", "/members/RKSC0002.txt")
+    with pytest.raises(dropbox.exceptions.ApiError) as e:
+        backend.files_move_v2("/members/RKSC0001.txt", "/members/RKSC0002.txt")
+    assert e.value.error.is_to()
+    backend.files_move_v2("/members/RKSC0001.txt", "/members/RKSC00xx/RKSC0001.txt")
+    assert backend.files_download("/members/RKSC00xx/RKSC0001.txt")[1].content == b"1"
+    backend.files_delete_v2("/members/RKSC0002.txt")
+    assert names(backend.files_list_folder("/members")) == ["RKSC00xx"]
+    with pytest.raises(dropbox.exceptions.ApiError):
+        backend.files_delete_v2("/members/RKSC0002.txt")
+
+
+def test_create_folder(backend):
+    backend.files_create_folder_v2("/members")
+    assert backend.files_list_folder("/members").entries == []
+    with pytest.raises(dropbox.exceptions.ApiError):
+        backend.files_create_folder_v2("/members")
+
+
+def test_upload_batch(backend):
+    backend.files_upload(b"taken", "/members/RKSC0002.txt")
+    results = upload_batch(backend, [("/members/RKSC0001.txt", b"1", WriteMode.add),
+                                     ("/members/RKSC0002.txt", b"2", WriteMode.add)])
+    assert [result.is_success() for result in results] == [True, False]
+    assert results[1].get_failure().is_path()
+    assert backend.files_download("/members/RKSC0002.txt")[1].content == b"taken"
+
+
+def test_backends_are_abstract():
+    with pytest.raises(TypeError):
+        storage.StorageBackend()
+    with pytest.raises(TypeError):
+        storage.EmulatedBackend()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        storage.make_backend("ftp")
@@ -0,0 +1,152 @@
+from datetime import datetime
+import pytest
+import member_store
+import write_queue
+
+# Ledger segments replay in time order, so queued writes are entered after
+# the members the tests create directly
+NOW = datetime(2030, 1, 15)
+
+
+@pytest.fixture(params=member_store.STORES)
+def store(request, dbx, tmp_path):
+    return member_store.make_store(request.param, dbx, "/members", str(tmp_path / "cache.json"))
+
+
+def make_queue(store, tmp_path, **kwargs):
+    return write_queue.WriteQueue(str(tmp_path / "queue.sqlite3"), store.flush, store.reserve, **kwargs)
+
+
+def lose_replies(monkeypatch, dbx):
+    # Uploads still land, but the caller never hears back
+    for name in ("files_upload", "files_upload_session_finish_batch_v2"):
+        def lost(*args, call=getattr(dbx, name), **kwargs):
+            call(*args, **kwargs)
+            raise OSError("connection reset")
+        monkeypatch.setattr(dbx, name, lost)
+
+
+def test_flush(store, tmp_path):
+    asha = store.create("Asha").member_id
+    queue = make_queue(store, tmp_path, id_block=4)
+    queue.top_up_ids()
+    bala = queue.enqueue_member("Bala", NOW)
+    queue.enqueue_payment(asha, 40, NOW)
+    queue.enqueue_payment(bala, 20, NOW)
+    assert queue.depth() == 3
+    assert queue.flush_once()
+    assert queue.depth() == 0 and queue.failed() == []
+    assert (store.read(asha)["Total Paid"], store.read(bala)["Valid Upto"]) == ("40", "JAN30")
+    assert store.read(bala)["Name"] == "Bala" and "Queue" not in " ".join(store.read(asha))
+
+
+@pytest.mark.parametrize("kind", ["files", "snapshot"])
+def test_unknown_member_is_rejected(kind, dbx, tmp_path):
+    store = member_store.make_store(kind, dbx, "/members", str(tmp_path / "cache.json"))
+    store.create("Asha")
+    queue = make_queue(store, tmp_path)
+    queue.enqueue_payment("RKSC0099", 20, NOW)
+    assert queue.flush_once() and queue.depth() == 0
+    assert [(e["member_id"], e["failed"]) for e in queue.failed()] == [("RKSC0099", "Member not found")]
+
+
+def test_read_overlays_pending_writes(store, tmp_path):
+    asha = store.create("Asha").member_id
+    queue = make_queue(store, tmp_path)
+    queue.top_up_ids()
+    bala = queue.enqueue_member("Bala", NOW)
+    queue.enqueue_payment(asha, 40, NOW)
+    members = {m["Member ID"]: m for m in queue.read(store.load)}
+    assert members[asha]["Total Paid"] == "40" and members[bala]["Name"] == "Bala"
+    assert store.read(asha)["Total Paid"] == "0"  # stored members are not edited
+
+
+def test_journal_survives_a_restart(store, tmp_path):
+    asha = store.create("Asha").member_id
+    queue = make_queue(store, tmp_path)
+    queue.enqueue_payment(asha, 20, NOW)
+    queue = make_queue(store, tmp_path)
+    assert queue.depth() == 1 and queue.flush_once()
+    assert store.read(asha)["Total Paid"] == "20"
+
+
+def test_reserved_ids_are_not_handed_out_again(store, tmp_path):
+    queue = make_queue(store, tmp_path, id_block=4)
+    queue.top_up_ids()
+    queued = [queue.enqueue_member(name, NOW) for name in ["Asha", "Bala", "Chitra"]]
+    direct = store.create("Deepa").member_id
+    queue.top_up_ids()
+    queued.append(queue.enqueue_member("Esha", NOW))
+    assert len(set(queued + [direct])) == 5
+    assert queue.flush_once() and queue.failed() == []
+    assert sorted(m["Member ID"] for m in store.load()) == sorted(queued + [direct])
+
+
+def test_new_member_needs_no_storage_call(store, tmp_path, monkeypatch):
+    queue = make_queue(store, tmp_path, id_block=2)
+    queue.top_up_ids()
+    monkeypatch.setattr(store, "reserve", lambda count: pytest.fail("storage was called"))
+    assert queue.enqueue_member("Asha", NOW) and queue.enqueue_member("Bala", NOW)
+    # block used up: refused rather than reserving one ID on the spot
+    assert queue.enqueue_member("Chitra", NOW) is None
+    assert [e["name"] for e in queue.pending()] == ["Asha", "Bala"]
+
+
+def test_lost_reply_is_not_applied_twice(store, tmp_path, monkeypatch):
+    asha = store.create("Asha").member_id
+    queue = make_queue(store, tmp_path)
+    queue.top_up_ids()
+    bala = queue.enqueue_member("Bala", NOW)
+    queue.enqueue_payment(asha, 40, NOW)
+    queue.enqueue_payment(bala, 20, NOW)
+    with monkeypatch.context() as patch:
+        lose_replies(patch, store.dbx)
+        with pytest.raises(OSError):
+            queue.flush_once()
+    assert queue.depth() == 3
+    assert queue.flush_once()
+    assert queue.depth() == 0 and queue.failed() == []
+    assert (store.read(asha)["Total Paid"], store.read(bala)["Total Paid"]) == ("40", "20")
+
+
+def test_lost_reply_then_another_write_needs_checking(dbx, tmp_path, monkeypatch):
+    store = member_store.FileStore(dbx, "/members", str(tmp_path / "cache.json"))
+    asha = store.create("Asha").member_id
+    queue = make_queue(store, tmp_path)
+    queue.enqueue_payment(asha, 40, NOW)
+    with monkeypatch.context() as patch:
+        lose_replies(patch, dbx)
+        with pytest.raises(OSError):
+            queue.flush_once()
+    store.pay(asha, 20, NOW)  # another station
+    assert queue.flush_once()
+    assert [e["failed"] for e in queue.failed()] == [write_queue.NEEDS_CHECKING]
+    assert store.read(asha)["Total Paid"] == "60"
+    assert queue._rows("SELECT * FROM intents") == []
+
+
+def test_upload_that_did_not_land_is_made_again(dbx, tmp_path, monkeypatch):
+    store = member_store.FileStore(dbx, "/members", str(tmp_path / "cache.json"))
+    asha = store.create("Asha").member_id
+    queue = make_queue(store, tmp_path)
+    queue.enqueue_payment(asha, 40, NOW)
+
+    def down(*args, **kwargs):
+        raise OSError("no route to host")
+    monkeypatch.setattr(dbx, "files_upload_session_finish_batch_v2", down)
+    with pytest.raises(OSError):
+        queue.flush_once()
+    monkeypatch.undo()
+    assert queue.flush_once() and queue.failed() == []
+    assert store.read(asha)["Total Paid"] == "40"
+
+
+def test_snapshot_header_records_the_queue(dbx, tmp_path):
+    store = member_store.SnapshotStore(dbx)
+    asha = store.create("Asha").member_id
+    queue = make_queue(store, tmp_path)
+    queue.enqueue_payment(asha, 20, NOW)
+    queue.flush_once()
+    store.pay(asha, 20, NOW)  # a direct write keeps the header
+    _, header, _ = write_queue.snapshot.read_snapshot_file(dbx, store.path)
+    assert header["queues"] == {queue.queue_id: 1}
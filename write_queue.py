@@ -0,0 +1,469 @@
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+import dropbox
+import dues_summary
+import ledger
+import payments
+import snapshot
+from diagnostics import logger
+from member_ids import format_member_id
+from members import apply_payment, format_member, member_number, new_member
+from roster import DEFAULT_MAX_WORKERS
+from writes import is_conflict, upload_batch
+
+# Write-behind queue for payments and new members. Each write is journaled
+# to a local SQLite file and acknowledged at once; a background thread
+# flushes the journal to storage in batches and only then deletes the
+# entries, so a slow or rate-limited Dropbox never blocks the counter and a
+# crash or outage loses nothing. New members take their IDs from a block
+# reserved ahead of time, so adding one needs no round trip either; when the
+# block is used up a new member is refused until the worker has topped it up.
+DEFAULT_PATH = ".write_queue.sqlite3"
+BATCH_SIZE = 500  # entries per flush
+ID_BLOCK_SIZE = 20  # member IDs kept in reserve
+FLUSH_DELAY = 0.5  # seconds to let a burst of writes gather into one batch
+IDLE_INTERVAL = 30.0  # seconds between checks while the queue is empty
+RETRY_BASE = 1.0  # seconds
+RETRY_MAX = 300.0
+READ_WAIT = 5.0  # seconds a read waits for a flush in progress
+NEEDS_CHECKING = "Needs checking: the file changed after this write was sent, so it may or may not have been saved"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,            -- "member" or "payment"
+    member_id TEXT NOT NULL,
+    name TEXT,                     -- new members
+    amount INTEGER,                -- payments
+    at TEXT NOT NULL,              -- when it was entered, ISO 8601
+    valid_upto_before TEXT,        -- payments: the member's Valid Upto key (dues_summary.month_key)
+    valid_upto_after TEXT,         -- before and after, as the UI worked it out
+    batch TEXT,                    -- flush batch the entry was claimed for
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,                    -- last error, kept while it is retried
+    failed TEXT                    -- why storage rejected it for good
+);
+CREATE TABLE IF NOT EXISTS reserved_ids (number INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS intents (
+    batch TEXT NOT NULL,
+    path TEXT NOT NULL,            -- file a flush of the batch uploaded
+    base_rev TEXT,                 -- rev the upload replaced; NULL for a new file
+    digest TEXT NOT NULL,          -- SHA-256 of the uploaded content
+    PRIMARY KEY (batch, path)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def retry_delay(failures, retry_after=None):
+    # Exponential backoff with full jitter; after a rate limit, never sooner
+    # than the server's Retry-After
+    if retry_after is not None:
+        return retry_after + random.uniform(0, RETRY_BASE)
+    return random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** failures))
+
+
+def entry_time(entry):
+    return datetime.fromisoformat(entry["at"])
+
+
+def overlay(members, entries):
+    # The roster as the UI should show it: stored members with the queued
+    # writes applied on top. Members a write touches are copied first.
+    if not entries:
+        return members
+    members = list(members)
+    index = {m.get("Member ID"): i for i, m in enumerate(members)}
+    copied = set()
+    for entry in entries:
+        i = index.get(entry["member_id"])
+        if entry["kind"] == "member":
+            if i is None:
+                index[entry["member_id"]] = len(members)
+                copied.add(len(members))
+                members.append(new_member(entry["name"], entry["member_id"]))
+        elif i is not None:
+            if i not in copied:
+                members[i] = members[i].copy()
+                copied.add(i)
+            apply_payment(members[i], entry["amount"], entry_time(entry))
+    return members
+
+
+def dues_changes(entries):
+    # The queued writes as dues_summary.apply_changes() changes; payments
+    # journaled without their Valid Upto keys are left out
+    return [(None, dues_summary.NEVER_PAID) if e["kind"] == "member" else (e["valid_upto_before"], e["valid_upto_after"])
+            for e in entries if e["kind"] == "member" or e["valid_upto_after"] is not None]
+
+
+# Flushers: write one batch of entries to a storage layout and return
+# {seq: None} for each entry written, or {seq: reason} for one that can never
+# be written. Entries left out (e.g. a conflict with another station) are
+# retried with the next flush. Each entry carries the ID of its queue
+# ("queue") and how often it was tried before ("attempts").
+#
+# Storage may apply a batch and the reply still get lost, so the retry must
+# not apply it again. The ledger layout names its segment after the batch,
+# so the retry finds it already written; the snapshot header records the
+# last seq of each queue it holds, and entries up to it are settled without
+# being applied; member files are checked against the uploads recorded in
+# the batch's Intents.
+
+def digest(data):
+    # Leading and trailing whitespace is left out, as payments.fetch_members
+    # reads files without it
+    return hashlib.sha256(data.strip()).hexdigest()
+
+
+# The uploads a flush of one batch is about to make, recorded in the journal
+# before they start and kept until the batch is settled
+class Intents:
+    def __init__(self, db, lock, batch):
+        self._db = db
+        self._lock = lock
+        self.batch = batch
+
+    def get(self):
+        # path -> (base rev, digest) of the uploads an earlier flush made
+        with self._lock:
+            rows = self._db.execute("SELECT path, base_rev, digest FROM intents WHERE batch = ?", (self.batch,))
+            return {path: (base_rev, content_digest) for path, base_rev, content_digest in rows}
+
+    def record(self, uploads):
+        # uploads: (path, base rev, digest) each
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO intents VALUES (?, ?, ?, ?)",
+                                 [(self.batch,) + upload for upload in uploads])
+
+    def forget(self, paths):
+        # Uploads storage answered as not made
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM intents WHERE batch = ? AND path = ?",
+                                 [(self.batch, path) for path in paths])
+
+
+def flush_to_ledger(dbx, root, entries, intents=None):
+    events = [ledger.member_event(new_member(e["name"], e["member_id"])) if e["kind"] == "member"
+              else ledger.payment_event(e["member_id"], e["amount"], entry_time(e)) for e in entries]
+    try:
+        # Segments from this queue replay in queue order even when their
+        # timestamps are equal
+        tag = f"{entries[0]['seq']:010d}-{entries[0]['batch'][:8]}"
+        ledger.append_events(dbx, events, entry_time(entries[0]), root, tag=tag)
+    except dropbox.exceptions.ApiError as e:
+        if not is_conflict(e):
+            raise
+    return {e["seq"]: None for e in entries}
+
+
+def flush_to_snapshot(dbx, path, entries, intents=None):
+    # The snapshot header keeps the last seq applied per queue
+    queue = entries[0]["queue"]
+    def apply(members, header):
+        queues = header.setdefault("queues", {})
+        applied = queues.get(queue, 0)
+        results = {}
+        by_id = {m.get("Member ID"): m for m in members}
+        for e in entries:
+            member = by_id.get(e["member_id"])
+            if e["seq"] <= applied:
+                results[e["seq"]] = "Member not found" if member is None else None
+                continue
+            if e["kind"] == "member":
+                if member is not None:
+                    results[e["seq"]] = "Member ID already taken"
+                    continue
+                by_id[e["member_id"]] = new_member(e["name"], e["member_id"])
+                members.append(by_id[e["member_id"]])
+            elif member is None:
+                results[e["seq"]] = "Member not found"
+                continue
+            else:
+                apply_payment(member, e["amount"], entry_time(e))
+            results[e["seq"]] = None
+        queues[queue] = max(applied, entries[-1]["seq"])
+        return results
+
+    results, _ = snapshot.update_snapshot(dbx, path, apply, with_header=True)
+    return results
+
+
+def flush_to_files(dbx, folder, entries, intents, max_workers=DEFAULT_MAX_WORKERS, path_of=None):
+    # One file per member touched, all committed in one upload batch. A new
+    # member is written with its queued payments already applied.
+    # path_of(member_id) locates a member's file, as in payments.import_payments.
+    # A file an earlier flush of the batch uploaded is compared with what it
+    # sent: still at the rev it replaced, the upload did not land and is made
+    # again; holding the content sent (format_member() gives back the file as
+    # parsed), it landed and is settled; anything else means another station
+    # changed it since, and the entries are left for a person to check. New
+    # members' files are only looked for when an earlier flush uploaded them.
+    path_of = path_of or (lambda member_id: f"{folder}/{member_id}.txt")
+    created, paid = {}, {}
+    for e in entries:
+        if e["kind"] == "member":
+            created[e["member_id"]] = e
+        else:
+            paid.setdefault(e["member_id"], []).append(e)
+    paths = {member_id: path_of(member_id) for member_id in list(created) + list(paid)}
+    sent = intents.get()
+    fetched = payments.fetch_members(dbx, [path for m, path in paths.items() if m not in created or path in sent],
+                                     max_workers)
+
+    results, files, written = {}, [], []
+    for member_id, path in paths.items():
+        group = ([created[member_id]] if member_id in created else []) + paid.get(member_id, [])
+        stored = fetched.get(path)
+        if stored is not None and path in sent:
+            member, rev = stored
+            base_rev, content_digest = sent[path]
+            if digest(format_member(member).encode()) == content_digest:
+                results.update({e["seq"]: None for e in group})
+                continue
+            if rev != base_rev:
+                results.update({e["seq"]: NEEDS_CHECKING for e in group})
+                continue
+        if stored is not None:
+            member, rev = stored
+            if member_id in created:
+                results.update({e["seq"]: "Member ID already taken" for e in group})
+                continue
+        elif member_id in created:
+            member = new_member(created[member_id]["name"], member_id)
+            member.eol = "\n"
+            rev = None
+        else:
+            results.update({e["seq"]: "Member not found" for e in group})
+            continue
+        for e in group:
+            if e["kind"] == "payment":
+                apply_payment(member, e["amount"], entry_time(e))
+        content = format_member(member).encode()
+        mode = dropbox.files.WriteMode.add if rev is None else dropbox.files.WriteMode.update(rev)
+        files.append((path, content, mode))
+        written.append((group, (path, rev, digest(content))))
+
+    intents.record([upload for _, upload in written])
+    not_made = []
+    for (group, (path, _, _)), result in zip(written, upload_batch(dbx, files, max_workers)):
+        if result.is_success():
+            results.update({e["seq"]: None for e in group})
+            continue
+        not_made.append(path)
+        failure = result.get_failure()
+        if group[0]["kind"] == "member" and failure.is_path() and failure.get_path().is_conflict():
+            results.update({e["seq"]: "Member ID already taken" for e in group})
+        elif not (failure.is_too_many_write_operations() or (failure.is_path() and failure.get_path().is_conflict())):
+            results.update({e["seq"]: f"Failed: {failure}" for e in group})
+    intents.forget(not_made)
+    return results
+
+
+class WriteQueue:
+    def __init__(self, path, flush, reserve=None, batch_size=BATCH_SIZE, id_block=ID_BLOCK_SIZE):
+        self.flush = flush  # flush(entries, intents) -> results, see the flushers above
+        self.reserve = reserve  # reserve(count) -> list of new member IDs
+        self.batch_size = batch_size
+        self.id_block = id_block
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._gate = threading.Lock()  # held while a flush writes
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # Bumped before and after every flush: odd while one is writing
+        self.generation = 0
+        self.last_error = None
+        self.retry_at = None
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(SCHEMA)
+        # Journals from before the Valid Upto columns
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        for column in ("valid_upto_before", "valid_upto_after"):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE entries ADD COLUMN {column} TEXT")
+        # Names this journal in what it writes, see the flushers above
+        with self._db:
+            self._db.execute("INSERT OR IGNORE INTO meta VALUES ('queue_id', ?)", (uuid.uuid4().hex[:12],))
+        self.queue_id = self._db.execute("SELECT value FROM meta WHERE key = 'queue_id'").fetchone()[0]
+
+    def _rows(self, sql, args=()):
+        with self._lock:
+            cursor = self._db.execute(sql, args)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # Journal
+
+    def enqueue_payment(self, member_id, amount, now, change=(None, None)):
+        # change: the member's (before, after) Valid Upto keys, for
+        # pending_changes()
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO entries (kind, member_id, amount, at, valid_upto_before, valid_upto_after) "
+                             "VALUES ('payment', ?, ?, ?, ?, ?)", (member_id, amount, now.isoformat()) + tuple(change))
+        self._wake.set()
+
+    def enqueue_member(self, name, now):
+        # -> the new member's ID from the reserved block, or None when the
+        # block is used up (the worker is woken to top it up)
+        with self._lock, self._db:
+            row = self._db.execute("SELECT MIN(number) FROM reserved_ids").fetchone()
+            member_id = None
+            if row[0] is not None:
+                member_id = format_member_id(row[0])
+                self._db.execute("DELETE FROM reserved_ids WHERE number = ?", row)
+                self._db.execute("INSERT INTO entries (kind, member_id, name, at) VALUES ('member', ?, ?, ?)",
+                                 (member_id, name, now.isoformat()))
+        self._wake.set()
+        return member_id
+
+    def top_up_ids(self):
+        if self.reserve is None:
+            return
+        with self._lock:
+            left = self._db.execute("SELECT COUNT(*) FROM reserved_ids").fetchone()[0]
+        if left * 2 <= self.id_block:
+            ids = self.reserve(self.id_block - left)
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR IGNORE INTO reserved_ids VALUES (?)",
+                                     [(member_number(member_id),) for member_id in ids])
+
+    def pending(self):
+        return self._rows("SELECT * FROM entries WHERE failed IS NULL ORDER BY seq")
+
+    def depth(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries WHERE failed IS NULL").fetchone()[0]
+
+    def failed(self):
+        return self._rows("SELECT * FROM entries WHERE failed IS NOT NULL ORDER BY seq")
+
+    def read(self, load, apply=overlay):
+        # load() -> members from storage; returns them with the queued writes
+        # applied by apply(loaded, entries). A flush landing between the two
+        # reads would show a write twice (stored and still queued) or not at
+        # all, so load again if one ran in between, and after that hold
+        # flushes off for one load.
+        for _ in range(2):
+            with self._flushed:
+                self._flushed.wait_for(lambda: self.generation % 2 == 0, timeout=READ_WAIT)
+                generation = self.generation
+            entries = self.pending()
+            loaded = load()
+            if self.generation == generation:
+                return apply(loaded, entries)
+        with self._gate:
+            entries = self.pending()
+            return apply(load(), entries)
+
+    # Flushing
+
+    def _claim_batch(self):
+        # A batch claimed earlier (before an error or a restart) is retried
+        # as it was; otherwise the oldest entries form a new one
+        with self._lock, self._db:
+            row = self._db.execute("SELECT batch FROM entries WHERE failed IS NULL AND batch IS NOT NULL "
+                                   "ORDER BY seq LIMIT 1").fetchone()
+            batch = row[0] if row else uuid.uuid4().hex
+            if not row:
+                self._db.execute("UPDATE entries SET batch = ? WHERE seq IN "
+                                 "(SELECT seq FROM entries WHERE failed IS NULL ORDER BY seq LIMIT ?)",
+                                 (batch, self.batch_size))
+        entries = self._rows("SELECT * FROM entries WHERE batch = ? AND failed IS NULL ORDER BY seq", (batch,))
+        for entry in entries:
+            entry["queue"] = self.queue_id
+        return entries
+
+    def _bump(self):
+        with self._flushed:
+            self.generation += 1
+            self._flushed.notify_all()
+
+    def flush_once(self):
+        # Write one batch. True when every entry in it was settled.
+        entries = self._claim_batch()
+        if not entries:
+            return True
+        seqs = [(e["seq"],) for e in entries]
+        start_time = time.perf_counter()
+        with self._gate:
+            self._bump()
+            try:
+                # Counted before writing: an attempt cut short by a crash may
+                # still have landed
+                with self._lock, self._db:
+                    self._db.executemany("UPDATE entries SET attempts = attempts + 1 WHERE seq = ?", seqs)
+                results = self.flush(entries, Intents(self._db, self._lock, entries[0]["batch"]))
+                with self._lock, self._db:
+                    self._db.executemany("DELETE FROM entries WHERE seq = ?",
+                                         [(seq,) for seq, reason in results.items() if reason is None])
+                    self._db.executemany("UPDATE entries SET failed = ? WHERE seq = ?",
+                                         [(reason, seq) for seq, reason in results.items() if reason is not None])
+                    self._db.execute("DELETE FROM intents WHERE batch NOT IN "
+                                     "(SELECT batch FROM entries WHERE failed IS NULL AND batch IS NOT NULL)")
+            except Exception as e:
+                with self._lock, self._db:
+                    self._db.executemany("UPDATE entries SET error = ? WHERE seq = ?",
+                                         [(f"{type(e).__name__}: {e}"[:500],) + seq for seq in seqs])
+                raise
+            finally:
+                self._bump()
+        logger.info(json.dumps({"event": "queue_flush", "entries": len(entries), "written": list(results.values()).count(None),
+                                "rejected": sum(r is not None for r in results.values()),
+                                "seconds": round(time.perf_counter() - start_time, 4)}))
+        return len(results) == len(entries)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            retry_after = None
+            try:
+                # IDs first, so a batch that keeps failing does not leave new
+                # members refused as well
+                self.top_up_ids()
+                done = self.flush_once()
+                self.last_error = None if done else "Some writes conflicted with another station"
+            except dropbox.exceptions.RateLimitError as e:
+                done, retry_after = False, e.backoff
+                self.last_error = "Rate limited by Dropbox"
+            except Exception as e:
+                done = False
+                self.last_error = f"{type(e).__name__}: {e}"
+
+            if not done:
+                delay = retry_delay(failures, retry_after)
+                failures += 1
+                self.retry_at = time.time() + delay
+                logger.warning(json.dumps({"event": "queue_retry", "error": self.last_error[:200], "depth": self.depth(),
+                                           "retry_in": round(delay, 2)}, ensure_ascii=False))
+                self._stop.wait(delay)
+                continue
+            failures = 0
+            self.retry_at = None
+            if not self.depth():
+                self._wake.wait(IDLE_INTERVAL)
+                self._wake.clear()
+                self._stop.wait(FLUSH_DELAY)
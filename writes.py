@@ -0,0 +1,62 @@
+import random
+import time
+import dropbox
+import diagnostics
+
+WRITE_ATTEMPTS = 5
+BACKOFF_BASE = 0.1  # seconds
+BACKOFF_MAX = 2.0
+BATCH_LIMIT = 1000  # entries per files_upload_session_finish_batch call
+
+
+def is_conflict(e):
+    return (isinstance(e, dropbox.exceptions.ApiError) and isinstance(e.error, dropbox.files.UploadError)
+            and e.error.is_path() and e.error.get_path().reason.is_conflict())
+
+def backoff_delay(attempt):
+    # Exponential backoff with full jitter so competing writers spread out
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def conditional_mode(rev):
+    # Without a rev the file must not exist yet; with one it must be unchanged
+    return dropbox.files.WriteMode.update(rev) if rev else dropbox.files.WriteMode.add
+
+def retry_on_conflict(attempt_write, attempts=WRITE_ATTEMPTS):
+    # attempt_write() does one read-modify-write cycle. Returns its result and
+    # how many conflicts had to be retried.
+    for attempt in range(attempts):
+        try:
+            return attempt_write(), attempt
+        except dropbox.exceptions.ApiError as e:
+            if not is_conflict(e) or attempt == attempts - 1:
+                raise
+        time.sleep(backoff_delay(attempt))
+
+
+def is_retryable_failure(failure):
+    # Failure of one entry in a batch commit (UploadSessionFinishError)
+    return failure.is_too_many_write_operations() or (failure.is_path() and failure.get_path().is_conflict())
+
+def upload_batch(dbx, files, max_workers=8):
+    # Commit many small files in one batch instead of one files_upload each.
+    # files is a list of (path, content, mode). Each file gets its own closed
+    # upload session (started concurrently); the sessions are then finished
+    # together, up to BATCH_LIMIT per call. Returns one
+    # UploadSessionFinishBatchResultEntry per file, in order.
+    if not files:
+        return []
+    with diagnostics.thread_pool(max_workers) as pool:
+        session_ids = list(pool.map(lambda f: dbx.files_upload_session_start(f[1], close=True).session_id, files))
+
+    results = []
+    for start in range(0, len(files), BATCH_LIMIT):
+        entries = [
+            dropbox.files.UploadSessionFinishArg(
+                cursor=dropbox.files.UploadSessionCursor(session_id=session_id, offset=len(content)),
+                commit=dropbox.files.CommitInfo(path=path, mode=mode, strict_conflict=True),
+            )
+            for (path, content, mode), session_id in zip(files[start:start + BATCH_LIMIT],
+                                                         session_ids[start:start + BATCH_LIMIT])
+        ]
+        results.extend(dbx.files_upload_session_finish_batch_v2(entries).entries)
+    return results